@@ -1,5 +1,6 @@
 from .neo4j_ral_framework import Neo4jRALFramework
-from .ralj_loader import loadRALJFile, loadRALJData, saveRALJFile, saveRALJData
+from .ralj_loader import loadRALJFile, loadRALJFiles, loadRALJData, loadRALJFileStreaming, loadRALJFileStreamingAbstractions, saveRALJFile, saveRALJFileStreaming, saveRALJData
+from .ralb_loader import loadRALBFile, loadRALBData, saveRALBFile, saveRALBData, RALBReader
 from .navigator import *
 from .network_tools import *
 from .ral_vocabulary import *
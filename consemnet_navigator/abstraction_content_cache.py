@@ -0,0 +1,47 @@
+from collections import OrderedDict, namedtuple
+
+ContentCacheInfo = namedtuple("ContentCacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+class AbstractionContentCache:
+    """
+    Mixin of the RAL frameworks for a bounded least recently used cache of the decoded abstraction contents by abstraction id.
+    The content of an abstraction never changes after its creation, so the entries only have to be invalidated when the abstraction is deleted or its remembered flag changes.
+    The entries are tuples whose last element is the remembered flag. They contain abstraction ids instead of wrappers, so that the cache does not keep the wrappers alive.
+    """
+    def _initializeContentCache(self, contentCacheSize):
+        self._contentCache = OrderedDict()
+        self._contentCacheSize = contentCacheSize
+        self._contentCacheHits = 0
+        self._contentCacheMisses = 0
+    def _getCachedContent(self, id):
+        entry = self._contentCache.get(id)
+        if entry == None:
+            self._contentCacheMisses += 1
+            return None
+        self._contentCacheHits += 1
+        self._contentCache.move_to_end(id)
+        return entry
+    def _cacheContent(self, id, entry):
+        if self._contentCacheSize <= 0:
+            return
+        self._contentCache[id] = entry
+        self._contentCache.move_to_end(id)
+        # Remove the least recently used entries
+        while len(self._contentCache) > self._contentCacheSize:
+            self._contentCache.popitem(last = False)
+    def _setCachedRemembered(self, id, remembered):
+        entry = self._contentCache.get(id)
+        if entry != None:
+            self._contentCache[id] = (*entry[:-1], remembered)
+    def _invalidateCachedContent(self, id):
+        self._contentCache.pop(id, None)
+    def clearContentCache(self):
+        """
+        Removes all entries from the content cache. This is done automatically when a transaction is rolled back.
+        """
+        self._contentCache.clear()
+    def getContentCacheInfo(self):
+        """
+        Returns the number of hits and misses, the maximal size and the current size of the content cache.
+        """
+        return ContentCacheInfo(self._contentCacheHits, self._contentCacheMisses, self._contentCacheSize, len(self._contentCache))
@@ -0,0 +1,55 @@
+import time
+
+class DeferredGarbageCollection:
+    """
+    Mixin of the RAL frameworks for the deferred deletion of the abstractions that are neither remembered nor referenced.
+    In the deferred mode the dropped wrappers only enqueue the id of their abstraction and collectGarbage deletes all of them together with a set based sweep in a single transaction.
+    If a garbage collection interval is given, the garbage is also collected at the next safe point of the framework after the interval has passed.
+    The safe points are the ends of the outermost transactions and the write operations outside of transactions, because the database connections must not be used from other threads.
+    The framework implements _sweepGarbage(ids), that deletes the collectable abstractions and returns the number of freed abstractions, the number of freed triples and the number of sweeps.
+    """
+    def _initializeGarbageCollection(self, deferredGarbageCollection, garbageCollectionInterval):
+        self._deferredGarbageCollection = deferredGarbageCollection or garbageCollectionInterval != None
+        self._garbageCollectionInterval = garbageCollectionInterval
+        self._pendingGarbageIDs = set()
+        self._collectingGarbage = False
+        self._lastGarbageCollection = time.monotonic()
+        self._garbageCollectionStatistics = {"collections" : 0, "freedAbstractions" : 0, "freedTriples" : 0, "seconds" : 0.0}
+    def _enqueueGarbage(self, id):
+        self._pendingGarbageIDs.add(id)
+    def _collectGarbageIfDue(self):
+        # Collect the garbage at a safe point if the garbage collection interval has passed
+        if self._garbageCollectionInterval == None or self._collectingGarbage or len(self._pendingGarbageIDs) == 0:
+            return
+        if time.monotonic() - self._lastGarbageCollection >= self._garbageCollectionInterval:
+            self.collectGarbage()
+    def collectGarbage(self):
+        """
+        Deletes all enqueued abstractions, that are neither remembered nor referenced by other abstractions or active wrappers, together with the abstractions that become collectable by their deletion.
+        Returns a dictionary with the number of freed abstractions and triples, the number of sweeps and the seconds spent.
+        """
+        startTime = time.monotonic()
+        ids = self._pendingGarbageIDs
+        self._pendingGarbageIDs = set()
+        self._collectingGarbage = True
+        try:
+            freedAbstractions, freedTriples, sweeps = self._sweepGarbage(ids) if len(ids) > 0 else (0, 0, 0)
+        except BaseException:
+            # Keep the ids for the next collection
+            self._pendingGarbageIDs |= ids
+            raise
+        finally:
+            self._collectingGarbage = False
+            self._lastGarbageCollection = time.monotonic()
+        result = {"freedAbstractions" : freedAbstractions, "freedTriples" : freedTriples, "sweeps" : sweeps, "seconds" : time.monotonic() - startTime}
+        # Add the metrics to the statistics of all collections
+        self._garbageCollectionStatistics["collections"] += 1
+        self._garbageCollectionStatistics["freedAbstractions"] += freedAbstractions
+        self._garbageCollectionStatistics["freedTriples"] += freedTriples
+        self._garbageCollectionStatistics["seconds"] += result["seconds"]
+        return result
+    def getGarbageCollectionStatistics(self):
+        """
+        Returns the number of garbage collections, the total numbers of freed abstractions and triples, the total seconds spent and the number of enqueued abstraction ids.
+        """
+        return {**self._garbageCollectionStatistics, "pendingAbstractions" : len(self._pendingGarbageIDs)}
@@ -6,11 +6,21 @@
 #   data concept : https://github.com/gratach/thoughts/blob/master/topics/data/graph/data-concept.md
 
 from weakref import WeakValueDictionary
+from functools import lru_cache
+from contextlib import contextmanager
+from .abstraction_content_cache import AbstractionContentCache
+from .garbage_collection import DeferredGarbageCollection
 
-class Neo4jRALFramework:
-    def __init__(self, neo4j_session):
+class Neo4jRALFramework(AbstractionContentCache, DeferredGarbageCollection):
+    def __init__(self, neo4j_session, contentCacheSize = 10000, deferredGarbageCollection = False, garbageCollectionInterval = None):
         self._neo4j_session = neo4j_session
         self._wrappersByAbstractionID = WeakValueDictionary()
+        # The open transaction that all queries of the framework join
+        self._transaction = None
+        self._transactionDepth = 0
+        self._onClose = set()
+        self._initializeContentCache(contentCacheSize)
+        self._initializeGarbageCollection(deferredGarbageCollection, garbageCollectionInterval)
     def _getAbstractionIdWrapper(self, abstractionID):
         wrapper = self._wrappersByAbstractionID.get(abstractionID)
         if wrapper == None:
@@ -18,29 +28,81 @@ class Neo4jRALFramework:
             self._wrappersByAbstractionID[abstractionID] = wrapper
         return wrapper
     def ConstructedAbstraction(self, baseConnections):
-        return ConstructedAbstraction(baseConnections, self)
+        result = ConstructedAbstraction(baseConnections, self)
+        self._registerWriteOperation()
+        return result
+    def ConstructedAbstractions(self, baseConnectionsIterable, chunkSize = 1000):
+        """
+        Creates the constructed abstractions of all given base connections and returns them in the input order.
+        The abstractions of each chunk are matched and created with one UNWIND query per connection shape in a single transaction.
+        """
+        result = []
+        chunk = []
+        for baseConnections in baseConnectionsIterable:
+            chunk.append(baseConnections)
+            if len(chunk) >= chunkSize:
+                result.extend(ConstructedAbstractionChunk(chunk, self))
+                chunk = []
+        result.extend(ConstructedAbstractionChunk(chunk, self))
+        return result
     def DirectDataAbstraction(self, datastring, formatstring):
-        return DirectDataAbstraction(datastring, formatstring, self)
+        result = DirectDataAbstraction(datastring, formatstring, self)
+        self._registerWriteOperation()
+        return result
+    def DirectDataAbstractions(self, dataAndFormats, chunkSize = 1000):
+        """
+        Creates the direct data abstractions of all given (data, format) pairs and returns them in the input order.
+        The abstractions of each chunk are merged with a single UNWIND query.
+        """
+        result = []
+        chunk = []
+        for data, format in dataAndFormats:
+            chunk.append((data, format))
+            if len(chunk) >= chunkSize:
+                result.extend(DirectDataAbstractionChunk(chunk, self))
+                chunk = []
+        result.extend(DirectDataAbstractionChunk(chunk, self))
+        return result
     def DirectAbstraction(self, abstraction):
-        return DirectAbstraction(abstraction, self)
+        result = DirectAbstraction(abstraction, self)
+        self._registerWriteOperation()
+        return result
     def InverseDirectAbstraction(self, directAbstraction):
-        return InverseDirectAbstraction(directAbstraction, self)
+        result = InverseDirectAbstraction(directAbstraction, self)
+        self._registerWriteOperation()
+        return result
+    def setAbstractionsRemembered(self, abstractions, remembered = True):
+        """
+        Sets the remembered flag of all given abstractions with a single query.
+        """
+        setAbstractionsRemembered([abstraction.id for abstraction in abstractions], remembered, self)
     def getAbstractionType(self, abstraction):
         return getAbstractionType(abstraction.id, self)
     def getAbstractionContent(self, abstraction):
-        type = self.getAbstractionType(abstraction)
-        if type == "DirectDataAbstraction":
-            return getDirectDataAbstractionContent(abstraction, self)
-        elif type == "ConstructedAbstraction":
-            return getBaseConnections(abstraction, self)
-        elif type == "DirectAbstraction":
-            return getDirectAbstractionContent(abstraction, self)
-        elif type == "InverseDirectAbstraction":
-            return getInverseDirectAbstractionContent(abstraction, self)
-        else:
-            raise ValueError("The abstraction type is not valid.")
-    def searchRALJPattern(self, pattern = [], data = None, constructed = None, directAbstractions = None, inverseDirectAbstractions = None, triples = None):
-        return searchRALJPattern(pattern, self, data, constructed, directAbstractions, inverseDirectAbstractions, triples)
+        return getAbstractionContents([abstraction], self)[abstraction][1]
+    def getAbstractionContents(self, abstractions):
+        return getAbstractionContents(abstractions, self)
+    def getAbstractionContentEntries(self, ids):
+        return getAbstractionContentEntries(ids, self)
+    def searchRALJPattern(self, pattern = [], data = None, constructed = None, directAbstractions = None, inverseDirectAbstractions = None, triples = None, rawIDs = False):
+        return searchRALJPattern(pattern, self, data, constructed, directAbstractions, inverseDirectAbstractions, triples, rawIDs)
+    def getRALJPatternParameterNames(self, pattern = [], data = None, constructed = None, directAbstractions = None, inverseDirectAbstractions = None, triples = None):
+        return getRALJPatternParameterNames(pattern, data, constructed, directAbstractions, inverseDirectAbstractions, triples)
+    def wrapRawSearchResults(self, rawResults, parameterNames):
+        """
+        Lazily converts raw search results into the dictionaries that searchRALJPattern returns without rawIDs.
+        """
+        for rawResult in rawResults:
+            yield dict(zip(parameterNames, [self._getAbstractionIdWrapper(absId) for absId in rawResult]))
+    def getAbstractionFromID(self, id):
+        """
+        Returns the abstraction of an id of a raw search result.
+        """
+        return self._getAbstractionIdWrapper(id)
+    def getIncidentTriples(self, abstraction, rawIDs = False):
+        return getIncidentTriples(abstraction.id, self, rawIDs)
+    def getIncidentTriplePages(self, abstraction, pageSize = 10000, rawIDs = False):
+        return getIncidentTriplePages(abstraction.id, self, pageSize, rawIDs)
     def listAllAbstractions(self):
         return listAllAbstractions(self)
     def getStringRepresentationFromAbstraction(self, abstracrion):
@@ -48,28 +110,130 @@ class Neo4jRALFramework:
     def getAbstractionFromStringRepresentation(self, representation):
         index = int(representation)
         # Check if the abstraction exists
-        if not self._neo4j_session.run("MATCH (n:Abstraction) WHERE id(n) = $id RETURN id(n)", id=index).single():
+        if not self._run("MATCH (n:Abstraction) WHERE id(n) = $id RETURN id(n)", id=index).single():
             raise ValueError("The abstraction does not exist.")
         return self._getAbstractionIdWrapper(index)
     def close(self):
+        for closefunction in self._onClose:
+            closefunction(self)
         for wrapper in self._wrappersByAbstractionID.values():
             wrapper._safeDeletion()
+        if self._deferredGarbageCollection:
+            self.collectGarbage()
         self._neo4j_session.close()
+    @property
+    def onClose(self):
+        return self._onClose
+    def _run(self, query, parameters = None, **kwargs):
+        # Run the query in the open transaction or in auto commit mode if there is none
+        if self._transaction != None:
+            return self._transaction.run(query, parameters, **kwargs)
+        return self._neo4j_session.run(query, parameters, **kwargs)
+    @contextmanager
+    def transaction(self):
+        """
+        Opens an explicit write transaction that all queries of the framework join until the context is left.
+        Nested transactions join the outermost one, so that an error that leaves the outermost context rolls back all of them.
+        The body of the context can not be replayed, so transient errors are not retried. Use runTransaction for automatic retries.
+        """
+        if self._transaction != None:
+            self._transactionDepth += 1
+            try:
+                yield self
+            finally:
+                self._transactionDepth -= 1
+            return
+        transaction = self._neo4j_session.begin_transaction()
+        self._transaction = transaction
+        self._transactionDepth = 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction = None
+            self._transactionDepth = 0
+            # The cache could contain entries of abstractions that are removed by the rollback
+            self.clearContentCache()
+            transaction.rollback()
+            raise
+        self._transaction = None
+        self._transactionDepth = 0
+        transaction.commit()
+        self._collectGarbageIfDue()
+    def runTransaction(self, function, *args, **kwargs):
+        """
+        Calls function(framework, *args, **kwargs) in a managed write transaction of the neo4j driver and returns its result.
+        The driver retries the whole function on transient errors, so it must not have side effects outside of the database.
+        If a transaction is already open, the function joins it without retries.
+        """
+        if self._transaction != None:
+            return function(self, *args, **kwargs)
+        def work(transaction):
+            self._transaction = transaction
+            self._transactionDepth = 1
+            try:
+                return function(self, *args, **kwargs)
+            except BaseException:
+                # The cache could contain entries of abstractions that are removed by the rollback
+                self.clearContentCache()
+                raise
+            finally:
+                self._transaction = None
+                self._transactionDepth = 0
+        result = self._neo4j_session.execute_write(work)
+        self._collectGarbageIfDue()
+        return result
+    def _registerWriteOperation(self):
+        # Collect the garbage if the write operation is not part of a transaction
+        if self._transaction == None:
+            self._collectGarbageIfDue()
+    def _sweepGarbage(self, ids):
+        # Delete the collectable abstractions set by set until no more abstractions become collectable
+        freedAbstractions, freedTriples, sweeps = 0, 0, 0
+        with self.transaction():
+            while len(ids) > 0:
+                sweeps += 1
+                # Find the candidates that are not remembered, have no (inverse) direct abstraction and are only referenced by their own triples
+                collectableIds = self._run("UNWIND $ids AS candidateId MATCH (n:Abstraction) WHERE id(n) = candidateId AND NOT coalesce(n.remember, false) "
+                                           "AND NOT ()-[:isAbstractionOf|isInverseAbstractionOf]->(n) "
+                                           "AND size([(t:AbstractionTriple)-[:subj|pred|obj]->(n) WHERE NOT (n)-[:ownsTriple]->(t) | t]) = 0 "
+                                           "RETURN id(n)", ids=list(ids)).value()
+                # Keep the abstractions with active wrappers
+                collectableIds = [id for id in collectableIds if getattr(self._wrappersByAbstractionID.get(id), "_id", None) == None]
+                if len(collectableIds) == 0:
+                    break
+                # Delete the abstractions with their triples and collect the connected abstractions as candidates of the next sweep
+                records = self._deleteAbstractions(collectableIds)
+                freedAbstractions += len(collectableIds)
+                freedTriples += sum([numberOfTriples for numberOfTriples, connectedIds in records])
+                ids = set([id for numberOfTriples, connectedIds in records for id in connectedIds]).difference(collectableIds)
+        return freedAbstractions, freedTriples, sweeps
+    def _deleteAbstractions(self, ids):
+        # Delete the abstractions together with their triples and return the number of triples and the connected abstraction ids of every deleted abstraction
+        records = self._run("UNWIND $ids AS garbageId MATCH (n) WHERE id(n) = garbageId "
+                            "OPTIONAL MATCH (n)-[:ownsTriple]->(t:AbstractionTriple) "
+                            "WITH n, collect(t) AS triples "
+                            "WITH n, triples, [(n)-[:ownsTriple]->(:AbstractionTriple)-[:subj|pred|obj]->(m) | id(m)] + [(n)-[:isAbstractionOf|isInverseAbstractionOf]->(m) | id(m)] AS connectedIds "
+                            "FOREACH (t IN triples | DETACH DELETE t) "
+                            "DETACH DELETE n "
+                            "RETURN size(triples), connectedIds", ids=list(ids)).values()
+        for id in ids:
+            self._invalidateCachedContent(id)
+        return records
+    def getQueryTemplateCacheInfo(self):
+        return getQueryTemplateCacheInfo()
     def isValidAbstraction(self, abstraction):
         if not type(abstraction) == Neo4jAbstraction:
             return False
-        return abstraction.id != None
+        return abstraction._id != None
     
 class Neo4jAbstraction:
     """
     A wrapper class for the neo4j abstraction id.
     """
+    __slots__ = ("_id", "RALFramework", "__weakref__")
     def __init__(self, abstractionId, RALFramework):
         self._id = abstractionId
         self.RALFramework = RALFramework
-        # Set remembered to false if not defined
-        if isAbstractionRemembered(self, RALFramework) == None:
-            RALFramework._neo4j_session.run("MATCH (n) WHERE id(n) = $id SET n.remember = false", id=self._id)
     
     @property
     def id(self):
@@ -85,27 +249,32 @@ class Neo4jAbstraction:
     def data(self):
         if self._id == None:
             raise ValueError("The abstraction has been deleted.")
-        return getDirectDataAbstractionContent(self, self.RALFramework)[0] if self.type == "DirectDataAbstraction" else None
+        type, content = getAbstractionContents([self], self.RALFramework)[self]
+        return content[0] if type == "DirectDataAbstraction" else None
     @property
     def format(self):
         if self._id == None:
             raise ValueError("The abstraction has been deleted.")
-        return getDirectDataAbstractionContent(self, self.RALFramework)[1] if self.type == "DirectDataAbstraction" else None
+        type, content = getAbstractionContents([self], self.RALFramework)[self]
+        return content[1] if type == "DirectDataAbstraction" else None
     @property
     def baseConnections(self):
         if self._id == None:
             raise ValueError("The abstraction has been deleted.")
-        return getBaseConnections(self, self.RALFramework)[0] if self.type == "ConstructedAbstraction" else None
+        type, content = getAbstractionContents([self], self.RALFramework)[self]
+        return content if type == "ConstructedAbstraction" else None
     @property
     def innerAbstraction(self):
         if self._id == None:
             raise ValueError("The abstraction has been deleted.")
-        return getDirectAbstractionContent(self, self.RALFramework) if self.type == "DirectAbstraction" else None
+        type, content = getAbstractionContents([self], self.RALFramework)[self]
+        return content if type == "DirectAbstraction" else None
     @property
     def outerAbstraction(self):
         if self._id == None:
             raise ValueError("The abstraction has been deleted.")
-        return getInverseDirectAbstractionContent(self, self.RALFramework) if self.type == "InverseDirectAbstraction" else None
+        type, content = getAbstractionContents([self], self.RALFramework)[self]
+        return content if type == "InverseDirectAbstraction" else None
     # get remembered
     @property
     def remembered(self):
@@ -118,7 +287,8 @@ class Neo4jAbstraction:
         if self._id == None:
             raise ValueError("The abstraction has been deleted.")
         assert type(value) == bool
-        self.RALFramework._neo4j_session.run("MATCH (n) WHERE id(n) = $id SET n.remember = $value", id=self._id, value=value)
+        self.RALFramework._run("MATCH (n) WHERE id(n) = $id SET n.remember = $value", id=self._id, value=value)
+        self.RALFramework._setCachedRemembered(self._id, value)
     def __del__(self):
         self._safeDeletion()
     def _safeDeletion(self):
@@ -126,23 +296,26 @@ class Neo4jAbstraction:
             return
         id = self.id
         self._id = None
+        # In the deferred garbage collection mode the abstraction is checked by the next garbage collection
+        if self.RALFramework._deferredGarbageCollection:
+            self.RALFramework._enqueueGarbage(id)
+            return
         # Check if the abstraction can be savely deleted from the neo4j database
         idsToCheckForDeletion = set([id])
-        while len(idsToCheckForDeletion) > 0:
-            id = idsToCheckForDeletion.pop()
-            idsToCheckForDeletion |= checkForSafeAbstractionDeletion(id, self.RALFramework)
-    def forceDeletion(self):
+        with self.RALFramework.transaction():
+            while len(idsToCheckForDeletion) > 0:
+                id = idsToCheckForDeletion.pop()
+                idsToCheckForDeletion |= checkForSafeAbstractionDeletion(id, self.RALFramework)
+    def forceDeletion(self, dryRun = False):
+        """
+        Deletes the abstraction together with all abstractions that reference it directly or indirectly, even if they are remembered or have active wrappers.
+        Afterwards the abstractions that are no longer referenced are deleted if they are neither remembered nor have active wrappers.
+        Returns a dictionary with the number of forced deletions and the total numbers of deleted abstractions and triples.
+        In the dryRun mode the deletion is rolled back, so that only the numbers are reported.
+        """
         if self._id == None:
             raise ValueError("The abstraction has been deleted.")
-        forcedDeletionIds = {self._id}
-        safeDeletionIds = set()
-        while len(forcedDeletionIds) > 0:
-            id = forcedDeletionIds.pop()
-            safeDeletionIds.add(id)
-            forcedDeletionIds |= forceAbstractionDeletion(id, self.RALFramework).difference(safeDeletionIds)
-        while len(safeDeletionIds) > 0:
-            id = safeDeletionIds.pop()
-            safeDeletionIds |= checkForSafeAbstractionDeletion(id, self.RALFramework)
+        return forceAbstractionDeletion(self._id, self.RALFramework, dryRun)
     
     def __repr__(self):
         return "Abstraction(" + self.RALFramework.getStringRepresentationFromAbstraction(self) + ")"
@@ -152,382 +325,510 @@ def checkForSafeAbstractionDeletion(id, RALFramework):
     Checks if the abstraction with the given id can be savely deleted from the neo4j database.
     Returns a set of the abstraction ids that should also be checked for safe deletion.
     """
-    # Check if the abstraction is remembered
-    if RALFramework._neo4j_session.run("MATCH (n) WHERE id(n) = $id RETURN n.remember", id=id).single().value():
+    # Check if the abstraction is remembered or has already been removed by a rolled back transaction
+    remember = RALFramework._run("MATCH (n) WHERE id(n) = $id RETURN coalesce(n.remember, false)", id=id).single()
+    if remember == None or remember.value():
         return set()
     # Check if tere is a active wrapper for the abstraction
     wrapper = RALFramework._wrappersByAbstractionID.get(id)
     if wrapper != None and wrapper._id != None:
         return set()
     # Check if there is a direct abstraction of the abstraction
-    directAbstraction = RALFramework._neo4j_session.run("MATCH (n)-[:isAbstractionOf]->(m) WHERE id(m) = $id RETURN id(n)", id=id).single()
+    directAbstraction = RALFramework._run("MATCH (n)-[:isAbstractionOf]->(m) WHERE id(m) = $id RETURN id(n)", id=id).single()
     if directAbstraction != None:
         return set()
     # Check if there is an inverse direct abstraction of the abstraction
-    inverseDirectAbstraction = RALFramework._neo4j_session.run("MATCH (n)-[:isInverseAbstractionOf]->(m) WHERE id(m) = $id RETURN id(n)", id=id).single()
+    inverseDirectAbstraction = RALFramework._run("MATCH (n)-[:isInverseAbstractionOf]->(m) WHERE id(m) = $id RETURN id(n)", id=id).single()
     if inverseDirectAbstraction != None:
         return set()
     # Get all the ids of the connected AbstractionTriples
     connectedTriples = set()
     for conn in ["subj", "pred", "obj"]:
-        result = RALFramework._neo4j_session.run(f"MATCH (t:AbstractionTriple)-[:{conn}]->(n) WHERE id(n) = $id RETURN id(t)", id=id).value()
+        result = RALFramework._run(f"MATCH (t:AbstractionTriple)-[:{conn}]->(n) WHERE id(n) = $id RETURN id(t)", id=id).value()
         for record in result:
             connectedTriples.add(record)
     # Check if all of the connected AbstractionTriples are owned by the removed abstraction
-    ownedTriples = set(RALFramework._neo4j_session.run("MATCH (n)-[:ownsTriple]->(m) WHERE id(n) = $id RETURN id(m)", id=id).value())
+    ownedTriples = set(RALFramework._run("MATCH (n)-[:ownsTriple]->(m) WHERE id(n) = $id RETURN id(m)", id=id).value())
     if connectedTriples != ownedTriples:
         return set()
     # Get all the ids of the connected abstractions
     connectedAbstractions = set()
     for triple in connectedTriples:
         for conn in ["subj", "pred", "obj"]:
-            result = RALFramework._neo4j_session.run(f"MATCH (n)-[:{conn}]->(m) WHERE id(n) = $id RETURN id(m)", id=triple).value()
+            result = RALFramework._run(f"MATCH (n)-[:{conn}]->(m) WHERE id(n) = $id RETURN id(m)", id=triple).value()
             for record in result:
                 if record != id:
                     connectedAbstractions.add(record)
     # Get the id of the inner abstraction of the abstraction
-    innerAbstraction = RALFramework._neo4j_session.run("MATCH (n)-[:isAbstractionOf]->(m) WHERE id(n) = $id RETURN id(m)", id=id).single()
+    innerAbstraction = RALFramework._run("MATCH (n)-[:isAbstractionOf]->(m) WHERE id(n) = $id RETURN id(m)", id=id).single()
     if innerAbstraction != None:
         connectedAbstractions.add(innerAbstraction.value())
     # Get the id of the outer abstraction of the abstraction
-    outerAbstraction = RALFramework._neo4j_session.run("MATCH (n)-[:isInverseAbstractionOf]->(m) WHERE id(n) = $id RETURN id(m)", id=id).single()
+    outerAbstraction = RALFramework._run("MATCH (n)-[:isInverseAbstractionOf]->(m) WHERE id(n) = $id RETURN id(m)", id=id).single()
     if outerAbstraction != None:
         connectedAbstractions.add(outerAbstraction.value())
     # Delete the owned AbstractionTriples
     for triple in ownedTriples:
-        RALFramework._neo4j_session.run("MATCH (n) WHERE id(n) = $id DETACH DELETE n", id=triple)
+        RALFramework._run("MATCH (n) WHERE id(n) = $id DETACH DELETE n", id=triple)
     # Delete the abstraction
-    RALFramework._neo4j_session.run("MATCH (n) WHERE id(n) = $id DETACH DELETE n", id=id)
+    RALFramework._run("MATCH (n) WHERE id(n) = $id DETACH DELETE n", id=id)
+    RALFramework._invalidateCachedContent(id)
     return connectedAbstractions
 
-def forceAbstractionDeletion(id, RALFramework):
+class _DryRunRollback(Exception):
+    pass
+
+def forceAbstractionDeletion(id, RALFramework, dryRun = False):
     """
-    Forces the deletion of the abstraction with the given id from the neo4j database.
-    returns the set of the abstraction ids that also have to be forced to be deleted.
+    Forces the deletion of the abstraction with the given id and of all abstractions that reference it directly or indirectly from the neo4j database.
+    The referencing abstractions are found with a single variable length path match and deleted with bulk queries in one transaction, that also deletes the abstractions which become collectable.
+    Returns a dictionary with the number of forced deletions and the total numbers of deleted abstractions and triples. In the dryRun mode the transaction is rolled back.
     """
-    # Unset the remembered flag
-    RALFramework._neo4j_session.run("MATCH (n) WHERE id(n) = $id SET n.remember = false", id=id)
-    # Deactivate the active wrapper for the abstraction if there is one
-    wrapper = RALFramework._wrappersByAbstractionID.get(id)
-    if wrapper != None:
-        wrapper._id = None
-    forcedDeletionIds = set()
-    # Check if there is a direct abstraction of the abstraction
-    directAbstraction = RALFramework._neo4j_session.run("MATCH (n)-[:isAbstractionOf]->(m) WHERE id(m) = $id RETURN id(n)", id=id).single()
-    if directAbstraction != None:
-        forcedDeletionIds.add(directAbstraction.value())
-    # Check if there is an inverse direct abstraction of the abstraction
-    inverseDirectAbstraction = RALFramework._neo4j_session.run("MATCH (n)-[:isInverseAbstractionOf]->(m) WHERE id(m) = $id RETURN id(n)", id=id).single()
-    if inverseDirectAbstraction != None:
-        forcedDeletionIds.add(inverseDirectAbstraction.value())
-    # Get all the ids of the connected AbstractionTriples
-    connectedTriples = set()
-    for conn in ["subj", "pred", "obj"]:
-        result = RALFramework._neo4j_session.run(f"MATCH (t:AbstractionTriple)-[:{conn}]->(n) WHERE id(n) = $id RETURN id(t)", id=id).value()
-        for record in result:
-            connectedTriples.add(record)
-    # Add all the owners of the connected AbstractionTriples to the forcedDeletionIds
-    for triple in connectedTriples:
-        result = RALFramework._neo4j_session.run("MATCH (n)-[:ownsTriple]->(m) WHERE id(m) = $id RETURN id(n)", id=triple).single().value()
-        if result != id:
-            forcedDeletionIds.add(result)
-    # Return the forcedDeletionIds
-    return forcedDeletionIds
+    if dryRun and RALFramework._transaction != None:
+        raise ValueError("A dry run can not join an open transaction, because the rollback would affect the whole transaction.")
+    try:
+        with RALFramework.transaction():
+            # Find the abstractions that reference the abstraction by a chain of triples and (inverse) direct abstractions
+            # Only the distinct start nodes are returned, so that the paths are expanded breadth first instead of being enumerated
+            forcedDeletionIds = [id] + RALFramework._run("MATCH (n) WHERE id(n) = $id "
+                                                         "MATCH (m:Abstraction)-[:ownsTriple|subj|pred|obj|isAbstractionOf|isInverseAbstractionOf*1..]->(n) WHERE m <> n "
+                                                         "RETURN DISTINCT id(m)", id=id).value()
+            records = RALFramework._deleteAbstractions(forcedDeletionIds)
+            # Delete the abstractions that become collectable
+            connectedIds = set([connectedId for numberOfTriples, connectedIds in records for connectedId in connectedIds]).difference(forcedDeletionIds)
+            freedAbstractions, freedTriples, sweeps = RALFramework._sweepGarbage(connectedIds)
+            result = {"forcedAbstractions" : len(forcedDeletionIds), "deletedAbstractions" : len(forcedDeletionIds) + freedAbstractions, "deletedTriples" : sum([numberOfTriples for numberOfTriples, connectedIds in records]) + freedTriples}
+            if dryRun:
+                raise _DryRunRollback()
+    except _DryRunRollback:
+        return result
+    # Deactivate the active wrappers of the forced abstractions only after the deletion has succeeded, so that they stay usable if it is rolled back
+    # They are also removed from the registry, so that they are not returned for new abstractions that reuse the ids
+    for forcedId in forcedDeletionIds:
+        wrapper = RALFramework._wrappersByAbstractionID.pop(forcedId, None)
+        if wrapper != None:
+            wrapper._id = None
+    return result
 
 def ConstructedAbstraction(baseConnections, framework):
     """
     Creates an constructed abstraction in the neo4j database and returns the node id of the created constructed abstraction.
     """
-    neo4j_session = framework._neo4j_session
-    # Create the query string
-    structureString = f"(n:ConstructedAbstraction:Abstraction {{connectionCount: {len(baseConnections)}}})"
-    idDict = {}
-    i = 0
-    for connection in baseConnections:
-        subj, pred, obj = connection
-        if not 0 in connection:
-            raise ValueError("The semantic connection must contain at least one None value.")
-        if subj == 0:
-            subj = "(n)"
-        else:
-            assert type(subj) == Neo4jAbstraction
-            idDict[f"c{i}"] = subj.id
-            subj = f"(c{i})"
-            i += 1
-        if pred == 0:
-            pred = "(n)"
-        else:
-            assert type(pred) == Neo4jAbstraction
-            idDict[f"c{i}"] = pred.id
-            pred = f"(c{i})"
-            i += 1
-        if obj == 0:
-            obj = "(n)"
-        else:
-            assert type(obj) == Neo4jAbstraction
-            idDict[f"c{i}"] = obj.id
-            obj = f"(c{i})"
-            i += 1
-        structureString += f", (n)-[:ownsTriple]->(c{i}:AbstractionTriple)-[:subj]->{subj}, (c{i})-[:pred]->{pred}, (c{i})-[:obj]->{obj}"
-        i += 1
-    idCompareString = ""
-    if len(idDict) > 0:
-        idCompareString += " WHERE "
-        for name, id in idDict.items():
-            idCompareString += f"id({name}) = {id} AND "
-        idCompareString = idCompareString[:-5]
-    matchString = f"MATCH {structureString} {idCompareString} RETURN id(n)"
-    createString = ""
-    if len(idDict) > 0:
-        createString = "MATCH " + ", ".join([f"({k})" for k in idDict.keys()])
-    createString += f"{idCompareString} CREATE {structureString} RETURN id(n)"
+    connectionShape, parameters = getConstructedAbstractionShape(baseConnections)
+    matchString, createString = getConstructedAbstractionQueryTemplates(connectionShape)
     # Test if the constructed abstraction already exists
-    id = neo4j_session.run(matchString).single()
+    id = framework._run(matchString, parameters).single()
     if id == None:
         # Create the constructed abstraction
-        id = neo4j_session.run(createString).single().value()
+        id = framework._run(createString, parameters).single().value()
     else:
         id = id.value()
     return framework._getAbstractionIdWrapper(id)
 
+def getConstructedAbstractionShape(baseConnections):
+    """
+    Returns the connection shape of the base connections and the query parameters of the constructed abstraction queries.
+    The connections are ordered by the positions of their self references, so that the query text only depends on the shape of the connections.
+    """
+    connections = []
+    for connection in baseConnections:
+        if not 0 in connection:
+            raise ValueError("The semantic connection must contain at least one None value.")
+        for element in connection:
+            if element != 0:
+                assert type(element) == Neo4jAbstraction
+        connections.append(tuple(connection))
+    connections.sort(key = lambda connection: tuple([element == 0 for element in connection]) + tuple([0 if element == 0 else element.id for element in connection]))
+    connectionShape = tuple([tuple([element == 0 for element in connection]) for connection in connections])
+    # The ids of the connected abstractions and the connection count are passed as query parameters
+    parameters = {f"c{i}" : element.id for i, element in enumerate([element for connection in connections for element in connection if element != 0])}
+    parameters["connectionCount"] = len(connections)
+    return connectionShape, parameters
+
+def ConstructedAbstractionChunk(chunk, framework):
+    """
+    Creates the constructed abstractions of a chunk of base connections in a single transaction and returns them in the input order.
+    The abstractions with the same connection shape are matched and the missing ones created with one UNWIND query each.
+    """
+    if len(chunk) == 0:
+        return []
+    # Group the distinct abstractions of the chunk by their connection shape
+    rowsByConnectionShape = {}
+    indexByParameters = {}
+    indices = []
+    for baseConnections in chunk:
+        connectionShape, parameters = getConstructedAbstractionShape(baseConnections)
+        key = (connectionShape, tuple(parameters.values()))
+        if not key in indexByParameters:
+            indexByParameters[key] = len(indexByParameters)
+            rowsByConnectionShape.setdefault(connectionShape, []).append(parameters | {"index" : indexByParameters[key]})
+        indices.append(indexByParameters[key])
+    idsByIndex = {}
+    with framework.transaction():
+        for connectionShape, rows in rowsByConnectionShape.items():
+            matchString, createString = getConstructedAbstractionQueryTemplates(connectionShape, True)
+            # Find the already existing abstractions
+            idsByIndex.update(dict(framework._run(matchString, rows = rows).values()))
+            # Create the missing abstractions
+            missingRows = [row for row in rows if not row["index"] in idsByIndex]
+            if len(missingRows) > 0:
+                idsByIndex.update(dict(framework._run(createString, rows = missingRows).values()))
+    return [framework._getAbstractionIdWrapper(idsByIndex[index]) for index in indices]
+
+@lru_cache(maxsize = 256)
+def getConstructedAbstractionQueryTemplates(connectionShape, batch = False):
+    """
+    Returns the match and the create query of a constructed abstraction with the given connection shape.
+    The connection shape is a tuple that contains for each connection a tuple of three booleans, that mark the self references of the connection.
+    The connected abstractions are referenced by the query parameters c0, c1, ... in the order of their appearance and the number of connections by the connectionCount parameter.
+    In batch mode the queries unwind the list parameter rows, whose entries contain these parameters and an index, and return the index together with the id.
+    """
+    parameter = "row." if batch else "$"
+    structureString = f"(n:ConstructedAbstraction:Abstraction {{connectionCount: {parameter}connectionCount}})"
+    names = []
+    for tripleIndex, selfReferences in enumerate(connectionShape):
+        elementStrings = []
+        for isSelfReference in selfReferences:
+            if isSelfReference:
+                elementStrings.append("(n)")
+            else:
+                names.append(f"c{len(names)}")
+                elementStrings.append(f"({names[-1]})")
+        subj, pred, obj = elementStrings
+        structureString += f", (n)-[:ownsTriple]->(t{tripleIndex}:AbstractionTriple)-[:subj]->{subj}, (t{tripleIndex})-[:pred]->{pred}, (t{tripleIndex})-[:obj]->{obj}"
+    idCompareString = ""
+    if len(names) > 0:
+        idCompareString = " WHERE " + " AND ".join([f"id({name}) = {parameter}{name}" for name in names])
+    unwindString = "UNWIND $rows AS row " if batch else ""
+    returnString = "RETURN row.index, id(n)" if batch else "RETURN id(n)"
+    matchString = f"{unwindString}MATCH {structureString}{idCompareString} {returnString}"
+    createString = unwindString
+    if len(names) > 0:
+        createString += "MATCH " + ", ".join([f"({name})" for name in names]) + idCompareString + " "
+    createString += f"CREATE {structureString} SET n.remember = false {returnString}"
+    return matchString, createString
+
 def DirectDataAbstraction(datastring, formatstring, framework):
     """
     Creates the direct abstraction of a data concept in the neo4j database and returns the node id of the created direct abstraction.
     """
-    neo4j_session = framework._neo4j_session
-    id = neo4j_session.run("MERGE (a:DirectDataAbstraction:Abstraction {data: $data, format: $format}) RETURN id(a)", data=datastring, format=formatstring).single().value()
+    id = framework._run("MERGE (a:DirectDataAbstraction:Abstraction {data: $data, format: $format}) ON CREATE SET a.remember = false RETURN id(a)", data=datastring, format=formatstring).single().value()
     return framework._getAbstractionIdWrapper(id)
 
+def DirectDataAbstractionChunk(chunk, framework):
+    """
+    Creates the direct data abstractions of a chunk of (data, format) pairs with a single UNWIND query and returns them in the input order.
+    """
+    if len(chunk) == 0:
+        return []
+    uniqueDataAndFormats = list(set(chunk))
+    idsByDataAndFormat = {}
+    for data, format, id in framework._run("UNWIND $rows AS row MERGE (a:DirectDataAbstraction:Abstraction {data: row.data, format: row.format}) ON CREATE SET a.remember = false RETURN row.data, row.format, id(a)", rows = [{"data" : data, "format" : format} for data, format in uniqueDataAndFormats]).values():
+        idsByDataAndFormat[(data, format)] = id
+    return [framework._getAbstractionIdWrapper(idsByDataAndFormat[dataAndFormat]) for dataAndFormat in chunk]
+
 def DirectAbstraction(abstraction, framework):
     """
     Creates the direct abstraction of an abstraction in the neo4j database and returns the node id of the created direct abstraction.
     """
-    neo4j_session = framework._neo4j_session
-    id = neo4j_session.run("MATCH (n) WHERE id(n) = $id MERGE (a:DirectAbstraction:Abstraction)-[:isAbstractionOf]->(n) RETURN id(a)", id=abstraction.id).single().value()
+    id = framework._run("MATCH (n) WHERE id(n) = $id MERGE (a:DirectAbstraction:Abstraction)-[:isAbstractionOf]->(n) ON CREATE SET a.remember = false RETURN id(a)", id=abstraction.id).single().value()
     return framework._getAbstractionIdWrapper(id)
 
 def InverseDirectAbstraction(directAbstraction, framework):
     """
     Creates the inverse direct abstraction of an abstraction in the neo4j database and returns the node id of the created direct abstraction.
     """
-    neo4j_session = framework._neo4j_session
-    id = neo4j_session.run("MATCH (n) WHERE id(n) = $id MERGE (a:InverseDirectAbstraction:Abstraction)-[:isInverseAbstractionOf]->(n) RETURN id(a)", id=directAbstraction.id).single().value()
+    id = framework._run("MATCH (n) WHERE id(n) = $id MERGE (a:InverseDirectAbstraction:Abstraction)-[:isInverseAbstractionOf]->(n) ON CREATE SET a.remember = false RETURN id(a)", id=directAbstraction.id).single().value()
     return framework._getAbstractionIdWrapper(id)
 
 def isAbstractionRemembered(abstraction, framework):
     """
     Returns whether the abstraction with the given id is remembered in the neo4j database.
     """
-    neo4j_session = framework._neo4j_session
-    return neo4j_session.run("MATCH (n) WHERE id(n) = $id RETURN n.remember", id=abstraction.id).single().value()
+    return getAbstractionContentEntries([abstraction.id], framework)[abstraction.id][2]
+
+def setAbstractionsRemembered(ids, remembered, framework):
+    """
+    Sets the remembered flag of the abstractions with the given ids with one UNWIND query.
+    """
+    framework._run("UNWIND $ids AS abstractionId MATCH (n) WHERE id(n) = abstractionId SET n.remember = $value", ids=ids, value=bool(remembered))
+    for id in ids:
+        framework._setCachedRemembered(id, bool(remembered))
 
 def getBaseConnections(abstraction, framework):
     """
     Returns the base connections of the abstraction with the given id.
     """
-    neo4j_session = framework._neo4j_session
     id = abstraction.id
-    ownedTriples = set(neo4j_session.run("MATCH (n)-[:ownsTriple]->(m) WHERE id(n) = $id RETURN id(m)", id=id).value())
-    semanticConnections = []
-    for triple in ownedTriples:
-        subj = neo4j_session.run("MATCH (t)-[:subj]->(n) WHERE id(t) = $id RETURN id(n)", id=triple).single().value()
-        pred = neo4j_session.run("MATCH (t)-[:pred]->(n) WHERE id(t) = $id RETURN id(n)", id=triple).single().value()
-        obj = neo4j_session.run("MATCH (t)-[:obj]->(n) WHERE id(t) = $id RETURN id(n)", id=triple).single().value()
-        semanticConnections.append((0 if subj == id else framework._getAbstractionIdWrapper(subj),
-                                    0 if pred == id else framework._getAbstractionIdWrapper(pred), 
-                                    0 if obj == id else framework._getAbstractionIdWrapper(obj)))
-    return frozenset(semanticConnections)
+    triples = framework._run("MATCH (n)-[:ownsTriple]->(t:AbstractionTriple)-[:subj]->(s), (t)-[:pred]->(p), (t)-[:obj]->(o) WHERE id(n) = $id RETURN id(s), id(p), id(o)", id=id).values()
+    return frozenset([tuple([0 if element == id else framework._getAbstractionIdWrapper(element) for element in triple]) for triple in triples])
 
 def getAbstractionType(abstractionId, framework):
     """
     Returns the type of the abstraction with the given id.
     """
-    neo4j_session = framework._neo4j_session
-    type = neo4j_session.run("MATCH (n) WHERE id(n) = $id RETURN labels(n)", id=abstractionId).single().value()
-    return set({"ConstructedAbstraction", "DirectDataAbstraction", "DirectAbstraction", "InverseDirectAbstraction"}).intersection(type).pop()
+    return getAbstractionContentEntries([abstractionId], framework)[abstractionId][0]
 
 def getDirectDataAbstractionContent(abstraction, framework):
     """
     Returns the data and format of the direct abstraction with the given id.
     """
-    neo4j_session = framework._neo4j_session
-    data = neo4j_session.run("MATCH (n:DirectDataAbstraction) WHERE id(n) = $id RETURN n.data", id=abstraction.id).single().value()
-    format = neo4j_session.run("MATCH (n:DirectDataAbstraction) WHERE id(n) = $id RETURN n.format", id=abstraction.id).single().value()
+    data, format = framework._run("MATCH (n:DirectDataAbstraction) WHERE id(n) = $id RETURN n.data, n.format", id=abstraction.id).single().values()
     return (data, format)
 
 def getDirectAbstractionContent(abstraction, framework):
     """
     Returns the id of the abstraction that the direct abstraction with the given id is an abstraction of.
     """
-    neo4j_session = framework._neo4j_session
-    return framework._getAbstractionIdWrapper(neo4j_session.run("MATCH (n)-[:isAbstractionOf]->(m) WHERE id(n) = $id RETURN id(m)", id=abstraction.id).single().value())
+    return framework._getAbstractionIdWrapper(framework._run("MATCH (n)-[:isAbstractionOf]->(m) WHERE id(n) = $id RETURN id(m)", id=abstraction.id).single().value())
 
 def getInverseDirectAbstractionContent(abstraction, framework):
     """
     Returns the id of the abstraction that the inverse direct abstraction with the given id is an inverse abstraction of.
     """
-    neo4j_session = framework._neo4j_session
-    return framework._getAbstractionIdWrapper(neo4j_session.run("MATCH (n)-[:isInverseAbstractionOf]->(m) WHERE id(n) = $id RETURN id(m)", id=abstraction.id).single().value())
+    return framework._getAbstractionIdWrapper(framework._run("MATCH (n)-[:isInverseAbstractionOf]->(m) WHERE id(n) = $id RETURN id(m)", id=abstraction.id).single().value())
+
+def getAbstractionContents(abstractions, framework):
+    """
+    Returns a dictionary that maps each of the given abstractions to a tuple of its type and its content.
+    The content of a direct data abstraction is the tuple of its data and format, the content of a constructed abstraction the frozenset of its base connections and the content of a (inverse) direct abstraction its inner (outer) abstraction.
+    """
+    abstractionsById = {abstraction.id : abstraction for abstraction in abstractions}
+    result = {}
+    for id, (type, content, remember) in getAbstractionContentEntries(abstractionsById.keys(), framework).items():
+        if type == "ConstructedAbstraction":
+            content = frozenset([tuple([0 if element == 0 else framework._getAbstractionIdWrapper(element) for element in triple]) for triple in content])
+        elif type != "DirectDataAbstraction":
+            content = framework._getAbstractionIdWrapper(content)
+        result[abstractionsById[id]] = (type, content)
+    return result
+
+def getIncidentTriples(id, framework, rawIDs = False):
+    """
+    Returns the set of all triples that contain the abstraction as subject, predicate or object as tuples of the subject, predicate, object and owner of the triple.
+    The self references of the triples are replaced by their owner. The triples are found with a single query.
+    If rawIDs is True, the abstractions are represented by their ids.
+    """
+    triples = framework._run("MATCH (c)<-[:subj|pred|obj]-(t:AbstractionTriple) WHERE id(c) = $id "
+                             "WITH DISTINCT t MATCH (n)-[:ownsTriple]->(t)-[:subj]->(s), (t)-[:pred]->(p), (t)-[:obj]->(o) "
+                             "RETURN id(s), id(p), id(o), id(n)", id=id).values()
+    if rawIDs:
+        return set([tuple(triple) for triple in triples])
+    return set([tuple([framework._getAbstractionIdWrapper(item) for item in triple]) for triple in triples])
+
+def getIncidentTriplePages(id, framework, pageSize = 10000, rawIDs = False):
+    """
+    Yields the triples of getIncidentTriples in lists of at most pageSize triples, so that the triples of abstractions with very many connections do not have to be held in memory at once.
+    The pages are ordered by the ids of the triple nodes and each page continues after the last triple node of the previous page.
+    """
+    lastTripleId = -1
+    while True:
+        records = framework._run("MATCH (c)<-[:subj|pred|obj]-(t:AbstractionTriple) WHERE id(c) = $id AND id(t) > $lastTripleId "
+                                 "WITH DISTINCT t ORDER BY id(t) LIMIT $pageSize MATCH (n)-[:ownsTriple]->(t)-[:subj]->(s), (t)-[:pred]->(p), (t)-[:obj]->(o) "
+                                 "RETURN id(s), id(p), id(o), id(n), id(t) ORDER BY id(t)", id=id, lastTripleId=lastTripleId, pageSize=pageSize).values()
+        if len(records) == 0:
+            break
+        lastTripleId = records[-1][4]
+        if rawIDs:
+            yield [tuple(record[:4]) for record in records]
+        else:
+            yield [tuple([framework._getAbstractionIdWrapper(item) for item in record[:4]]) for record in records]
+        if len(records) < pageSize:
+            break
+
+def getAbstractionContentEntries(ids, framework):
+    """
+    Returns a dictionary that maps each of the given abstraction ids to a tuple of its type, its content and its remembered flag.
+    The content contains abstraction ids instead of abstractions and 0 for the self references of constructed abstractions.
+    The entries are taken from the content cache of the framework and the missing ones are fetched together in a single query.
+    """
+    result = {}
+    missingIds = []
+    for id in ids:
+        entry = framework._getCachedContent(id)
+        if entry == None:
+            missingIds.append(id)
+        else:
+            result[id] = entry
+    if len(missingIds) == 0:
+        return result
+    records = framework._run("UNWIND $ids AS abstractionId MATCH (n) WHERE id(n) = abstractionId "
+                             "OPTIONAL MATCH (n)-[:ownsTriple]->(t:AbstractionTriple)-[:subj]->(s), (t)-[:pred]->(p), (t)-[:obj]->(o) "
+                             "WITH n, collect(CASE WHEN t IS NULL THEN NULL ELSE [id(s), id(p), id(o)] END) AS triples "
+                             "OPTIONAL MATCH (n)-[:isAbstractionOf|isInverseAbstractionOf]->(m) "
+                             "RETURN id(n), labels(n), n.data, n.format, triples, id(m), coalesce(n.remember, false)", ids=missingIds).values()
+    for id, labels, data, format, triples, innerId, remember in records:
+        type = set({"ConstructedAbstraction", "DirectDataAbstraction", "DirectAbstraction", "InverseDirectAbstraction"}).intersection(labels).pop()
+        if type == "DirectDataAbstraction":
+            content = (data, format)
+        elif type == "ConstructedAbstraction":
+            content = frozenset([tuple([0 if element == id else element for element in triple]) for triple in triples])
+        else:
+            content = innerId
+        result[id] = (type, content, remember)
+        framework._cacheContent(id, result[id])
+    return result
 
-def searchRALJPattern(pattern, framework, data = None, constructed = None, directAbstractions = None, inverseDirectAbstractions = None, triples = None):
+def searchRALJPattern(pattern, framework, data = None, constructed = None, directAbstractions = None, inverseDirectAbstractions = None, triples = None, rawIDs = False):
     """
     Searches for appearances of the given pattern in the neo4j database and returns a list of dictionaries that map the ids of the ralj pattern to the corresponding neo4j abstractions.
+    If rawIDs is True, it returns a list of tuples of the neo4j ids in the order of getRALJPatternParameterNames instead.
     The data block represented by the data keyword argument consists of a dictionary that maps the ids of the data concepts to a tuple of the data and the format of the data concept.
     When searching for direct data concepts with unknown data or format, the data or format can be set to a list containing only the id of the unknown data or format.
     The constructed block represented by the constructed keyword argument consists of a dictionary that maps the ids of the constructed concepts to a list of triples that represent the connections of the constructed concept.
     When searching for constructed concepts that can have more than the listed connections, a "+" has to be added at the end of the connection list.
     """
-    # Load the neo4j session
-    neo4j_session = framework._neo4j_session
     # Load the blocks of the pattern
+    dataConceptBlock, constructedConceptBlock, directAbstractionBlock, inverseDirectAbstractionBlock, abstractionTriplesBlock = getRALJPatternBlocks(pattern, data, constructed, directAbstractions, inverseDirectAbstractions, triples)
+    # Reduce the pattern to its shape, in which the parameters and abstractions are replaced by their order of appearance, and the query parameters
+    localIndices = {}
+    globalIndices = {}
+    parameters = {}
+    def getElementName(element, errorMessage):
+        if type(element) == str:
+            return "local" + str(localIndices.setdefault(element, len(localIndices)))
+        elif type(element) == Neo4jAbstraction:
+            if not element.id in globalIndices:
+                globalIndices[element.id] = len(globalIndices)
+                parameters[f"global{globalIndices[element.id]}"] = element.id
+            return "global" + str(globalIndices[element.id])
+        raise ValueError(errorMessage)
+    # Evaluate the dataConceptBlock
+    dataShape = []
+    for ref, (data, format) in dataConceptBlock.items():
+        refName = getElementName(ref, "The id of a data concept must be an int or a list with one int.")
+        if type(data) != list:
+            parameters[f"data{len(dataShape)}"] = data
+        if type(format) != list:
+            parameters[f"format{len(dataShape)}"] = format
+        dataShape.append((refName, type(data) != list, type(format) != list))
+    # Evaluate the constructedConceptBlock
+    constructedShape = []
+    for ref, connections in constructedConceptBlock.items():
+        refName = getElementName(ref, "The id of a constructed concept must be an int or a list with one int.")
+        exactNumberOfConnections = True
+        if len(connections) > 0 and list(connections)[-1] == "+":
+            connections = list(connections)[:-1]
+            exactNumberOfConnections = False
+        else:
+            parameters[f"connectionCount{len(constructedShape)}"] = len(connections)
+        connectionShape = tuple([tuple([0 if element == 0 else getElementName(element, "The id of a triple concept must be an int or a list with one int.") for element in connection]) for connection in connections])
+        constructedShape.append((refName, exactNumberOfConnections, connectionShape))
+    # Evaluate the directAbstractionBlock
+    directAbstractionShape = []
+    for ref, abstraction in directAbstractionBlock.items():
+        refName = getElementName(ref, "The id of a direct abstraction must be an int or a list with one int.")
+        directAbstractionShape.append((refName, getElementName(abstraction, "The id of an abstraction must be an int or a list with one int.")))
+    # Evaluate the inverseDirectAbstractionBlock
+    inverseDirectAbstractionShape = []
+    for ref, abstraction in inverseDirectAbstractionBlock.items():
+        refName = getElementName(ref, "The id of an inverse direct abstraction must be an int or a list with one int.")
+        inverseDirectAbstractionShape.append((refName, getElementName(abstraction, "The id of an abstraction must be an int or a list with one int.")))
+    # Evaluate the abstractionTriplesBlock
+    tripleShape = []
+    for subj, pred, obj in abstractionTriplesBlock:
+        tripleShape.append(tuple([getElementName(element, "The id of a triple concept must be an int or a list with one int.") for element in (subj, pred, obj)]))
+    if len(localIndices) == 0:
+        raise ValueError("The pattern must contain at least one local id.")
+    # Execute the query and return the result as a list of dictionaries
+    query = getRALJPatternQueryTemplate((tuple(dataShape), tuple(constructedShape), tuple(directAbstractionShape), tuple(inverseDirectAbstractionShape), tuple(tripleShape)), len(localIndices), len(globalIndices))
+    result = framework._run(query, parameters).values()
+    if rawIDs:
+        return [tuple(record) for record in result]
+    localIDs = list(localIndices.keys())
+    result = [dict(zip(localIDs, [framework._getAbstractionIdWrapper(absId) for absId in record])) for record in result]
+    return result
+
+def getRALJPatternBlocks(pattern, data = None, constructed = None, directAbstractions = None, inverseDirectAbstractions = None, triples = None):
+    """
+    Returns the data, constructed, direct abstraction, inverse direct abstraction and triple block of the pattern extended by the blocks of the keyword arguments.
+    """
     assert type(pattern) == list and len(pattern) < 6
-    dataConceptBlock = pattern[0] if len(pattern) > 0 else {}
+    dataConceptBlock = dict(pattern[0]) if len(pattern) > 0 else {}
     if data != None:
         dataConceptBlock.update(data)
-    constructedConceptBlock = pattern[1] if len(pattern) > 1 else {}
+    constructedConceptBlock = dict(pattern[1]) if len(pattern) > 1 else {}
     if constructed != None:
         constructedConceptBlock.update(constructed)
-    directAbstractionBlock = pattern[2] if len(pattern) > 2 else {}
+    directAbstractionBlock = dict(pattern[2]) if len(pattern) > 2 else {}
     if directAbstractions != None:
         directAbstractionBlock.update(directAbstractions)
-    inverseDirectAbstractionBlock = pattern[3] if len(pattern) > 3 else {}
+    inverseDirectAbstractionBlock = dict(pattern[3]) if len(pattern) > 3 else {}
     if inverseDirectAbstractions != None:
         inverseDirectAbstractionBlock.update(inverseDirectAbstractions)
-    abstractionTriplesBlock = pattern[4] if len(pattern) > 4 else []
+    abstractionTriplesBlock = list(pattern[4]) if len(pattern) > 4 else []
     if triples != None:
         abstractionTriplesBlock.extend(triples)
+    return dataConceptBlock, constructedConceptBlock, directAbstractionBlock, inverseDirectAbstractionBlock, abstractionTriplesBlock
+
+def getRALJPatternParameterNames(pattern, data = None, constructed = None, directAbstractions = None, inverseDirectAbstractions = None, triples = None):
+    """
+    Returns the list of the local ids of the pattern in the order of their first appearance, which is the order of the ids in the raw search results.
+    """
+    dataConceptBlock, constructedConceptBlock, directAbstractionBlock, inverseDirectAbstractionBlock, abstractionTriplesBlock = getRALJPatternBlocks(pattern, data, constructed, directAbstractions, inverseDirectAbstractions, triples)
+    elements = [*dataConceptBlock.keys()]
+    for ref, connections in constructedConceptBlock.items():
+        elements.append(ref)
+        elements.extend([element for connection in connections if connection != "+" for element in connection])
+    for ref, abstraction in [*directAbstractionBlock.items(), *inverseDirectAbstractionBlock.items()]:
+        elements.extend([ref, abstraction])
+    elements.extend([element for triple in abstractionTriplesBlock for element in triple])
+    return list(dict.fromkeys([element for element in elements if type(element) == str]))
+
+@lru_cache(maxsize = 256)
+def getRALJPatternQueryTemplate(patternShape, numberOfLocalIDs, numberOfGlobalIDs):
+    """
+    Returns the cypher query of a RALJ pattern with the given shape.
+    In the pattern shape the local ids are named local0, local1, ... and the abstractions global0, global1, ... in the order of their appearance.
+    The query returns the ids of the local ids in this order and expects the ids of the abstractions, the known data and formats and the exact connection counts as query parameters.
+    """
+    dataShape, constructedShape, directAbstractionShape, inverseDirectAbstractionShape, tripleShape = patternShape
     structureStringArray = []
-    globalIDs = set()
-    localIDs = set()
     # Evaluate the dataConceptBlock
-    for ref, (data, format) in dataConceptBlock.items():
-        dataAndFormat = ", ".join([*([] if type(data) == list else[f"data: '{data}'"]), *([] if type(format) == list else[f"format: '{format}'"])])
-        if type(ref) == str:
-            refName = "local" + ref.encode("utf-8").hex()
-            localIDs.add(ref)
-        elif type(ref) == Neo4jAbstraction:
-            refName = "global" + str(ref.id)
-            globalIDs.add(ref.id)
-        else:
-            raise ValueError("The id of a data concept must be an int or a list with one int.")
+    for dataIndex, (refName, dataIsKnown, formatIsKnown) in enumerate(dataShape):
+        dataAndFormat = ", ".join([*([f"data: $data{dataIndex}"] if dataIsKnown else []), *([f"format: $format{dataIndex}"] if formatIsKnown else [])])
         structureStringArray.append(f"({refName}:DirectDataAbstraction {{{dataAndFormat}}})")
     # Evaluate the constructedConceptBlock
     tripelIndex = 0
-    for ref, connections in constructedConceptBlock.items():
-        if type(ref) == str:
-            refName = "local" + ref.encode("utf-8").hex()
-            localIDs.add(ref)
-        elif type(ref) == Neo4jAbstraction:
-            refName = "global" + str(ref.id)
-            globalIDs.add(ref.id)
+    for constructedIndex, (refName, exactNumberOfConnections, connectionShape) in enumerate(constructedShape):
+        if exactNumberOfConnections:
+            structureStringArray.append(f"({refName}:ConstructedAbstraction {{connectionCount: $connectionCount{constructedIndex}}})")
         else:
-            raise ValueError("The id of a constructed concept must be an int or a list with one int.")
-        if len(connections) > 0 and list(connections)[-1] == "+":
-            connections = list(connections)[:-1]
             structureStringArray.append(f"({refName}:ConstructedAbstraction)")
-        else:
-            structureStringArray.append(f"({refName}:ConstructedAbstraction {{connectionCount: {len(connections)}}})")
-        for connection in connections:
+        for connection in connectionShape:
             structureStringArray.append(f"({refName})-[:ownsTriple]->(triple{tripelIndex}:AbstractionTriple)")
-            for i, element in enumerate(connection):
-                if element == 0:
-                    structureStringArray.append(f"(triple{tripelIndex})-[:{['subj', 'pred', 'obj'][i]}]->({refName})")
-                elif type(element) == str:
-                    elementName = "local" + element.encode("utf-8").hex()
-                    structureStringArray.append(f"(triple{tripelIndex})-[:{['subj', 'pred', 'obj'][i]}]->({elementName})")
-                    localIDs.add(element)
-                elif type(element) == Neo4jAbstraction:
-                    elementName = "global" + str(element.id)
-                    structureStringArray.append(f"(triple{tripelIndex})-[:{['subj', 'pred', 'obj'][i]}]->({elementName})")
-                    globalIDs.add(element.id)
-                else:
-                    raise ValueError("The id of a triple concept must be an int or a list with one int.")
+            for i, elementName in enumerate(connection):
+                structureStringArray.append(f"(triple{tripelIndex})-[:{['subj', 'pred', 'obj'][i]}]->({refName if elementName == 0 else elementName})")
             tripelIndex += 1
     # Evaluate the directAbstractionBlock
-    for ref, abstraction in directAbstractionBlock.items():
-        if type(ref) == str:
-            refName = "local" + ref.encode("utf-8").hex()
-            localIDs.add(ref)
-        elif type(ref) == Neo4jAbstraction:
-            refName = "global" + str(ref.id)
-            globalIDs.add(ref.id)
-        else:
-            raise ValueError("The id of a direct abstraction must be an int or a list with one int.")
-        if type(abstraction) == str:
-            abstractionName = "local" + abstraction.encode("utf-8").hex()
-            structureStringArray.append(f"({refName}:DirectAbstraction)-[:isAbstractionOf]->({abstractionName})")
-            localIDs.add(abstraction)
-        elif type(abstraction) == Neo4jAbstraction:
-            abstractionName = "global" + str(abstraction.id)
-            structureStringArray.append(f"({refName}:DirectAbstraction)-[:isAbstractionOf]->({abstractionName})")
-            globalIDs.add(abstraction.id)
-        else:
-            raise ValueError("The id of an abstraction must be an int or a list with one int.")
+    for refName, abstractionName in directAbstractionShape:
+        structureStringArray.append(f"({refName}:DirectAbstraction)-[:isAbstractionOf]->({abstractionName})")
     # Evaluate the inverseDirectAbstractionBlock
-    for ref, abstraction in inverseDirectAbstractionBlock.items():
-        if type(ref) == str:
-            refName = "local" + ref.encode("utf-8").hex()
-            localIDs.add(ref)
-        elif type(ref) == Neo4jAbstraction:
-            refName = "global" + str(ref.id)
-            globalIDs.add(ref.id)
-        else:
-            raise ValueError("The id of an inverse direct abstraction must be an int or a list with one int.")
-        if type(abstraction) == str:
-            abstractionName = "local" + abstraction.encode("utf-8").hex()
-            structureStringArray.append(f"({refName}:InverseDirectAbstraction)-[:isInverseAbstractionOf]->({abstractionName})")
-            localIDs.add(abstraction)
-        elif type(abstraction) == Neo4jAbstraction:
-            abstractionName = "global" + str(abstraction.id)
-            structureStringArray.append(f"({refName}:InverseDirectAbstraction)-[:isInverseAbstractionOf]->({abstractionName})")
-            globalIDs.add(abstraction.id)
-        else:
-            raise ValueError("The id of an abstraction must be an int or a list with one int.")
+    for refName, abstractionName in inverseDirectAbstractionShape:
+        structureStringArray.append(f"({refName}:InverseDirectAbstraction)-[:isInverseAbstractionOf]->({abstractionName})")
     # Evaluate the abstractionTriplesBlock
-    for subj, pred, obj in abstractionTriplesBlock:
-        if type(subj) == str:
-            subjName = "local" + subj.encode("utf-8").hex()
-            localIDs.add(subj)
-        elif type(subj) == Neo4jAbstraction:
-            subjName = "global" + str(subj.id)
-            globalIDs.add(subj.id)
-        else:
-            raise ValueError("The id of a triple concept must be an int or a list with one int.")
-        if type(pred) == str:
-            predName = "local" + pred.encode("utf-8").hex()
-            localIDs.add(pred)
-        elif type(pred) == Neo4jAbstraction:
-            predName = "global" + str(pred.id)
-            globalIDs.add(pred.id)
-        else:
-            raise ValueError("The id of a triple concept must be an int or a list with one int.")
-        if type(obj) == str:
-            objName = "local" + obj.encode("utf-8").hex()
-            localIDs.add(obj)
-        elif type(obj) == Neo4jAbstraction:
-            objName = "global" + str(obj.id)
-            globalIDs.add(obj.id)
-        else:
-            raise ValueError("The id of a triple concept must be an int or a list with one int.")
+    for subjName, predName, objName in tripleShape:
         structureStringArray.append(f"(triple{tripelIndex}:AbstractionTriple)-[:subj]->({subjName}), (triple{tripelIndex})-[:pred]->({predName}), (triple{tripelIndex})-[:obj]->({objName})")
         tripelIndex += 1
     # Create the query string
     structureString = "MATCH " + ", ".join(structureStringArray)
-    if len(globalIDs) > 0:
-        structureString += " WHERE " +  " AND ".join([f"id(global{id}) = {id}" for id in globalIDs])
-    if len(localIDs) == 0:
-        raise ValueError("The pattern must contain at least one local id.")
-    localIDs = list(localIDs)
-    structureString += " RETURN " + ", ".join([f"id(local{id.encode('utf-8').hex()})" for id in localIDs])
-    # Execute the query and return the result as a list of dictionaries
-    result = neo4j_session.run(structureString).values()
-    result = [dict(zip(localIDs, [framework._getAbstractionIdWrapper(absId) for absId in record])) for record in result]
-    return result
+    if numberOfGlobalIDs > 0:
+        structureString += " WHERE " + " AND ".join([f"id(global{i}) = $global{i}" for i in range(numberOfGlobalIDs)])
+    structureString += " RETURN " + ", ".join([f"id(local{i})" for i in range(numberOfLocalIDs)])
+    return structureString
+
+def getQueryTemplateCacheInfo():
+    """
+    Returns the hit and miss statistics of the caches of the query templates by the name of the cached template function.
+    """
+    return {
+        "ConstructedAbstraction" : getConstructedAbstractionQueryTemplates.cache_info(),
+        "searchRALJPattern" : getRALJPatternQueryTemplate.cache_info(),
+    }
 
 def listAllAbstractions(framework):
     """
     Returns a list of all abstractions in the neo4j database.
     """
-    neo4j_session = framework._neo4j_session
-    result = neo4j_session.run("MATCH (n:Abstraction) RETURN id(n)").value()
+    result = framework._run("MATCH (n:Abstraction) RETURN id(n)").value()
     return [framework._getAbstractionIdWrapper(id) for id in result]
\ No newline at end of file
@@ -1,29 +1,20 @@
 def getIndirectConnections(concept, RALFramework):
     """
     Get the indirect connections of a abstract concept.
+    These are the triples of the other abstractions that contain the concept, in which the concept is replaced by None.
     """
-    connections = set()
+    return set(getIndirectConnectionsOfTriples(concept, RALFramework.getIncidentTriples(concept)))
 
-    newConnections = RALFramework.searchRALJPattern([{}, {"1" : [[concept, "2", 0], "+"]}])
-    connections.update([(concept, newConnection["2"], newConnection["1"]) for newConnection in newConnections])
-    newConnections = RALFramework.searchRALJPattern([{}, {"1" : [[concept, 0, "2"], "+"]}])
-    connections.update([(concept, newConnection["1"], newConnection["2"]) for newConnection in newConnections])
-    newConnections = RALFramework.searchRALJPattern([{}, {"1" : [[concept, 0, 0], "+"]}])
-    connections.update([(concept, newConnection["1"], newConnection["1"]) for newConnection in newConnections])
-
-    newConnections = RALFramework.searchRALJPattern([{}, {"1" : [["2", concept, 0], "+"]}])
-    connections.update([(newConnection["2"], concept, newConnection["1"]) for newConnection in newConnections])
-    newConnections = RALFramework.searchRALJPattern([{}, {"1" : [[0, concept, "2"], "+"]}])
-    connections.update([(newConnection["1"], concept, newConnection["2"]) for newConnection in newConnections])
-    newConnections = RALFramework.searchRALJPattern([{}, {"1" : [[0, concept, 0], "+"]}])
-    connections.update([(newConnection["1"], concept, newConnection["1"]) for newConnection in newConnections])
-
-    newConnections = RALFramework.searchRALJPattern([{}, {"1" : [["2", 0, concept], "+"]}])
-    connections.update([(newConnection["2"], newConnection["1"], concept) for newConnection in newConnections])
-    newConnections = RALFramework.searchRALJPattern([{}, {"1" : [[0, "2", concept], "+"]}])
-    connections.update([(newConnection["1"], newConnection["2"], concept) for newConnection in newConnections])
-    newConnections = RALFramework.searchRALJPattern([{}, {"1" : [[0, 0, concept], "+"]}])
-    connections.update([(newConnection["1"], newConnection["1"], concept) for newConnection in newConnections])
+def iterateIndirectConnections(concept, RALFramework, pageSize = 10000):
+    """
+    Yields the indirect connections of a abstract concept page by page, so that the connections of concepts with very many connections do not have to be held in memory at once.
+    """
+    for triples in RALFramework.getIncidentTriplePages(concept, pageSize):
+        yield from getIndirectConnectionsOfTriples(concept, triples)
 
-    connections = set([(None if y == concept else y for y in x) for x in connections])
-    return connections
\ No newline at end of file
+def getIndirectConnectionsOfTriples(concept, triples):
+    """
+    Get the indirect connections of a abstract concept from the triples that contain it, given as tuples of the subject, predicate, object and owner.
+    """
+    # The triples of the concept itself are its base connections
+    return [tuple([None if item == concept else item for item in (subject, predicate, object)]) for subject, predicate, object, owner in triples if owner != concept]
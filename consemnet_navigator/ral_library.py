@@ -1,23 +1,26 @@
 from pathlib import Path
+import hashlib
+import json
 import sqlite3
-from random import randint
-from tempfile import NamedTemporaryFile
-from .ralj_loader import loadRALJFile, loadRALJData, saveRALJFile, saveRALJData
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .ralj_loader import loadRALJFile, loadRALJData, saveRALJFile, saveRALJData, prepareRALJData, getRequiredJsonNodeIDs
 from .sqlite_ral_framework import SQLiteRALFramework
-from .network_transformation import transformRALNetwork, RALIdentityTransformation
 
 readmeText = """
 # RAL Library
 """
 
 class RALLibrary:
-    def __init__(self, path, keywordFinder = None):
+    def __init__(self, path, keywordFinder = None, postingCacheSize = 1 << 20, workers = None):
         """
         A library of RAL data, that is stored internally in different ralj files.
         The RALLibrary keeps track which of those files contain which keywords of which indices.
+        The keywordFinder is a function that returns the keywords of the abstractions in a RALFramework. If it is None, the keywords are the text data concepts, that are read directly from the serialized data.
+        The postingCacheSize is the maximal number of data file ids that the index keeps in memory for the keywords that were queried recently.
+        If the library is sharded with rebalance, the shards of the index are queried by a pool of workers threads.
         """
-        if keywordFinder == None:
-            keywordFinder = findTextKeywords
         self._keywordFinder = keywordFinder
         self._path = Path(path).resolve()
         self._rootPath = self._path.parent
@@ -28,61 +31,782 @@ class RALLibrary:
         self._readmePath = self._path / "README.md"
         if not self._readmePath.exists():
             self._readmePath.write_text(readmeText)
-        self._indexPath = self._path / "index.sqlite"
-        self._conn = sqlite3.connect(str(self._indexPath))
-        self._cur = self._conn.cursor()
-        self._cur.execute("CREATE TABLE IF NOT EXISTS dataFiles (id INTEGER PRIMARY KEY, name TEXT)")
-        self._cur.execute("CREATE TABLE IF NOT EXISTS keywords (id INTEGER PRIMARY KEY, keyword INTEGER, UNIQUE(keyword))")
-        self._cur.execute("CREATE TABLE IF NOT EXISTS keywordOccurrences (keywordId INTEGER, dataFileId INTEGER)")
-        self._conn.commit()
+        self._configPath = self._path / "library.json"
+        self._prefixLength = json.loads(self._configPath.read_text())["shardPrefixLength"] if self._configPath.exists() else 0
+        self._postingCacheSize = postingCacheSize
+        self._workers = workers
+        self._index = ShardedRALLibraryIndex(self._path, self._prefixLength, postingCacheSize, workers)
+        # For each RAL framework the loaded data files of older versions of the library with their modification time, size and abstractions by json node id
+        # and the loaded abstractions of the content addressed data files by content hash together with the content hashes that they refer to
+        self._loadedData = {}
+        if self._index.requiresReindex:
+            self.reindex()
     def saveData(self, abstractConcepts, RALFramework):
         """
         Save the data to the library and return the set of keywords.
+        The abstractConcepts are serialized once and the keywords are found in the serialized data.
+        The abstractions are identified by hashes of their content. Only the abstractions that are not stored in the library yet are written into a new data file, that is named by the hash of its content.
+        The keywords are added to an entry, that refers to the saved abstractions which no other saved abstraction refers to by their content hashes. Saving the same abstractions again only adds the new keywords to their entry.
         """
-        with NamedTemporaryFile() as tempFile:
-            with SQLiteRALFramework(tempFile.name) as SRF:
-                result = transformRALNetwork(abstractConcepts, RALFramework, SRF, RALIdentityTransformation)
-                keywords = self._keywordFinder(SRF)
-        hexname = self._saveDataToFile(abstractConcepts, RALFramework)
-        self._addFileToIndex(hexname, keywords)
-    def loadData(self, keywords, RALFramework):
+        data = saveRALJData(abstractConcepts, RALFramework)
+        keywords = self._findKeywords(data)
+        nodes = getCanonicalRALJNodes(data)
+        storedNodes = self._index.getNodeDataFiles(nodes.keys())
+        newNodes = {nodeHash : node for nodeHash, node in nodes.items() if nodeHash not in storedNodes}
+        if len(newNodes) > 0:
+            self._saveChunk(newNodes)
+        if len(nodes) > 0:
+            self._saveEntry(getRootNodeHashes(nodes), keywords)
+        return set(keywords)
+    def loadData(self, keywords, RALFramework, matchAll = False):
         """
         Load the data that is associated with a single keyword or a set of keywords.
+        If matchAll is True, only the entries and data files that contain all of the keywords are loaded, otherwise those that contain any of them.
+        Of the content addressed data files only the abstractions that the found entries refer to directly or indirectly are read. Every stored abstraction is only loaded once into a RALFramework and loaded again only if it has been deleted from the RALFramework.
+        The data files of older versions of the library are loaded completely and not loaded again as long as their modification time and size do not change and none of their abstractions has been deleted.
         """
         keywords = keywords if type(keywords) in (list, set, tuple) else [keywords]
-        relevantFiles = set()
-        for keyword in keywords:
-            self._cur.execute("SELECT name FROM dataFiles WHERE id IN (SELECT dataFileId FROM keywordOccurrences WHERE keywordId IN (SELECT id FROM keywords WHERE keyword = ?))", (keyword,))
-            relevantFiles.update([x[0] for x in self._cur.fetchall()])
+        loadedDataFiles, loadedNodes = self._getLoadedData(RALFramework)
         result = set()
-        for hexname in relevantFiles:
-            result.update(self._loadDataFromFile(hexname, RALFramework).values())
+        names = self._index.findDataFiles(keywords, matchAll)
+        rootsByEntry = self._index.getEntryRoots(names)
+        for name in names.difference(rootsByEntry.keys()):
+            stat = self._getDataFilePath(name).stat()
+            fileState = (stat.st_mtime_ns, stat.st_size)
+            loadedDataFile = loadedDataFiles.get(name)
+            if loadedDataFile == None or loadedDataFile[0] != fileState or not all([RALFramework.isValidAbstraction(abstraction) for abstraction in loadedDataFile[1].values()]):
+                loadedDataFile = loadedDataFiles[name] = (fileState, self._loadDataFromFile(name, RALFramework))
+            result.update(loadedDataFile[1].values())
+        # Collect the content hashes of the abstractions that the entries refer to and read the missing abstractions from the data files that store them
+        nodeHashes = set()
+        nodes = {}
+        nodesByDataFile = {}
+        uncheckedNodeHashes = [nodeHash for roots in rootsByEntry.values() for nodeHash in roots]
+        while len(uncheckedNodeHashes) > 0:
+            missingNodeHashes = set()
+            nextNodeHashes = []
+            for nodeHash in uncheckedNodeHashes:
+                if nodeHash in nodeHashes:
+                    continue
+                nodeHashes.add(nodeHash)
+                # The loaded abstraction could have been deleted from the RALFramework since
+                if nodeHash in loadedNodes and not RALFramework.isValidAbstraction(loadedNodes[nodeHash][0]):
+                    del loadedNodes[nodeHash]
+                if nodeHash in loadedNodes:
+                    nextNodeHashes.extend(loadedNodes[nodeHash][1])
+                else:
+                    missingNodeHashes.add(nodeHash)
+            nodeDataFiles = self._index.getNodeDataFiles(missingNodeHashes)
+            if len(nodeDataFiles) < len(missingNodeHashes):
+                raise ValueError(f"The library does not contain the abstractions with the content hashes {', '.join(sorted(missingNodeHashes.difference(nodeDataFiles.keys()))[:5])}.")
+            for nodeHash, name in nodeDataFiles.items():
+                if name not in nodesByDataFile:
+                    nodesByDataFile[name] = self._readNodes(name)
+                nodes[nodeHash] = nodesByDataFile[name][nodeHash]
+                nextNodeHashes.extend(getRequiredJsonNodeIDs(*nodes[nodeHash]))
+            uncheckedNodeHashes = nextNodeHashes
+        if len(nodes) > 0:
+            # Load the missing abstractions together, so that each of them is only loaded once
+            abstractions = loadRALJData(getRALJDataFromNodes(nodes), RALFramework, {nodeHash : loadedNodes[nodeHash][0] for nodeHash in nodeHashes if nodeHash in loadedNodes})
+            for nodeHash, node in nodes.items():
+                loadedNodes[nodeHash] = (abstractions[nodeHash], tuple(getRequiredJsonNodeIDs(*node)))
+        result.update([loadedNodes[nodeHash][0] for nodeHash in nodeHashes])
         return result
-    def _addFileToIndex(self, hexname, keywords):
-        self._cur.execute("INSERT INTO dataFiles (name) VALUES (?)", (hexname,))
-        dataFileId = self._cur.lastrowid
-        for keyword in keywords:
-            self._cur.execute("INSERT OR IGNORE INTO keywords (keyword) VALUES (?)", (keyword,))
-            keywordId = self._cur.lastrowid
-            self._cur.execute("INSERT INTO keywordOccurrences (keywordId, dataFileId) VALUES (?, ?)", (keywordId, dataFileId))
-        self._conn.commit()
-    def _saveDataToFile(self, abstractConcepts, RALFramework):
-        hexname = ""
-        dataFilePath = None
-        while True:
-            hexname += bytes([randint(0, 255)]).hex()
-            dataFilePath = self._dataPath / (hexname + ".ralj")
-            if not dataFilePath.exists():
-                break
-        saveRALJFile(abstractConcepts, str(dataFilePath), RALFramework)
-        return hexname
+    def compact(self, minimumSize = 1 << 16, maximumSize = 1 << 20):
+        """
+        Merges the data files that are smaller than minimumSize bytes into content addressed data files of up to about maximumSize bytes and converts the data files of older versions of the library into content addressed ones.
+        Abstractions that are stored in several of the merged data files are only kept once. The entries keep referring to the same abstractions, so the merged data files do not change which abstractions are loaded for a keyword.
+        The keywords of a converted data file are moved to an entry, that refers to the abstractions of the data file which no other abstraction of it refers to.
+        Returns a dictionary with the numbers of merged and written data files and the numbers of bytes before and after the compaction.
+        """
+        # Group the data files that have to be merged
+        groups = []
+        group = []
+        groupSize = 0
+        for name, size, isChunk in self._index.getDataFiles():
+            if size == None:
+                size = self._getDataFilePath(name).stat().st_size
+            if size >= minimumSize:
+                if not isChunk:
+                    groups.append([name])
+                continue
+            if groupSize + size > maximumSize and len(group) > 0:
+                groups.append(group)
+                group = []
+                groupSize = 0
+            group.append(name)
+            groupSize += size
+        if len(group) > 0:
+            groups.append(group)
+        result = {"mergedFiles" : 0, "writtenFiles" : 0, "bytesBefore" : 0, "bytesAfter" : 0}
+        for group in groups:
+            if len(group) == 1 and self._index.isChunk(group[0]):
+                continue
+            result["mergedFiles"] += len(group)
+            result["bytesBefore"] += sum([self._getDataFilePath(name).stat().st_size for name in group])
+            name = self._mergeDataFiles(group)
+            if name != None:
+                result["writtenFiles"] += 1
+                result["bytesAfter"] += self._getDataFilePath(name).stat().st_size
+        return result
+    def reindex(self):
+        """
+        Rebuilds the keyword index from the data files and entries of the library with the keyword finder.
+        The keywords of an entry are found in the abstractions that it refers to directly or indirectly.
+        The abstractions of content addressed data files of older versions of the library, that no entry refers to, get an entry for each data file.
+        """
+        dataFiles = {}
+        nodesByDataFile = {}
+        allNodes = {}
+        nodeDataFiles = {}
+        for dataFilePath in sorted(self._dataPath.rglob("*.ralj")):
+            with open(dataFilePath, "r") as file:
+                data = json.load(file)
+            nodes = getRALJNodes(data)
+            if dataFilePath.stem != getNodeSetHash(nodes.keys()):
+                dataFiles[dataFilePath.stem] = (self._findKeywords(data), dataFilePath.stat().st_size, None, None)
+                continue
+            nodesByDataFile[dataFilePath.stem] = nodes
+            allNodes.update(nodes)
+            for nodeHash in nodes.keys():
+                nodeDataFiles.setdefault(nodeHash, dataFilePath.stem)
+        for name, nodes in nodesByDataFile.items():
+            dataFiles[name] = ([], self._getDataFilePath(name).stat().st_size, [nodeHash for nodeHash in nodes.keys() if nodeDataFiles[nodeHash] == name], None)
+        rootsByEntry = {entryPath.stem : json.loads(entryPath.read_text()) for entryPath in sorted(self._dataPath.rglob("*.entry"))}
+        referencedNodeHashes = getNodeClosure([nodeHash for roots in rootsByEntry.values() for nodeHash in roots], allNodes).keys()
+        for name, nodes in nodesByDataFile.items():
+            unreferencedNodes = {nodeHash : node for nodeHash, node in nodes.items() if nodeHash not in referencedNodeHashes}
+            if len(unreferencedNodes) > 0:
+                roots = getRootNodeHashes(unreferencedNodes)
+                rootsByEntry[self._writeEntry(roots)] = roots
+        for name, roots in rootsByEntry.items():
+            dataFiles[name] = (self._findKeywords(getRALJDataFromNodes(getNodeClosure(roots, allNodes))), None, None, roots)
+        self._index.rebuild(dataFiles)
+    def rebalance(self, prefixLength):
+        """
+        Moves the data files, the entries and the keyword index of the library into 16 ** prefixLength shards, that are selected by the first prefixLength hexadecimal digits of their names.
+        The data files and entries are moved into subdirectories of the data directory that are named by their prefixes and the rows of the index are copied into the new shards of the index.
+        With a prefixLength of 0 the library is moved back into a single data directory and index.
+        """
+        if prefixLength == self._prefixLength:
+            return
+        newIndex = ShardedRALLibraryIndex(self._path, prefixLength, self._postingCacheSize, self._workers)
+        newIndex.rebuild(self._index.getDataFileEntries())
+        for dataFilePath in list(self._dataPath.rglob("*.ralj")) + list(self._dataPath.rglob("*.entry")):
+            newDataFilePath = getDataFilePath(self._dataPath, dataFilePath.stem, prefixLength, dataFilePath.suffix)
+            newDataFilePath.parent.mkdir(exist_ok = True)
+            dataFilePath.replace(newDataFilePath)
+        self._configPath.write_text(json.dumps({"shardPrefixLength" : prefixLength}))
+        # Remove the old index and the empty data directories
+        self._index.remove()
+        self._index = newIndex
+        self._prefixLength = prefixLength
+        for directory in list(self._dataPath.iterdir()):
+            if directory.is_dir() and not any(directory.iterdir()):
+                directory.rmdir()
+    def close(self):
+        """
+        Closes the keyword index of the library.
+        """
+        self._index.close()
+    def _getLoadedData(self, RALFramework):
+        if RALFramework not in self._loadedData:
+            self._loadedData[RALFramework] = ({}, {})
+            RALFramework.onClose.add(self._forgetLoadedData)
+        return self._loadedData[RALFramework]
+    def _forgetLoadedData(self, RALFramework):
+        self._loadedData.pop(RALFramework, None)
+    def _findKeywords(self, data):
+        # Find the keywords in the RALJ data or in a staging copy of it in an in-memory database if a keyword finder is given
+        if self._keywordFinder == None:
+            return findTextKeywordsInRALJData(data)
+        SRF = SQLiteRALFramework(":memory:", deferredGarbageCollection = True)
+        abstractions = loadRALJData(data, SRF)
+        keywords = self._keywordFinder(SRF)
+        SRF.close()
+        return keywords
+    def _mergeDataFiles(self, names):
+        # Merge the data files into a new content addressed data file and return its name or None if all of their abstractions are stored in other data files
+        nodes = {}
+        entries = []
+        for name in names:
+            with open(self._getDataFilePath(name), "r") as file:
+                data = json.load(file)
+            if self._index.isChunk(name):
+                nodes.update(getRALJNodes(data))
+            else:
+                # The keywords of the data file move to an entry of its abstractions
+                nodesOfDataFile = getCanonicalRALJNodes(data)
+                nodes.update(nodesOfDataFile)
+                if len(nodesOfDataFile) > 0:
+                    entries.append((getRootNodeHashes(nodesOfDataFile), self._index.getKeywords(name)))
+        storedNodes = {nodeHash : name for nodeHash, name in self._index.getNodeDataFiles(nodes.keys()).items() if name not in names}
+        newNodes = {nodeHash : node for nodeHash, node in nodes.items() if nodeHash not in storedNodes}
+        newName = self._saveChunk(newNodes) if len(newNodes) > 0 else None
+        for roots, keywords in entries:
+            self._saveEntry(roots, keywords)
+        oldNames = [name for name in names if name != newName]
+        self._index.removeDataFiles(oldNames)
+        for name in oldNames:
+            self._getDataFilePath(name).unlink()
+            for loadedDataFiles, loadedNodes in self._loadedData.values():
+                loadedDataFiles.pop(name, None)
+        return newName
+    def _saveChunk(self, nodes):
+        # Write the nodes into a data file that is named by the hash of their node hashes and add it to the index
+        name = getNodeSetHash(nodes.keys())
+        dataFilePath = self._getDataFilePath(name)
+        dataFilePath.parent.mkdir(exist_ok = True)
+        temporaryPath = dataFilePath.with_suffix(".tmp")
+        with open(temporaryPath, "w") as file:
+            json.dump(getRALJDataFromNodes(nodes), file)
+        temporaryPath.replace(dataFilePath)
+        self._index.addDataFile(name, [], dataFilePath.stat().st_size, nodes.keys())
+        return name
+    def _saveEntry(self, roots, keywords):
+        # Write the entry of the root hashes if necessary and add the keywords to it in the index
+        name = self._writeEntry(roots)
+        self._index.addDataFile(name, keywords, roots = roots)
+        return name
+    def _writeEntry(self, roots):
+        # Write the root hashes into an entry file that is named by their hash
+        name = getEntryName(roots)
+        entryPath = getDataFilePath(self._dataPath, name, self._prefixLength, ".entry")
+        if not entryPath.exists():
+            entryPath.parent.mkdir(exist_ok = True)
+            temporaryPath = entryPath.with_suffix(".tmp")
+            temporaryPath.write_text(json.dumps(sorted(roots)))
+            temporaryPath.replace(entryPath)
+        return name
+    def _getDataFilePath(self, name):
+        return getDataFilePath(self._dataPath, name, self._prefixLength)
+    def _readNodes(self, name):
+        with open(self._getDataFilePath(name), "r") as file:
+            return getRALJNodes(json.load(file))
     def _loadDataFromFile(self, hexname, RALFramework):
-        dataFilePath = self._dataPath / (hexname + ".ralj")
-        return loadRALJFile(str(dataFilePath), RALFramework)
+        return loadRALJFile(str(self._getDataFilePath(hexname)), RALFramework)
 
 def findTextKeywords(RALFramework):
     """
     Returns the content of all text direct data abstractions in the RALFramework.
     """
     result = RALFramework.searchRALJPattern(data = {"text" : (["data"], "text")})
-    return [x["data"] for x in result]
\ No newline at end of file
+    return [x["data"] for x in result]
+
+def findTextKeywordsInRALJData(data):
+    """
+    Returns the content of all text direct data abstractions in the RALJ data.
+    """
+    return list(data[0].get("text", {}).keys()) if len(data) > 0 else []
+
+def getCanonicalRALJNodes(data):
+    """
+    Returns a dictionary that maps the content hashes of the abstractions in the RALJ data to tuples of their block index and their content, that refers to the other abstractions by their content hashes.
+    The content hash of an abstraction only depends on its data and format or on the content hashes of the abstractions that it is constructed of, so equal abstractions have the same content hash in all data files.
+    """
+    jsonNodeIDs, dataConcepts, layers = prepareRALJData(data)
+    nodeHashes = []
+    nodes = {}
+    for dataString, format in dataConcepts:
+        nodeHash = getNodeHash(["data", format, dataString])
+        nodeHashes.append(nodeHash)
+        nodes[nodeHash] = (0, (dataString, format))
+    for layer in layers:
+        for blockIndex, content in layer:
+            if blockIndex == 1:
+                # The self references are represented by empty strings, so that the triples can be sorted
+                connections = sorted(set([tuple(["" if y == 0 else nodeHashes[y - 1] for y in x]) for x in content]))
+                nodeHash = getNodeHash(["constructed", connections])
+                content = [[0 if y == "" else y for y in x] for x in connections]
+            else:
+                content = nodeHashes[content]
+                nodeHash = getNodeHash(["direct" if blockIndex == 2 else "inverse", content])
+            nodeHashes.append(nodeHash)
+            nodes[nodeHash] = (blockIndex, content)
+    return nodes
+
+def getRALJNodes(data):
+    """
+    Returns a dictionary that maps the json node ids of the RALJ data to tuples of their block index and their content.
+    """
+    nodes = {}
+    for format, dataConceptsOfFormat in (data[0] if len(data) > 0 else {}).items():
+        for dataString, jsonNodeID in dataConceptsOfFormat.items():
+            nodes[jsonNodeID] = (0, (dataString, format))
+    for blockIndex in [1, 2, 3]:
+        for jsonNodeID, content in (data[blockIndex] if len(data) > blockIndex else {}).items():
+            nodes[jsonNodeID] = (blockIndex, content)
+    return nodes
+
+def getRALJDataFromNodes(nodes):
+    """
+    Returns the RALJ data of a dictionary of nodes in the form that getRALJNodes returns.
+    """
+    data = [{}, {}, {}, {}]
+    for jsonNodeID, (blockIndex, content) in nodes.items():
+        if blockIndex == 0:
+            data[0].setdefault(content[1], {})[content[0]] = jsonNodeID
+        else:
+            data[blockIndex][jsonNodeID] = content
+    return data
+
+def getNodeClosure(nodeHashes, nodes):
+    """
+    Returns the nodes with the given hashes together with all nodes that they refer to directly or indirectly.
+    """
+    closure = {}
+    uncheckedNodeHashes = list(nodeHashes)
+    while len(uncheckedNodeHashes) > 0:
+        nodeHash = uncheckedNodeHashes.pop()
+        if nodeHash in closure:
+            continue
+        closure[nodeHash] = nodes[nodeHash]
+        uncheckedNodeHashes.extend(getRequiredJsonNodeIDs(*closure[nodeHash]))
+    return closure
+
+def getRootNodeHashes(nodes):
+    """
+    Returns the sorted content hashes of the nodes that no other of the nodes refers to.
+    """
+    referencedNodeHashes = set([nodeHash for node in nodes.values() for nodeHash in getRequiredJsonNodeIDs(*node)])
+    return sorted([nodeHash for nodeHash in nodes.keys() if nodeHash not in referencedNodeHashes])
+
+def getNodeHash(value):
+    return hashlib.sha256(json.dumps(value).encode()).hexdigest()[:32]
+
+def getNodeSetHash(nodeHashes):
+    return hashlib.sha256("\n".join(sorted(nodeHashes)).encode()).hexdigest()
+
+def getEntryName(roots):
+    # The prefix distinguishes the name of an entry from the name of a data file with the same content hashes
+    return hashlib.sha256(("entry\n" + "\n".join(sorted(roots))).encode()).hexdigest()
+
+class RALLibraryIndex:
+    def __init__(self, path, postingCacheSize = 1 << 20):
+        """
+        The keyword index of a RALLibrary, that maps the keywords to the names of the entries and the data files of older versions of the library that contain them.
+        For the content addressed data files it stores the content hashes of their abstractions and for the entries the content hashes of the abstractions that they refer to.
+        The data file ids of the keywords that were queried recently are kept as sorted posting lists in a least recently used cache, that holds at most postingCacheSize ids.
+        """
+        # The connection is used by the worker threads of the sharded index, but never by two threads at once
+        self._conn = sqlite3.connect(str(path), check_same_thread = False)
+        self._cur = self._conn.cursor()
+        self._postingCache = OrderedDict()
+        self._postingCacheSize = postingCacheSize
+        self._numberOfCachedPostings = 0
+        self.requiresReindex = False
+        migrateLibraryIndex(self)
+        self._cur.execute("CREATE TEMP TABLE IF NOT EXISTS queryKeywords (keyword INTEGER, UNIQUE(keyword))")
+        self._cur.execute("CREATE TEMP TABLE IF NOT EXISTS queryKeywordIds (id INTEGER PRIMARY KEY)")
+        self._cur.execute("CREATE TEMP TABLE IF NOT EXISTS queryDataFileIds (id INTEGER PRIMARY KEY)")
+        self._cur.execute("CREATE TEMP TABLE IF NOT EXISTS queryNames (name TEXT PRIMARY KEY)")
+        self._conn.commit()
+    def addDataFile(self, name, keywords, size = None, nodeHashes = None, roots = None):
+        """
+        Adds the data file with the given name and its keywords to the index and returns the id of the data file. If the data file is already indexed, the keywords are added to it.
+        The nodeHashes are the content hashes of the abstractions of a content addressed data file. If roots are given, the data file is an entry that refers to the abstractions with these content hashes.
+        """
+        dataFileId, keywordIds = self._insertDataFile(name, keywords, size, nodeHashes, roots)
+        self._conn.commit()
+        self._invalidatePostings(keywordIds)
+        return dataFileId
+    def addDataFiles(self, dataFiles):
+        """
+        Adds the data files of the dataFiles dictionary, that maps their names to tuples of their keywords, size, node hashes and roots as in addDataFile, in one transaction.
+        """
+        keywordIds = []
+        for name, (keywords, size, nodeHashes, roots) in dataFiles.items():
+            keywordIds += self._insertDataFile(name, keywords, size, nodeHashes, roots)[1]
+        self._conn.commit()
+        self._invalidatePostings(keywordIds)
+    def removeDataFile(self, name):
+        """
+        Removes the data file with the given name and its keyword occurrences from the index.
+        """
+        self.removeDataFiles([name])
+    def removeDataFiles(self, names):
+        """
+        Removes the data files with the given names and their keyword occurrences from the index in one transaction.
+        """
+        keywordIds = []
+        for name in names:
+            row = self._cur.execute("SELECT id FROM dataFiles WHERE name = ?", (name,)).fetchone()
+            if row != None:
+                keywordIds += self._deleteDataFile(row[0])
+        self._conn.commit()
+        self._invalidatePostings(keywordIds)
+    def rebuild(self, dataFiles):
+        """
+        Replaces the content of the index by the data files of the dataFiles dictionary, that maps their names to tuples of their keywords, size, node hashes and roots as in addDataFile.
+        """
+        self._cur.execute("DELETE FROM keywordOccurrences")
+        self._cur.execute("DELETE FROM keywords")
+        self._cur.execute("DELETE FROM nodes")
+        self._cur.execute("DELETE FROM entryRoots")
+        self._cur.execute("DELETE FROM dataFiles")
+        self._postingCache.clear()
+        self._numberOfCachedPostings = 0
+        self.requiresReindex = False
+        self.addDataFiles(dataFiles)
+    def findDataFiles(self, keywords, matchAll = False):
+        """
+        Returns the set of the names of the entries and data files that contain all of the keywords if matchAll is True and any of them otherwise.
+        """
+        keywordIds = self._getKeywordIds(keywords)
+        if len(keywordIds) == 0 or (matchAll and len(keywordIds) < self._cur.execute("SELECT count(*) FROM temp.queryKeywords").fetchone()[0]):
+            self._conn.commit()
+            return set()
+        if self._postingCacheSize <= 0:
+            # Combine the posting lists in the database
+            self._setQueryKeywordIds(keywordIds)
+            if matchAll:
+                query = "SELECT dataFileId FROM keywordOccurrences WHERE keywordId IN (SELECT id FROM temp.queryKeywordIds) GROUP BY dataFileId HAVING count(*) = ?"
+                parameters = (len(keywordIds),)
+            else:
+                query = "SELECT DISTINCT dataFileId FROM keywordOccurrences WHERE keywordId IN (SELECT id FROM temp.queryKeywordIds)"
+                parameters = ()
+            dataFileIds = [dataFileId for dataFileId, in self._cur.execute(query, parameters).fetchall()]
+        else:
+            # Combine the cached posting lists starting with the shortest one
+            postings = sorted(self._getPostings(keywordIds), key = len)
+            if matchAll:
+                dataFileIds = set(postings[0])
+                for posting in postings[1:]:
+                    dataFileIds.intersection_update(posting)
+                    if len(dataFileIds) == 0:
+                        break
+            else:
+                dataFileIds = set().union(*postings)
+        names = self._getDataFileNames(dataFileIds)
+        # End the implicit transaction of the temporary tables, so that the index is not locked for other connections
+        self._conn.commit()
+        return names
+    def getNodeDataFiles(self, nodeHashes):
+        """
+        Returns a dictionary that maps those of the content hashes, whose abstractions are stored in content addressed data files, to the names of the data files.
+        """
+        self._cur.execute("CREATE TEMP TABLE IF NOT EXISTS queryNodeHashes (hash TEXT PRIMARY KEY)")
+        self._cur.execute("DELETE FROM temp.queryNodeHashes")
+        self._cur.executemany("INSERT OR IGNORE INTO temp.queryNodeHashes (hash) VALUES (?)", [(nodeHash,) for nodeHash in nodeHashes])
+        # The cross join makes sqlite look up the hashes instead of scanning all nodes
+        result = dict(self._cur.execute("SELECT n.hash, d.name FROM temp.queryNodeHashes q CROSS JOIN nodes n ON n.hash = q.hash JOIN dataFiles d ON d.id = n.dataFileId").fetchall())
+        self._conn.commit()
+        return result
+    def getEntryRoots(self, names):
+        """
+        Returns a dictionary that maps those of the names that are the names of entries to the lists of the content hashes that the entries refer to.
+        """
+        self._cur.execute("DELETE FROM temp.queryNames")
+        self._cur.executemany("INSERT OR IGNORE INTO temp.queryNames (name) VALUES (?)", [(name,) for name in names])
+        result = {}
+        for name, nodeHash in self._cur.execute("SELECT d.name, r.hash FROM temp.queryNames q JOIN dataFiles d ON d.name = q.name JOIN entryRoots r ON r.dataFileId = d.id").fetchall():
+            result.setdefault(name, []).append(nodeHash)
+        self._conn.commit()
+        return result
+    def getDataFiles(self):
+        """
+        Returns a list of tuples of the name, the size and whether it is content addressed for every data file in the index.
+        """
+        return [(name, size, chunk != 0) for name, size, chunk in self._cur.execute("SELECT name, size, chunk FROM dataFiles WHERE chunk != 2 ORDER BY id").fetchall()]
+    def getDataFileEntries(self):
+        """
+        Returns a dictionary that maps the names of all data files and entries to tuples of their keywords, size, node hashes and roots as in addDataFile.
+        """
+        names = {}
+        entries = {}
+        for dataFileId, name, size, chunk in self._cur.execute("SELECT id, name, size, chunk FROM dataFiles").fetchall():
+            names[dataFileId] = name
+            entries[name] = ([], size, [] if chunk == 1 else None, [] if chunk == 2 else None)
+        for dataFileId, keyword in self._cur.execute("SELECT o.dataFileId, k.keyword FROM keywordOccurrences o JOIN keywords k ON k.id = o.keywordId"):
+            entries[names[dataFileId]][0].append(keyword)
+        for dataFileId, nodeHash in self._cur.execute("SELECT dataFileId, hash FROM nodes"):
+            entries[names[dataFileId]][2].append(nodeHash)
+        for dataFileId, nodeHash in self._cur.execute("SELECT dataFileId, hash FROM entryRoots"):
+            entries[names[dataFileId]][3].append(nodeHash)
+        return entries
+    def getKeywords(self, name):
+        """
+        Returns the keywords of the data file with the given name.
+        """
+        return [keyword for keyword, in self._cur.execute("SELECT k.keyword FROM dataFiles d JOIN keywordOccurrences o ON o.dataFileId = d.id JOIN keywords k ON k.id = o.keywordId WHERE d.name = ?", (name,)).fetchall()]
+    def isChunk(self, name):
+        """
+        Returns whether the data file with the given name is content addressed.
+        """
+        row = self._cur.execute("SELECT chunk FROM dataFiles WHERE name = ?", (name,)).fetchone()
+        return row != None and row[0] == 1
+    def getPostingCacheInfo(self):
+        """
+        Returns the number of cached posting lists and the number of data file ids that they contain.
+        """
+        return {"postingLists" : len(self._postingCache), "postings" : self._numberOfCachedPostings, "maxsize" : self._postingCacheSize}
+    def close(self):
+        self._conn.close()
+    def _insertDataFile(self, name, keywords, size = None, nodeHashes = None, roots = None):
+        self._cur.execute("INSERT OR IGNORE INTO dataFiles (name, size, chunk) VALUES (?, ?, ?)", (name, size, 2 if roots != None else 0 if nodeHashes == None else 1))
+        dataFileId = self._cur.execute("SELECT id FROM dataFiles WHERE name = ?", (name,)).fetchone()[0]
+        if nodeHashes != None:
+            # The abstractions that are merged from other data files move to this data file
+            self._cur.executemany("INSERT OR REPLACE INTO nodes (hash, dataFileId) VALUES (?, ?)", [(nodeHash, dataFileId) for nodeHash in nodeHashes])
+        if roots != None:
+            self._cur.executemany("INSERT OR IGNORE INTO entryRoots (dataFileId, hash) VALUES (?, ?)", [(dataFileId, nodeHash) for nodeHash in roots])
+        self._cur.executemany("INSERT OR IGNORE INTO keywords (keyword) VALUES (?)", [(keyword,) for keyword in keywords])
+        # The ids of the keywords have to be selected, because the ignored inserts do not set the last row id
+        keywordIds = self._getKeywordIds(keywords)
+        self._cur.executemany("INSERT OR IGNORE INTO keywordOccurrences (keywordId, dataFileId) VALUES (?, ?)", [(keywordId, dataFileId) for keywordId in keywordIds])
+        return dataFileId, keywordIds
+    def _deleteDataFile(self, dataFileId):
+        # Delete the data file with its keyword occurrences, abstractions and roots and return the ids of its keywords
+        keywordIds = [keywordId for keywordId, in self._cur.execute("SELECT keywordId FROM keywordOccurrences WHERE dataFileId = ?", (dataFileId,)).fetchall()]
+        self._cur.execute("DELETE FROM keywordOccurrences WHERE dataFileId = ?", (dataFileId,))
+        self._cur.execute("DELETE FROM nodes WHERE dataFileId = ?", (dataFileId,))
+        self._cur.execute("DELETE FROM entryRoots WHERE dataFileId = ?", (dataFileId,))
+        self._cur.execute("DELETE FROM dataFiles WHERE id = ?", (dataFileId,))
+        return keywordIds
+    def _getKeywordIds(self, keywords):
+        # Look up the ids of the keywords in one query with a temporary table
+        self._cur.execute("DELETE FROM temp.queryKeywords")
+        self._cur.executemany("INSERT OR IGNORE INTO temp.queryKeywords (keyword) VALUES (?)", [(keyword,) for keyword in keywords])
+        return [keywordId for keywordId, in self._cur.execute("SELECT k.id FROM temp.queryKeywords q JOIN keywords k ON k.keyword = q.keyword").fetchall()]
+    def _setQueryKeywordIds(self, keywordIds):
+        self._cur.execute("DELETE FROM temp.queryKeywordIds")
+        self._cur.executemany("INSERT OR IGNORE INTO temp.queryKeywordIds (id) VALUES (?)", [(keywordId,) for keywordId in keywordIds])
+    def _getPostings(self, keywordIds):
+        # Get the sorted data file ids of the keywords from the cache or with one query for all missing keywords
+        postings = {}
+        missingKeywordIds = []
+        for keywordId in keywordIds:
+            posting = self._postingCache.get(keywordId)
+            if posting == None:
+                missingKeywordIds.append(keywordId)
+            else:
+                self._postingCache.move_to_end(keywordId)
+                postings[keywordId] = posting
+        if len(missingKeywordIds) > 0:
+            self._setQueryKeywordIds(missingKeywordIds)
+            for keywordId in missingKeywordIds:
+                postings[keywordId] = array("q")
+            for keywordId, dataFileId in self._cur.execute("SELECT keywordId, dataFileId FROM keywordOccurrences WHERE keywordId IN (SELECT id FROM temp.queryKeywordIds) ORDER BY keywordId, dataFileId"):
+                postings[keywordId].append(dataFileId)
+            for keywordId in missingKeywordIds:
+                self._cachePosting(keywordId, postings[keywordId])
+        return list(postings.values())
+    def _cachePosting(self, keywordId, posting):
+        if len(posting) > self._postingCacheSize:
+            return
+        self._postingCache[keywordId] = posting
+        self._numberOfCachedPostings += len(posting)
+        # Remove the least recently used posting lists
+        while self._numberOfCachedPostings > self._postingCacheSize:
+            self._numberOfCachedPostings -= len(self._postingCache.popitem(last = False)[1])
+    def _invalidatePostings(self, keywordIds):
+        for keywordId in keywordIds:
+            posting = self._postingCache.pop(keywordId, None)
+            if posting != None:
+                self._numberOfCachedPostings -= len(posting)
+    def _getDataFileNames(self, dataFileIds):
+        self._cur.execute("DELETE FROM temp.queryDataFileIds")
+        self._cur.executemany("INSERT INTO temp.queryDataFileIds (id) VALUES (?)", [(dataFileId,) for dataFileId in dataFileIds])
+        return set([name for name, in self._cur.execute("SELECT d.name FROM temp.queryDataFileIds q JOIN dataFiles d ON d.id = q.id").fetchall()])
+
+class ShardedRALLibraryIndex:
+    def __init__(self, path, prefixLength = 0, postingCacheSize = 1 << 20, workers = None):
+        """
+        The keyword index of a RALLibrary, that is split into up to 16 ** prefixLength shards. Each shard is a RALLibraryIndex of the data files whose names start with the same prefixLength hexadecimal digits.
+        The shards are stored in the index directory of the library and only created when they get their first data file. With a prefixLength of 0 the index is the single database index.sqlite.
+        The queries that concern all shards are run concurrently by a pool of workers threads and the posting cache size is divided between the shards.
+        """
+        self._path = Path(path)
+        self._prefixLength = prefixLength
+        self._postingCacheSize = postingCacheSize // 16 ** prefixLength
+        self._shards = {}
+        if prefixLength == 0:
+            self._getShard("", True)
+        elif (self._path / "index").is_dir():
+            for shardPath in sorted((self._path / "index").glob("?" * prefixLength + ".sqlite")):
+                self._getShard(shardPath.stem, True)
+        self._executor = ThreadPoolExecutor(max_workers = workers) if prefixLength > 0 else None
+    @property
+    def requiresReindex(self):
+        return any([shard.requiresReindex for shard in self._shards.values()])
+    def addDataFile(self, name, keywords, size = None, nodeHashes = None, roots = None):
+        """
+        Adds the data file to its shard. See RALLibraryIndex.addDataFile.
+        """
+        return self._getShard(getShardPrefix(name, self._prefixLength), True).addDataFile(name, keywords, size, nodeHashes, roots)
+    def addDataFiles(self, dataFiles):
+        """
+        Adds the data files to their shards. See RALLibraryIndex.addDataFiles.
+        """
+        for prefix, dataFilesOfShard in self._partition(dataFiles).items():
+            self._getShard(prefix, True).addDataFiles(dataFilesOfShard)
+    def removeDataFiles(self, names):
+        """
+        Removes the data files from their shards. See RALLibraryIndex.removeDataFiles.
+        """
+        self._map(lambda item: self._shards[item[0]].removeDataFiles(item[1]), [item for item in self._partition({name : None for name in names}).items() if item[0] in self._shards])
+    def rebuild(self, dataFiles):
+        """
+        Replaces the content of all shards by the data files of the dataFiles dictionary. See RALLibraryIndex.rebuild.
+        """
+        dataFilesByShard = self._partition(dataFiles)
+        for prefix in set(self._shards.keys()).union(dataFilesByShard.keys()):
+            self._getShard(prefix, True).rebuild(dataFilesByShard.get(prefix, {}))
+    def findDataFiles(self, keywords, matchAll = False):
+        """
+        Returns the set of the names of the data files in all shards that contain all of the keywords if matchAll is True and any of them otherwise.
+        """
+        keywords = list(keywords)
+        return set().union(*self._map(lambda shard: shard.findDataFiles(keywords, matchAll), self._shards.values()))
+    def getNodeDataFiles(self, nodeHashes):
+        """
+        Returns a dictionary that maps the content hashes of the abstractions, that are stored in the content addressed data files of any shard, to the names of the data files.
+        """
+        nodeHashes = list(nodeHashes)
+        result = {}
+        for nodeDataFiles in self._map(lambda shard: shard.getNodeDataFiles(nodeHashes), self._shards.values()):
+            result.update(nodeDataFiles)
+        return result
+    def getEntryRoots(self, names):
+        """
+        Returns the content hashes that the entries with the given names in their shards refer to. See RALLibraryIndex.getEntryRoots.
+        """
+        result = {}
+        for rootsByEntry in self._map(lambda item: self._shards[item[0]].getEntryRoots(item[1].keys()), [item for item in self._partition({name : None for name in names}).items() if item[0] in self._shards]):
+            result.update(rootsByEntry)
+        return result
+    def getDataFiles(self):
+        """
+        Returns a list of tuples of the name, the size and whether it is content addressed for every data file in all shards.
+        """
+        return [dataFile for dataFiles in self._map(lambda shard: shard.getDataFiles(), self._shards.values()) for dataFile in dataFiles]
+    def getDataFileEntries(self):
+        """
+        Returns the entries of the data files in all shards. See RALLibraryIndex.getDataFileEntries.
+        """
+        result = {}
+        for entries in self._map(lambda shard: shard.getDataFileEntries(), self._shards.values()):
+            result.update(entries)
+        return result
+    def getKeywords(self, name):
+        """
+        Returns the keywords of the data file with the given name.
+        """
+        shard = self._getShard(getShardPrefix(name, self._prefixLength), False)
+        return [] if shard == None else shard.getKeywords(name)
+    def isChunk(self, name):
+        """
+        Returns whether the data file with the given name is content addressed.
+        """
+        shard = self._getShard(getShardPrefix(name, self._prefixLength), False)
+        return shard != None and shard.isChunk(name)
+    def getPostingCacheInfo(self):
+        """
+        Returns the number of cached posting lists and the number of data file ids that they contain in all shards.
+        """
+        infos = [shard.getPostingCacheInfo() for shard in self._shards.values()]
+        return {"postingLists" : sum([info["postingLists"] for info in infos]), "postings" : sum([info["postings"] for info in infos]), "maxsize" : self._postingCacheSize * 16 ** self._prefixLength}
+    def close(self):
+        for shard in self._shards.values():
+            shard.close()
+        if self._executor != None:
+            self._executor.shutdown()
+    def remove(self):
+        """
+        Closes the index and deletes the databases of its shards.
+        """
+        self.close()
+        for prefix in self._shards.keys():
+            self._getShardPath(prefix).unlink()
+        if self._prefixLength > 0 and not any((self._path / "index").iterdir()):
+            (self._path / "index").rmdir()
+    def _getShard(self, prefix, create):
+        # Get the shard of the prefix and open or create its database if necessary
+        shard = self._shards.get(prefix)
+        if shard == None and (create or self._getShardPath(prefix).exists()):
+            self._getShardPath(prefix).parent.mkdir(exist_ok = True)
+            shard = self._shards[prefix] = RALLibraryIndex(self._getShardPath(prefix), self._postingCacheSize)
+        return shard
+    def _getShardPath(self, prefix):
+        return self._path / "index.sqlite" if self._prefixLength == 0 else self._path / "index" / (prefix + ".sqlite")
+    def _partition(self, dataFiles):
+        dataFilesByShard = {}
+        for name, entry in dataFiles.items():
+            dataFilesByShard.setdefault(getShardPrefix(name, self._prefixLength), {})[name] = entry
+        return dataFilesByShard
+    def _map(self, function, items):
+        # Run the function on the items concurrently if there is more than one of them
+        items = list(items)
+        if self._executor == None or len(items) < 2:
+            return [function(item) for item in items]
+        return list(self._executor.map(function, items))
+
+def getShardPrefix(name, prefixLength):
+    """
+    Returns the prefix of the shard of a data file, that consists of the first prefixLength hexadecimal digits of its name padded with zeros.
+    """
+    return name[:prefixLength].ljust(prefixLength, "0")
+
+def getDataFilePath(dataPath, name, prefixLength, suffix = ".ralj"):
+    """
+    Returns the path of a data file or with the suffix ".entry" of an entry, that is stored in the subdirectory of its shard prefix if the library is sharded.
+    """
+    return dataPath / (name + suffix) if prefixLength == 0 else dataPath / getShardPrefix(name, prefixLength) / (name + suffix)
+
+def migrateLibraryIndex(index):
+    """
+    Upgrades the schema of the keyword index to the newest version.
+    The schema version is stored in the user_version pragma of the database. Each step in libraryIndexMigrations upgrades it by one.
+    """
+    version = index._cur.execute("PRAGMA user_version").fetchone()[0]
+    if version > len(libraryIndexMigrations):
+        raise ValueError("The library index has been created by a newer version of the RALLibrary.")
+    for newVersion, migration in enumerate(libraryIndexMigrations[version:], version + 1):
+        # Each step runs in one transaction, so that a failed step leaves the database at the previous version
+        index._cur.execute("BEGIN")
+        try:
+            migration(index)
+            index._cur.execute(f"PRAGMA user_version = {newVersion}")
+        except BaseException:
+            index._conn.rollback()
+            raise
+        index._conn.commit()
+
+def _createIndexTables(index):
+    """
+    Schema version 1: The data file, keyword and keyword occurrence tables.
+    """
+    index._cur.execute("CREATE TABLE IF NOT EXISTS dataFiles (id INTEGER PRIMARY KEY, name TEXT)")
+    index._cur.execute("CREATE TABLE IF NOT EXISTS keywords (id INTEGER PRIMARY KEY, keyword INTEGER, UNIQUE(keyword))")
+    index._cur.execute("CREATE TABLE IF NOT EXISTS keywordOccurrences (keywordId INTEGER, dataFileId INTEGER)")
+
+def _createPostingLists(index):
+    """
+    Schema version 2: Unique data file names and keyword occurrences, that are stored as posting lists clustered by keyword, and an index of the occurrences by data file.
+    Older versions stored wrong keyword ids for the keywords that were already known, so the occurrences are dropped and the library has to be reindexed.
+    """
+    numberOfDataFiles = index._cur.execute("SELECT count(*) FROM dataFiles").fetchone()[0]
+    index._cur.execute("ALTER TABLE dataFiles RENAME TO oldDataFiles")
+    index._cur.execute("CREATE TABLE dataFiles (id INTEGER PRIMARY KEY, name TEXT, UNIQUE(name))")
+    index._cur.execute("INSERT OR IGNORE INTO dataFiles (id, name) SELECT id, name FROM oldDataFiles ORDER BY id")
+    index._cur.execute("DROP TABLE oldDataFiles")
+    index._cur.execute("DROP TABLE keywordOccurrences")
+    index._cur.execute("CREATE TABLE keywordOccurrences (keywordId INTEGER, dataFileId INTEGER, PRIMARY KEY (keywordId, dataFileId)) WITHOUT ROWID")
+    index._cur.execute("CREATE INDEX keywordOccurrencesDataFileIndex ON keywordOccurrences (dataFileId)")
+    index.requiresReindex = numberOfDataFiles > 0
+
+def _createChunkTables(index):
+    """
+    Schema version 3: The sizes of the data files, whether they are content addressed data files or entries, the content hashes of the abstractions of the content addressed data files and the content hashes that the entries refer to.
+    """
+    index._cur.execute("ALTER TABLE dataFiles ADD COLUMN size INTEGER")
+    index._cur.execute("ALTER TABLE dataFiles ADD COLUMN chunk INTEGER NOT NULL DEFAULT 0")
+    index._cur.execute("CREATE TABLE nodes (hash TEXT PRIMARY KEY, dataFileId INTEGER) WITHOUT ROWID")
+    index._cur.execute("CREATE INDEX nodesDataFileIndex ON nodes (dataFileId)")
+    index._cur.execute("CREATE TABLE entryRoots (dataFileId INTEGER, hash TEXT, PRIMARY KEY (dataFileId, hash)) WITHOUT ROWID")
+
+libraryIndexMigrations = [
+    _createIndexTables,
+    _createPostingLists,
+    _createChunkTables,
+]
@@ -0,0 +1,287 @@
+# Load and save data from RALB files, the binary sibling format of RALJ files.
+# A RALB file starts with a header and a section index, that is followed by the sections:
+#   string offsets : the fixed width offsets of the strings in the string table
+#   strings : the utf-8 encoded data and format strings, each prefixed by its varint encoded length
+#   nodes : fixed width node records of a kind byte and two fields
+#       kind 0 (direct data abstraction) : the string indices of the data and the format
+#       kind 1 (constructed abstraction) : the index of the first triple and the number of triples
+#       kind 2 (direct abstraction) and kind 3 (inverse direct abstraction) : the index of the inner node and 0
+#   triples : fixed width triple records of three node references, that are 0 for the self references and otherwise the node index plus one
+#   node names : the optional string indices of the json node ids of the nodes, if they are not the node indices plus one
+#   numeric node names : the optional json node ids of the nodes as integers instead of the node names, if all of them are decimal numbers, prefixed by the byte width of the integers
+# The nodes are sorted in dependency order, so that every node only refers to nodes with smaller indices.
+# All integers are little endian and the fixed width fields use the smallest of 1, 2, 4 or 8 bytes that fits all values of the file.
+
+import mmap
+import struct
+from .ralj_loader import prepareRALJData, saveRALJData
+
+ralbMagic = b"RALB"
+ralbVersion = 1
+ralbHeader = struct.Struct("<4sBBBB")
+ralbSection = struct.Struct("<BQQ")
+stringOffsetsSection, stringsSection, nodesSection, triplesSection, nodeNamesSection, numericNodeNamesSection = 1, 2, 3, 4, 5, 6
+fieldFormatByWidth = {1 : "B", 2 : "H", 4 : "I", 8 : "Q"}
+
+def saveRALBFile(abstractions, file_path, RALFramework):
+    """
+    Saves the abstractions and all abstractions they depend on into a RALB file.
+    """
+    saveRALBData(saveRALJData(abstractions, RALFramework), file_path)
+
+def loadRALBFile(file_path, RALFramework, batchSize = 10000):
+    """
+    Loads a RALB file into the RALFramework and returns a dictionary that maps the json node ids to the loaded abstractions.
+    Since the nodes are sorted in dependency order, they are created in one pass with the bulk creation methods of the framework, batchSize nodes at a time, in one transaction.
+    """
+    with RALBReader(file_path) as reader:
+        abstractions = [None] * len(reader)
+        # The nodes are created in one transaction, so that a failure does not leave a partially loaded file behind
+        with RALFramework.transaction():
+            for start in range(0, len(reader), batchSize):
+                # Split the batch into layers of nodes that only refer to nodes of earlier batches or layers
+                indicesByLayer = {}
+                layerByIndex = {}
+                for index, (kind, content) in enumerate(reader.iterateNodes(start, start + batchSize), start):
+                    layer = max([layerByIndex.get(requiredIndex, -1) + 1 for requiredIndex in getRequiredNodeIndices(kind, content)], default = 0)
+                    layerByIndex[index] = layer
+                    indicesByLayer.setdefault(layer, []).append((index, kind, content))
+                for layer in sorted(indicesByLayer.keys()):
+                    nodes = indicesByLayer[layer]
+                    dataNodes = [(index, content) for index, kind, content in nodes if kind == 0]
+                    for (index, content), abstraction in zip(dataNodes, RALFramework.DirectDataAbstractions([content for index, content in dataNodes])):
+                        abstractions[index] = abstraction
+                    constructedNodes = [(index, content) for index, kind, content in nodes if kind == 1]
+                    baseConnectionsList = [[[0 if element == 0 else abstractions[element - 1] for element in triple] for triple in content] for index, content in constructedNodes]
+                    for (index, content), abstraction in zip(constructedNodes, RALFramework.ConstructedAbstractions(baseConnectionsList)):
+                        abstractions[index] = abstraction
+                    for index, kind, content in nodes:
+                        if kind == 2:
+                            abstractions[index] = RALFramework.DirectAbstraction(abstractions[content])
+                        elif kind == 3:
+                            abstractions[index] = RALFramework.InverseDirectAbstraction(abstractions[content])
+        return dict(zip(reader.getJsonNodeIDs(), abstractions))
+
+def saveRALBData(data, file_path):
+    """
+    Saves RALJ data into a RALB file.
+    Raises a ValueError if entries refer to undefined json node ids or to each other in a cycle.
+    """
+    # Sort the entries in dependency order
+    # The prepared entries refer to each other by the node indices and use the node indices plus one in the triples like the node records
+    jsonNodeIDs, dataConcepts, layers = prepareRALJData(data)
+    # Build the string table, the node records and the triple records
+    stringIndices = {}
+    def getStringIndex(string):
+        if string not in stringIndices:
+            stringIndices[string] = len(stringIndices)
+        return stringIndices[string]
+    nodeRecords = []
+    tripleRecords = []
+    for dataString, format in dataConcepts:
+        nodeRecords.append((0, getStringIndex(dataString), getStringIndex(format)))
+    for layer in layers:
+        for kind, content in layer:
+            if kind == 1:
+                nodeRecords.append((1, len(tripleRecords), len(content)))
+                tripleRecords.extend([tuple(triple) for triple in content])
+            else:
+                nodeRecords.append((kind, content, 0))
+    # The json node ids are only stored if they differ from the default ones
+    storeNodeNames = any([jsonNodeID != str(index + 1) for index, jsonNodeID in enumerate(jsonNodeIDs)])
+    storeNumericNodeNames = storeNodeNames and all([type(jsonNodeID) == str and jsonNodeID.isdecimal() and jsonNodeID.isascii() and str(int(jsonNodeID)) == jsonNodeID for jsonNodeID in jsonNodeIDs])
+    nodeNames = [getStringIndex(jsonNodeID) for jsonNodeID in jsonNodeIDs] if storeNodeNames and not storeNumericNodeNames else []
+    strings = bytearray()
+    stringOffsets = []
+    for string in stringIndices.keys():
+        stringOffsets.append(len(strings))
+        encodedString = string.encode("utf-8")
+        strings += encodeVarint(len(encodedString)) + encodedString
+    stringOffsets.append(len(strings))
+    width = getFieldWidth(max([len(nodeRecords) + 1, len(tripleRecords), len(stringIndices)]))
+    stringOffsetWidth = getFieldWidth(len(strings))
+    fieldFormat = fieldFormatByWidth[width]
+    sections = [(stringOffsetsSection, struct.pack(f"<{len(stringOffsets)}{fieldFormatByWidth[stringOffsetWidth]}", *stringOffsets)),
+                (stringsSection, bytes(strings)),
+                (nodesSection, b"".join([struct.pack(f"<B2{fieldFormat}", *record) for record in nodeRecords])),
+                (triplesSection, struct.pack(f"<{3 * len(tripleRecords)}{fieldFormat}", *[element for triple in tripleRecords for element in triple]))]
+    if storeNumericNodeNames:
+        numericNodeNames = [int(jsonNodeID) for jsonNodeID in jsonNodeIDs]
+        numericNodeNameWidth = getFieldWidth(max(numericNodeNames))
+        sections.append((numericNodeNamesSection, bytes([numericNodeNameWidth]) + struct.pack(f"<{len(numericNodeNames)}{fieldFormatByWidth[numericNodeNameWidth]}", *numericNodeNames)))
+    elif storeNodeNames:
+        sections.append((nodeNamesSection, struct.pack(f"<{len(nodeNames)}{fieldFormat}", *nodeNames)))
+    with open(file_path, "wb") as file:
+        file.write(ralbHeader.pack(ralbMagic, ralbVersion, width, stringOffsetWidth, len(sections)))
+        offset = ralbHeader.size + ralbSection.size * len(sections)
+        for sectionType, sectionData in sections:
+            file.write(ralbSection.pack(sectionType, offset, len(sectionData)))
+            offset += len(sectionData)
+        for sectionType, sectionData in sections:
+            file.write(sectionData)
+
+def loadRALBData(file_path):
+    """
+    Loads the RALJ data of a RALB file.
+    """
+    with RALBReader(file_path) as reader:
+        return reader.getRALJData()
+
+class RALBReader:
+    """
+    Reads the nodes of a memory mapped RALB file on demand, so that they can be iterated or accessed randomly without deserializing the whole file.
+    The content of a node is the tuple of data and format for kind 0, the list of triples of node references for kind 1 and the inner node index for the kinds 2 and 3.
+    """
+    def __init__(self, file_path):
+        self._file = open(file_path, "rb")
+        self._mmap = None
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+            self._readHeader()
+        except BaseException:
+            # Close the file and its memory map if the header can not be read
+            self.close()
+            raise
+    def _readHeader(self):
+        magic, version, width, stringOffsetWidth, numberOfSections = ralbHeader.unpack_from(self._mmap, 0)
+        if magic != ralbMagic:
+            raise ValueError("The file is not a RALB file.")
+        if version > ralbVersion:
+            raise ValueError("The RALB file has been created by a newer version of the RALB format.")
+        self._sections = {}
+        for sectionIndex in range(numberOfSections):
+            sectionType, offset, length = ralbSection.unpack_from(self._mmap, ralbHeader.size + sectionIndex * ralbSection.size)
+            self._sections[sectionType] = (offset, length)
+        self._field = struct.Struct("<" + fieldFormatByWidth[width])
+        self._stringOffset = struct.Struct("<" + fieldFormatByWidth[stringOffsetWidth])
+        self._nodeRecord = struct.Struct(f"<B2{fieldFormatByWidth[width]}")
+        self._tripleRecord = struct.Struct(f"<3{fieldFormatByWidth[width]}")
+        self._numberOfNodes = self._sections[nodesSection][1] // self._nodeRecord.size
+        if numericNodeNamesSection in self._sections:
+            self._numericNodeName = struct.Struct("<" + fieldFormatByWidth[self._mmap[self._sections[numericNodeNamesSection][0]]])
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    def close(self):
+        if self._mmap != None:
+            self._mmap.close()
+        self._file.close()
+    def __len__(self):
+        return self._numberOfNodes
+    def __iter__(self):
+        return self.iterateNodes()
+    def iterateNodes(self, start = 0, stop = None):
+        """
+        Yields the kind and the content of the nodes from the start index to the stop index, which is faster than accessing them one by one.
+        """
+        stop = self._numberOfNodes if stop == None else min(stop, self._numberOfNodes)
+        if start >= stop:
+            return
+        nodesOffset = self._sections[nodesSection][0]
+        triplesOffset = self._sections[triplesSection][0]
+        for kind, first, second in self._nodeRecord.iter_unpack(self._mmap[nodesOffset + start * self._nodeRecord.size:nodesOffset + stop * self._nodeRecord.size]):
+            if kind == 0:
+                yield kind, (self.getString(first), self.getString(second))
+            elif kind == 1:
+                yield kind, list(self._tripleRecord.iter_unpack(self._mmap[triplesOffset + first * self._tripleRecord.size:triplesOffset + (first + second) * self._tripleRecord.size]))
+            else:
+                yield kind, first
+    def getString(self, index):
+        """
+        Returns the string with the given index of the string table.
+        """
+        offset = self._sections[stringsSection][0] + self._stringOffset.unpack_from(self._mmap, self._sections[stringOffsetsSection][0] + index * self._stringOffset.size)[0]
+        length, offset = decodeVarint(self._mmap, offset)
+        return self._mmap[offset:offset + length].decode("utf-8")
+    def getNode(self, index):
+        """
+        Returns the kind and the content of the node with the given index.
+        """
+        if index < 0 or index >= self._numberOfNodes:
+            raise IndexError("The node index is out of range.")
+        kind, first, second = self._nodeRecord.unpack_from(self._mmap, self._sections[nodesSection][0] + index * self._nodeRecord.size)
+        if kind == 0:
+            return kind, (self.getString(first), self.getString(second))
+        if kind == 1:
+            triplesOffset = self._sections[triplesSection][0]
+            return kind, [self._tripleRecord.unpack_from(self._mmap, triplesOffset + (first + tripleIndex) * self._tripleRecord.size) for tripleIndex in range(second)]
+        return kind, first
+    def getJsonNodeID(self, index):
+        """
+        Returns the json node id of the node with the given index.
+        """
+        if numericNodeNamesSection in self._sections:
+            return str(self._numericNodeName.unpack_from(self._mmap, self._sections[numericNodeNamesSection][0] + 1 + index * self._numericNodeName.size)[0])
+        if nodeNamesSection not in self._sections:
+            return str(index + 1)
+        return self.getString(self._field.unpack_from(self._mmap, self._sections[nodeNamesSection][0] + index * self._field.size)[0])
+    def getJsonNodeIDs(self):
+        """
+        Returns the list of the json node ids of all nodes.
+        """
+        if numericNodeNamesSection in self._sections:
+            offset = self._sections[numericNodeNamesSection][0] + 1
+            return [str(jsonNodeID) for jsonNodeID, in self._numericNodeName.iter_unpack(self._mmap[offset:offset + self._numberOfNodes * self._numericNodeName.size])]
+        if nodeNamesSection not in self._sections:
+            return [str(index + 1) for index in range(self._numberOfNodes)]
+        offset = self._sections[nodeNamesSection][0]
+        return [self.getString(stringIndex) for stringIndex, in self._field.iter_unpack(self._mmap[offset:offset + self._numberOfNodes * self._field.size])]
+    def getRALJData(self):
+        """
+        Returns the RALJ data of all nodes.
+        """
+        jsonNodeIDs = self.getJsonNodeIDs()
+        blocks = [{}, {}, {}, {}]
+        for index, (kind, content) in enumerate(self):
+            if kind == 0:
+                blocks[0].setdefault(content[1], {})[content[0]] = jsonNodeIDs[index]
+            elif kind == 1:
+                blocks[1][jsonNodeIDs[index]] = [[0 if element == 0 else jsonNodeIDs[element - 1] for element in triple] for triple in content]
+            else:
+                blocks[kind][jsonNodeIDs[index]] = jsonNodeIDs[content]
+        return blocks if len(blocks[2]) > 0 or len(blocks[3]) > 0 else blocks[:2]
+
+def getRequiredNodeIndices(kind, content):
+    """
+    Returns the set of node indices that a node of a RALB file refers to.
+    """
+    if kind == 0:
+        return set()
+    if kind == 1:
+        return set([element - 1 for triple in content for element in triple if element != 0])
+    return {content}
+
+def getFieldWidth(maximum):
+    """
+    Returns the smallest number of bytes of a fixed width field that can store all values up to the maximum.
+    """
+    for width in [1, 2, 4]:
+        if maximum < 1 << (8 * width):
+            return width
+    return 8
+
+def encodeVarint(value):
+    """
+    Encodes a non negative integer with 7 bits per byte, where the highest bit marks that more bytes follow.
+    """
+    result = bytearray()
+    while value >= 0x80:
+        result.append((value & 0x7f) | 0x80)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+def decodeVarint(buffer, offset):
+    """
+    Decodes a varint at the offset of the buffer and returns the value and the offset behind it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
@@ -3,6 +3,11 @@
 #   https://github.com/gratach/thoughts/blob/master/topics/data/graph/reduced-abstraction-layer-json.md
 
 import json
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import shutil
+import tempfile
 from .neo4j_ral_framework import *
 
 def loadRALJFile(file_path, RALFramework):
@@ -10,72 +15,559 @@ def loadRALJFile(file_path, RALFramework):
         data = json.load(file)
     return loadRALJData(data, RALFramework)
 
-def loadRALJData(data, RALFramework):
+def loadRALJFiles(file_paths, RALFramework, workers = None):
+    """
+    Loads several RALJ files into the RALFramework and returns a list with a dictionary for every file, that maps its json node ids to the loaded abstractions.
+    The files are parsed and sorted into topological layers by a pool of worker processes, while the main process is the only one that writes into the framework.
+    The direct data abstractions that are shared by several files are only created once.
+    If workers is None, the number of processors is used. With workers = 0 the files are prepared in the main process.
+    """
+    abstractionByDataConcept = {}
+    result = []
+    if workers == 0:
+        for file_path in file_paths:
+            result.append(applyPreparedRALJData(prepareRALJFile(file_path), RALFramework, abstractionByDataConcept))
+        return result
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        # The results are returned in the order of the files as soon as they are prepared
+        for preparedData in executor.map(prepareRALJFile, file_paths):
+            result.append(applyPreparedRALJData(preparedData, RALFramework, abstractionByDataConcept))
+    return result
+
+def loadRALJData(data, RALFramework, knownAbstractions = None):
+    """
+    Loads the RALJ data into the RALFramework and returns a dictionary that maps the json node ids to the loaded abstractions.
+    The dependency graph of the entries is sorted into layers in one linear pass with Kahn's algorithm and every layer is created with the bulk creation methods of the framework.
+    The knownAbstractions dictionary maps json node ids, that the data refers to without defining them, to abstractions that are already loaded.
+    Raises a ValueError if entries refer to undefined json node ids or to each other in a cycle.
+    """
+    knownAbstractions = {} if knownAbstractions == None else knownAbstractions
+    return applyPreparedRALJData(prepareRALJData(data, knownAbstractions), RALFramework, knownAbstractions = knownAbstractions)
+
+def prepareRALJFile(file_path):
+    """
+    Reads a RALJ file and returns its prepared data. See prepareRALJData.
+    """
+    with open(file_path, "r") as file:
+        data = json.load(file)
+    return prepareRALJData(data)
+
+def prepareRALJData(data, knownJsonNodeIDs = ()):
+    """
+    Sorts the entries of the RALJ data into topological layers and returns them in a compact form that can be sent to another process and loaded with applyPreparedRALJData.
+    The prepared data is a tuple of the json node ids, the (data, format) pairs of the data concepts and the layers of (blockIndex, content) tuples of the other entries.
+    The entries are numbered in this order and their contents refer to each other by these positions. Constructed abstractions use 0 for the self references and the position plus one otherwise.
+    The knownJsonNodeIDs may be referred to without being defined in the data. Those that are referred to are numbered between the data concepts and the other entries.
+    Raises a ValueError if entries refer to undefined json node ids or to each other in a cycle.
+    """
     assert type(data) == list and len(data) < 5
     dataConceptBlock = data[0] if len(data) > 0 else {}
-    constructedConceptBlock = data[1] if len(data) > 1 else {}
-    directAbstractionBlock = data[2] if len(data) > 2 else {}
-    inverseDirectAbstractionBlock = data[3] if len(data) > 3 else {}
-    abstractionIDByJsonNodeID = {}
-    relatingAbstractionsByJsonNodeID = {}
-    uncheckedJsonNodeIDs = set(constructedConceptBlock.keys()).union(set(directAbstractionBlock.keys())).union(set(inverseDirectAbstractionBlock.keys()))
-    loadedJsonNodeIDs = set()
-    # Load all direct data abstractions
-    for format, dataConcepts in dataConceptBlock.items():
-        for data, jsonNodeID in dataConcepts.items():
-            abstractionIDByJsonNodeID[jsonNodeID] = RALFramework.DirectDataAbstraction(data, format)
-            loadedJsonNodeIDs.add(jsonNodeID)
-    # Load all constructed abstractions
-    while len(uncheckedJsonNodeIDs) > 0:
-        jsonNodeID = uncheckedJsonNodeIDs.pop()
-        if jsonNodeID in directAbstractionBlock:
-            # The abstraction is a direct abstraction
-            innerJsonNodeID = directAbstractionBlock[jsonNodeID]
-            if innerJsonNodeID not in loadedJsonNodeIDs:
-                if innerJsonNodeID not in relatingAbstractionsByJsonNodeID:
-                    relatingAbstractionsByJsonNodeID[innerJsonNodeID] = set()
-                relatingAbstractionsByJsonNodeID[innerJsonNodeID].add(jsonNodeID)
+    jsonNodeIDs = []
+    dataConcepts = []
+    for format, dataConceptsOfFormat in dataConceptBlock.items():
+        for dataString, jsonNodeID in dataConceptsOfFormat.items():
+            jsonNodeIDs.append(jsonNodeID)
+            dataConcepts.append((dataString, format))
+    positionByJsonNodeID = {jsonNodeID : position for position, jsonNodeID in enumerate(jsonNodeIDs)}
+    # Build the dependency graph of the other entries
+    entries = {}
+    for blockIndex in [1, 2, 3]:
+        for jsonNodeID, content in (data[blockIndex] if len(data) > blockIndex else {}).items():
+            entries[jsonNodeID] = (blockIndex, content)
+    numberOfMissingDependencies = {}
+    dependantsByJsonNodeID = {}
+    undefinedJsonNodeIDs = set()
+    for jsonNodeID, (blockIndex, content) in entries.items():
+        numberOfMissingDependencies[jsonNodeID] = 0
+        for requiredJsonNodeID in getRequiredJsonNodeIDs(blockIndex, content):
+            if requiredJsonNodeID in positionByJsonNodeID:
                 continue
-            abstractionIDByJsonNodeID[jsonNodeID] = RALFramework.DirectAbstraction(abstractionIDByJsonNodeID[innerJsonNodeID])
-            loadedJsonNodeIDs.add(jsonNodeID)
-        elif jsonNodeID in inverseDirectAbstractionBlock:
-            # The abstraction is a direct abstraction
-            innerJsonNodeID = inverseDirectAbstractionBlock[jsonNodeID]
-            if innerJsonNodeID not in loadedJsonNodeIDs:
-                if innerJsonNodeID not in relatingAbstractionsByJsonNodeID:
-                    relatingAbstractionsByJsonNodeID[innerJsonNodeID] = set()
-                relatingAbstractionsByJsonNodeID[innerJsonNodeID].add(jsonNodeID)
+            if requiredJsonNodeID not in entries:
+                if requiredJsonNodeID in knownJsonNodeIDs:
+                    positionByJsonNodeID[requiredJsonNodeID] = len(jsonNodeIDs)
+                    jsonNodeIDs.append(requiredJsonNodeID)
+                else:
+                    undefinedJsonNodeIDs.add(requiredJsonNodeID)
                 continue
-            abstractionIDByJsonNodeID[jsonNodeID] = RALFramework.InverseDirectAbstraction(abstractionIDByJsonNodeID[innerJsonNodeID])
-            loadedJsonNodeIDs.add(jsonNodeID)
-        else:
-            # The abstraction is a constructed abstraction
-            baseConnections = constructedConceptBlock[jsonNodeID]
-            allConnectedJsonNodeIDsLoaded = True
-            for connection in baseConnections:
-                for connectedJsonNodeID in connection:
-                    if connectedJsonNodeID != 0 and connectedJsonNodeID not in loadedJsonNodeIDs:
-                        allConnectedJsonNodeIDsLoaded = False
-                        if connectedJsonNodeID not in relatingAbstractionsByJsonNodeID:
-                            relatingAbstractionsByJsonNodeID[connectedJsonNodeID] = set()
-                        relatingAbstractionsByJsonNodeID[connectedJsonNodeID].add(jsonNodeID)
-                        break
-                if not allConnectedJsonNodeIDsLoaded:
-                    break
-            if allConnectedJsonNodeIDsLoaded:
-                # Load the abstraction
-                baseConnections = [[0 if y == 0 else abstractionIDByJsonNodeID[y] for y in x] for x in baseConnections]
-                abstractionIDByJsonNodeID[jsonNodeID] = RALFramework.ConstructedAbstraction(baseConnections)
-                loadedJsonNodeIDs.add(jsonNodeID)
+            numberOfMissingDependencies[jsonNodeID] += 1
+            dependantsByJsonNodeID.setdefault(requiredJsonNodeID, []).append(jsonNodeID)
+    if len(undefinedJsonNodeIDs) > 0:
+        raise ValueError(f"The RALJ data refers to undefined json node ids, for example {', '.join(map(str, sorted(undefinedJsonNodeIDs, key = str)[:5]))}.")
+    # Sort the entries layer by layer in topological order
+    numberOfKnownJsonNodeIDs = len(jsonNodeIDs) - len(dataConcepts)
+    layers = []
+    layer = [jsonNodeID for jsonNodeID, numberOfDependencies in numberOfMissingDependencies.items() if numberOfDependencies == 0]
+    while len(layer) > 0:
+        for jsonNodeID in layer:
+            positionByJsonNodeID[jsonNodeID] = len(jsonNodeIDs)
+            jsonNodeIDs.append(jsonNodeID)
+        preparedLayer = []
+        for jsonNodeID in layer:
+            blockIndex, content = entries[jsonNodeID]
+            if blockIndex == 1:
+                preparedLayer.append((1, [[0 if y == 0 else positionByJsonNodeID[y] + 1 for y in x] for x in content]))
             else:
+                preparedLayer.append((blockIndex, positionByJsonNodeID[content]))
+        layers.append(preparedLayer)
+        nextLayer = []
+        for jsonNodeID in layer:
+            for dependantJsonNodeID in dependantsByJsonNodeID.get(jsonNodeID, []):
+                numberOfMissingDependencies[dependantJsonNodeID] -= 1
+                if numberOfMissingDependencies[dependantJsonNodeID] == 0:
+                    nextLayer.append(dependantJsonNodeID)
+        layer = nextLayer
+    if len(jsonNodeIDs) < len(dataConcepts) + numberOfKnownJsonNodeIDs + len(entries):
+        cyclicJsonNodeIDs = [jsonNodeID for jsonNodeID, numberOfDependencies in numberOfMissingDependencies.items() if numberOfDependencies > 0]
+        raise ValueError(f"{len(cyclicJsonNodeIDs)} entries of the RALJ data are part of a reference cycle or depend on one, for example {', '.join(map(str, cyclicJsonNodeIDs[:5]))}.")
+    return jsonNodeIDs, dataConcepts, layers
+
+def applyPreparedRALJData(preparedData, RALFramework, abstractionByDataConcept = None, knownAbstractions = None):
+    """
+    Loads prepared RALJ data into the RALFramework in one transaction and returns a dictionary that maps the json node ids to the loaded abstractions.
+    Every layer is created with the bulk creation methods of the framework. The direct data abstractions are looked up in and added to the abstractionByDataConcept dictionary, if it is given.
+    The knownAbstractions dictionary provides the abstractions of the known json node ids that the data was prepared with.
+    """
+    jsonNodeIDs, dataConcepts, layers = preparedData
+    if abstractionByDataConcept == None:
+        abstractionByDataConcept = {}
+    numberOfKnownAbstractions = len(jsonNodeIDs) - len(dataConcepts) - sum([len(layer) for layer in layers])
+    with RALFramework.transaction():
+        missingDataConcepts = [dataConcept for dataConcept in dict.fromkeys(dataConcepts) if dataConcept not in abstractionByDataConcept]
+        for dataConcept, abstraction in zip(missingDataConcepts, RALFramework.DirectDataAbstractions(missingDataConcepts)):
+            abstractionByDataConcept[dataConcept] = abstraction
+        abstractions = [abstractionByDataConcept[dataConcept] for dataConcept in dataConcepts]
+        abstractions += [knownAbstractions[jsonNodeID] for jsonNodeID in jsonNodeIDs[len(dataConcepts):len(dataConcepts) + numberOfKnownAbstractions]]
+        for layer in layers:
+            constructedAbstractions = iter(RALFramework.ConstructedAbstractions([[[0 if y == 0 else abstractions[y - 1] for y in x] for x in content] for blockIndex, content in layer if blockIndex == 1]))
+            for blockIndex, content in layer:
+                if blockIndex == 1:
+                    abstractions.append(next(constructedAbstractions))
+                elif blockIndex == 2:
+                    abstractions.append(RALFramework.DirectAbstraction(abstractions[content]))
+                else:
+                    abstractions.append(RALFramework.InverseDirectAbstraction(abstractions[content]))
+    return dict(zip(jsonNodeIDs, abstractions))
+
+def loadRALJFileStreaming(file_path, RALFramework, batchSize = 1000, chunkSize = 1 << 20, pendingCacheSize = 65536, compression = None):
+    """
+    Loads a RALJ file into the RALFramework without reading the whole file into memory and returns the number of loaded abstractions.
+    The blocks are parsed entry by entry and the abstractions are created in batches as soon as all abstractions they refer to are loaded.
+    The json node ids of the loaded abstractions and the entries that wait for other abstractions are kept in a temporary sqlite database, whose page cache of pendingCacheSize KiB spills to disk, so that the memory usage does not grow with the size of the file.
+    No wrappers of the loaded abstractions are kept, so they are remembered to not be deleted after their batch.
+    Raises a ValueError if the file is invalid or if entries refer to undefined json node ids or to each other in a cycle. The abstractions that have been loaded before are kept.
+    The compression of the file can be None, "gzip" or "zstd".
+    """
+    return _loadRALJStream(file_path, RALJStreamLoader(RALFramework, batchSize, pendingCacheSize), chunkSize, compression)
+
+def loadRALJFileStreamingAbstractions(file_path, RALFramework, batchSize = 1000, chunkSize = 1 << 20, pendingCacheSize = 65536, compression = None):
+    """
+    Loads a RALJ file like loadRALJFileStreaming, but returns a dictionary that maps the json node ids to the loaded abstractions like loadRALJData instead of remembering them.
+    The dictionary keeps the wrappers of all loaded abstractions, so the memory usage grows with the number of entries of the file.
+    """
+    loader = RALJStreamLoader(RALFramework, batchSize, pendingCacheSize, keepAbstractions = True)
+    _loadRALJStream(file_path, loader, chunkSize, compression)
+    return loader.abstractionByJsonNodeID
+
+def _loadRALJStream(file_path, loader, chunkSize, compression):
+    # Feed the entries of the file to the loader and return the number of loaded abstractions
+    try:
+        with openRALJStream(file_path, "r", compression) as file:
+            for blockIndex, jsonNodeID, content in iterateRALJEntries(file, chunkSize):
+                loader.addEntry(blockIndex, jsonNodeID, content)
+        return loader.finish()
+    finally:
+        loader.close()
+
+def iterateRALJEntries(file, chunkSize = 1 << 20):
+    """
+    Yields the entries of the blocks of a RALJ file as (blockIndex, jsonNodeID, content) tuples while reading the file chunk by chunk.
+    The content is a (data, format) pair for the data concept block, the base connections for the constructed concept block and the inner json node id for the (inverse) direct abstraction blocks.
+    """
+    reader = JSONStreamReader(file, chunkSize)
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.expect("]")
+        return
+    blockIndex = 0
+    while True:
+        if blockIndex >= 4:
+            raise ValueError("Invalid RALJ file: It contains more than four blocks.")
+        reader.expect("{")
+        for key in reader.iterateObjectKeys():
+            if blockIndex == 0:
+                # The data concepts are grouped by their format
+                reader.expect("{")
+                for data in reader.iterateObjectKeys():
+                    yield blockIndex, reader.decode(), (data, key)
+            else:
+                yield blockIndex, key, reader.decode()
+        blockIndex += 1
+        if reader.expect(",]") == "]":
+            break
+    if reader.peek() != "":
+        raise ValueError("Invalid RALJ file: There is data after the end of the blocks.")
+
+class JSONStreamReader:
+    """
+    Reads a json document from a file chunk by chunk.
+    The structure of the objects and arrays is consumed character by character, while the keys and the values that are needed as a whole are decoded by the json module.
+    """
+    def __init__(self, file, chunkSize = 1 << 20):
+        self._file = file
+        self._chunkSize = chunkSize
+        self._buffer = ""
+        self._position = 0
+        self._endOfFile = False
+        self._decoder = json.JSONDecoder()
+    def _readChunk(self):
+        # Append the next chunk to the unconsumed part of the buffer
+        chunk = self._file.read(self._chunkSize)
+        if chunk == "":
+            self._endOfFile = True
+            return False
+        self._buffer = self._buffer[self._position:] + chunk
+        self._position = 0
+        return True
+    def peek(self):
+        """
+        Returns the next character that is not whitespace without consuming it or an empty string at the end of the file.
+        """
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in " \t\n\r":
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._readChunk():
+                return ""
+    def expect(self, characters):
+        """
+        Consumes and returns the next character that is not whitespace. Raises a ValueError if it is not one of the given characters.
+        """
+        character = self.peek()
+        if character == "" or character not in characters:
+            raise ValueError(f"Invalid json: Expected one of {characters!r} but found {character if character != '' else 'the end of the file'!r}.")
+        self._position += 1
+        return character
+    def decode(self):
+        """
+        Decodes and consumes the next json value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                # The value could continue in the next chunk
+                if self._readChunk():
+                    continue
+                raise
+            # A number at the end of the buffer could continue in the next chunk
+            if end < len(self._buffer) or self._endOfFile or not self._readChunk():
+                self._position = end
+                return value
+    def iterateObjectKeys(self):
+        """
+        Yields the keys of the object whose opening brace has been consumed. The value of each key has to be consumed before the next key is requested.
+        """
+        if self.peek() == "}":
+            self._position += 1
+            return
+        while True:
+            key = self.decode()
+            if type(key) != str:
+                raise ValueError("Invalid json: The keys of an object must be strings.")
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+class RALJStreamLoader:
+    """
+    Creates the abstractions of RALJ entries in batches in the order in which their references are resolved.
+    An entry joins the current batch as soon as the json node ids it refers to are loaded or in the batch. Its layer in the batch is one more than the highest layer of them, so that the batch can be created layer by layer.
+    Until then the entry waits in a temporary sqlite database, which also stores the loaded json node ids, so that the memory usage does not grow with the number of entries.
+    The loaded abstractions are remembered, unless keepAbstractions is True. Then the wrappers of the loaded abstractions are kept in the abstractionByJsonNodeID dictionary, that grows with the number of entries.
+    """
+    def __init__(self, RALFramework, batchSize = 1000, pendingCacheSize = 65536, keepAbstractions = False):
+        self.RALFramework = RALFramework
+        self.batchSize = batchSize
+        self.keepAbstractions = keepAbstractions
+        self.abstractionByJsonNodeID = {} if keepAbstractions else None
+        # An empty path opens a private temporary database that is deleted when it is closed
+        self._store = sqlite3.connect("", isolation_level = None)
+        self._store.execute(f"PRAGMA cache_size = -{int(pendingCacheSize)}")
+        self._store.execute("PRAGMA journal_mode = OFF")
+        self._store.execute("PRAGMA synchronous = OFF")
+        self._store.execute("CREATE TABLE loaded (jsonNodeID TEXT PRIMARY KEY, abstractionID INTEGER) WITHOUT ROWID")
+        self._store.execute("CREATE TABLE pending (jsonNodeID TEXT PRIMARY KEY, blockIndex INTEGER, content TEXT, missing INTEGER) WITHOUT ROWID")
+        self._store.execute("CREATE TABLE waiting (requiredJsonNodeID TEXT, jsonNodeID TEXT)")
+        self._store.execute("CREATE INDEX waitingIndex ON waiting (requiredJsonNodeID)")
+        # The store does not need to be durable, so all changes are made in one transaction that is never committed
+        self._store.execute("BEGIN")
+        self._readyEntries = []
+        self._readyLayerByJsonNodeID = {}
+        self._numberOfLoadedAbstractions = 0
+    def addEntry(self, blockIndex, jsonNodeID, content):
+        """
+        Adds an entry of the RALJ file. It is loaded as soon as all json node ids it refers to are loaded.
+        """
+        missingJsonNodeIDs = set([requiredJsonNodeID for requiredJsonNodeID in getRequiredJsonNodeIDs(blockIndex, content) if requiredJsonNodeID not in self._readyLayerByJsonNodeID])
+        missingJsonNodeIDs = missingJsonNodeIDs.difference(self._getAbstractionIDs(missingJsonNodeIDs).keys())
+        if len(missingJsonNodeIDs) > 0:
+            self._store.execute("INSERT OR REPLACE INTO pending (jsonNodeID, blockIndex, content, missing) VALUES (?, ?, ?, ?)", (jsonNodeID, blockIndex, json.dumps(content), len(missingJsonNodeIDs)))
+            self._store.executemany("INSERT INTO waiting (requiredJsonNodeID, jsonNodeID) VALUES (?, ?)", [(missingJsonNodeID, jsonNodeID) for missingJsonNodeID in missingJsonNodeIDs])
+            return
+        self._addReadyEntry(blockIndex, jsonNodeID, content)
+        if len(self._readyEntries) >= self.batchSize:
+            self._loadReadyEntries()
+    def finish(self):
+        """
+        Loads the remaining entries and returns the number of loaded abstractions.
+        Raises a ValueError if some entries can not be loaded.
+        """
+        self._loadReadyEntries()
+        unresolvedJsonNodeIDs = [jsonNodeID for jsonNodeID, in self._store.execute("SELECT jsonNodeID FROM pending LIMIT 5").fetchall()]
+        if len(unresolvedJsonNodeIDs) > 0:
+            numberOfUnresolvedEntries = self._store.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+            raise ValueError(f"{numberOfUnresolvedEntries} entries of the RALJ file refer to undefined json node ids or to each other in a cycle, for example {', '.join(unresolvedJsonNodeIDs)}.")
+        return self._numberOfLoadedAbstractions
+    def close(self):
+        self._store.close()
+    def _getAbstractionIDs(self, jsonNodeIDs):
+        # Look up the abstraction ids of the loaded json node ids
+        jsonNodeIDs = list(jsonNodeIDs)
+        abstractionIDByJsonNodeID = {}
+        for start in range(0, len(jsonNodeIDs), 500):
+            chunk = jsonNodeIDs[start:start + 500]
+            abstractionIDByJsonNodeID.update(self._store.execute(f"SELECT jsonNodeID, abstractionID FROM loaded WHERE jsonNodeID IN ({', '.join(['?'] * len(chunk))})", chunk).fetchall())
+        return abstractionIDByJsonNodeID
+    def _addReadyEntry(self, blockIndex, jsonNodeID, content):
+        # Add the entry to the batch together with the pending entries that only waited for it or for each other
+        newReadyEntries = [(blockIndex, jsonNodeID, content)]
+        while len(newReadyEntries) > 0:
+            blockIndex, jsonNodeID, content = newReadyEntries.pop()
+            layer = max([self._readyLayerByJsonNodeID.get(requiredJsonNodeID, -1) + 1 for requiredJsonNodeID in getRequiredJsonNodeIDs(blockIndex, content)], default = 0)
+            self._readyLayerByJsonNodeID[jsonNodeID] = layer
+            self._readyEntries.append((layer, blockIndex, jsonNodeID, content))
+            # Resolve the references of the pending entries to the entry
+            waitingJsonNodeIDs = self._store.execute("SELECT jsonNodeID FROM waiting WHERE requiredJsonNodeID = ?", (jsonNodeID,)).fetchall()
+            if len(waitingJsonNodeIDs) == 0:
+                continue
+            self._store.execute("DELETE FROM waiting WHERE requiredJsonNodeID = ?", (jsonNodeID,))
+            self._store.executemany("UPDATE pending SET missing = missing - 1 WHERE jsonNodeID = ?", waitingJsonNodeIDs)
+            for waitingJsonNodeID, waitingBlockIndex, waitingContent in self._store.execute(f"SELECT jsonNodeID, blockIndex, content FROM pending WHERE missing = 0 AND jsonNodeID IN ({', '.join(['?'] * len(waitingJsonNodeIDs))})", [waitingJsonNodeID for waitingJsonNodeID, in waitingJsonNodeIDs]).fetchall():
+                self._store.execute("DELETE FROM pending WHERE jsonNodeID = ?", (waitingJsonNodeID,))
+                newReadyEntries.append((waitingBlockIndex, waitingJsonNodeID, json.loads(waitingContent)))
+    def _loadReadyEntries(self):
+        # Load the ready entries batch by batch
+        # The entries are added after the entries they refer to, so every prefix of the ready entries can be created on its own
+        while len(self._readyEntries) > 0:
+            entries = self._readyEntries[:self.batchSize]
+            self._readyEntries = self._readyEntries[self.batchSize:]
+            abstractionIDs = self._createAbstractions(entries)
+            self._store.executemany("INSERT OR REPLACE INTO loaded (jsonNodeID, abstractionID) VALUES (?, ?)", zip([jsonNodeID for layer, blockIndex, jsonNodeID, content in entries], abstractionIDs))
+            for layer, blockIndex, jsonNodeID, content in entries:
+                self._readyLayerByJsonNodeID.pop(jsonNodeID, None)
+    def _createAbstractions(self, entries):
+        # Create the abstractions of the entries layer by layer in one transaction of the framework and return their ids
+        RALFramework = self.RALFramework
+        batchJsonNodeIDs = set([jsonNodeID for layer, blockIndex, jsonNodeID, content in entries])
+        abstractionIDByJsonNodeID = self._getAbstractionIDs(set([requiredJsonNodeID for layer, blockIndex, jsonNodeID, content in entries for requiredJsonNodeID in getRequiredJsonNodeIDs(blockIndex, content)]).difference(batchJsonNodeIDs))
+        abstractionByJsonNodeID = {jsonNodeID : RALFramework.getAbstractionFromID(abstractionID) for jsonNodeID, abstractionID in abstractionIDByJsonNodeID.items()}
+        abstractions = [None] * len(entries)
+        indicesByLayer = {}
+        for index, (layer, blockIndex, jsonNodeID, content) in enumerate(entries):
+            indicesByLayer.setdefault(layer, []).append(index)
+        with RALFramework.transaction():
+            for layer in sorted(indicesByLayer.keys()):
+                indices = indicesByLayer[layer]
+                dataIndices = [index for index in indices if entries[index][1] == 0]
+                for index, abstraction in zip(dataIndices, RALFramework.DirectDataAbstractions([entries[index][3] for index in dataIndices])):
+                    abstractions[index] = abstraction
+                constructedIndices = [index for index in indices if entries[index][1] == 1]
+                baseConnectionsList = [[[0 if y == 0 else abstractionByJsonNodeID[y] for y in x] for x in entries[index][3]] for index in constructedIndices]
+                for index, abstraction in zip(constructedIndices, RALFramework.ConstructedAbstractions(baseConnectionsList)):
+                    abstractions[index] = abstraction
+                for index in indices:
+                    if entries[index][1] == 2:
+                        abstractions[index] = RALFramework.DirectAbstraction(abstractionByJsonNodeID[entries[index][3]])
+                    elif entries[index][1] == 3:
+                        abstractions[index] = RALFramework.InverseDirectAbstraction(abstractionByJsonNodeID[entries[index][3]])
+                for index in indices:
+                    abstractionByJsonNodeID[entries[index][2]] = abstractions[index]
+            if not self.keepAbstractions:
+                RALFramework.setAbstractionsRemembered(abstractions)
+        if self.keepAbstractions:
+            # Keep the wrappers, so that the loaded abstractions are not deleted after the batch
+            for layer, blockIndex, jsonNodeID, content in entries:
+                self.abstractionByJsonNodeID[jsonNodeID] = abstractionByJsonNodeID[jsonNodeID]
+        self._numberOfLoadedAbstractions += len(entries)
+        return [abstraction.id for abstraction in abstractions]
+
+def getRequiredJsonNodeIDs(blockIndex, content):
+    """
+    Returns the set of json node ids that a RALJ entry refers to.
+    """
+    if blockIndex == 0:
+        return set()
+    if blockIndex == 1:
+        return set([jsonNodeID for connection in content for jsonNodeID in connection if jsonNodeID != 0])
+    return {content}
+
+def saveRALJFileStreaming(abstractions, file_path, RALFramework, batchSize = 1000, compression = None, spoolCacheSize = 65536):
+    """
+    Saves the abstractions and all abstractions they depend on into a RALJ file without building the RALJ data in memory.
+    The abstractions are visited in dependency order by an iterative depth first search, whose contents are fetched in batches of batchSize abstractions with getAbstractionContentEntries of the RALFramework.
+    Every entry is written as soon as the entries it refers to are written, so that the file can be loaded with a small frontier.
+    Since the data concept block comes first in the file but is grouped by format, the data concepts are collected in a temporary sqlite database and the other blocks are spooled to temporary files until the end.
+    The same database stores the json node ids of the visited abstractions, whose page cache of spoolCacheSize KiB spills to disk.
+    The compression of the file can be None, "gzip" or "zstd". Returns the number of saved abstractions.
+    """
+    writer = RALJStreamWriter(RALFramework, batchSize, spoolCacheSize)
+    try:
+        writer.addAbstractions([abstraction.id for abstraction in abstractions])
+        with openRALJStream(file_path, "w", compression) as file:
+            return writer.write(file)
+    finally:
+        writer.close()
+
+class RALJStreamWriter:
+    """
+    Visits abstractions and their dependencies in dependency order and spools their RALJ entries until they are written into a file.
+    """
+    def __init__(self, RALFramework, batchSize = 1000, spoolCacheSize = 65536):
+        self.RALFramework = RALFramework
+        self.batchSize = batchSize
+        # An empty path opens a private temporary database that is deleted when it is closed
+        self._store = sqlite3.connect("", isolation_level = None)
+        self._store.execute(f"PRAGMA cache_size = -{int(spoolCacheSize)}")
+        self._store.execute("PRAGMA journal_mode = OFF")
+        self._store.execute("PRAGMA synchronous = OFF")
+        self._store.execute("CREATE TABLE visited (abstractionID INTEGER PRIMARY KEY, jsonNodeID INTEGER)")
+        self._store.execute("CREATE TABLE dataConcepts (format TEXT, data TEXT, jsonNodeID INTEGER)")
+        # The store does not need to be durable, so all changes are made in one transaction that is never committed
+        self._store.execute("BEGIN")
+        self._spools = {blockIndex : tempfile.TemporaryFile("w+", encoding = "utf-8") for blockIndex in [1, 2, 3]}
+        self._numberOfSpooledEntries = {blockIndex : 0 for blockIndex in [1, 2, 3]}
+        self._numberOfSavedAbstractions = 0
+    def addAbstractions(self, ids):
+        """
+        Visits the abstractions with the given ids and all abstractions they depend on and spools their entries.
+        """
+        for start in range(0, len(ids), self.batchSize):
+            chunk = ids[start:start + self.batchSize]
+            unsavedIds = set(chunk).difference(self._getJsonNodeIDs(chunk).keys())
+            self._visit([[id, None, False] for id in chunk if id in unsavedIds])
+    def write(self, file):
+        """
+        Writes the spooled entries as RALJ file and returns the number of saved abstractions.
+        """
+        file.write("[{")
+        currentFormat = None
+        for format, data, jsonNodeID in self._store.execute("SELECT format, data, jsonNodeID FROM dataConcepts ORDER BY format, jsonNodeID"):
+            if format != currentFormat:
+                file.write(("" if currentFormat == None else "}, ") + json.dumps(format) + ": {")
+                currentFormat = format
+            else:
+                file.write(", ")
+            file.write(json.dumps(data) + ": " + json.dumps(str(jsonNodeID)))
+        file.write(("" if currentFormat == None else "}") + "}")
+        blockIndices = [1, 2, 3] if self._numberOfSpooledEntries[2] > 0 or self._numberOfSpooledEntries[3] > 0 else [1]
+        for blockIndex in blockIndices:
+            spool = self._spools[blockIndex]
+            spool.seek(0)
+            file.write(", {")
+            shutil.copyfileobj(spool, file)
+            file.write("}")
+        file.write("]")
+        return self._numberOfSavedAbstractions
+    def close(self):
+        self._store.close()
+        for spool in self._spools.values():
+            spool.close()
+    def _getJsonNodeIDs(self, ids):
+        # Look up the json node ids of the saved abstraction ids
+        ids = list(ids)
+        jsonNodeIDByAbstractionID = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            jsonNodeIDByAbstractionID.update(self._store.execute(f"SELECT abstractionID, jsonNodeID FROM visited WHERE jsonNodeID IS NOT NULL AND abstractionID IN ({', '.join(['?'] * len(chunk))})", chunk).fetchall())
+        return jsonNodeIDByAbstractionID
+    def _visit(self, stack):
+        # Each item of the stack is a list of the abstraction id, its content entry and whether its dependencies have been pushed
+        # An abstraction can be on the stack several times, but only the topmost occurrence is saved
+        while len(stack) > 0:
+            item = stack[-1]
+            if item[1] == None:
+                # Fetch the contents of the topmost abstractions whose contents are unknown in one batch
+                unfetchedItems = []
+                for unfetchedItem in reversed(stack):
+                    if unfetchedItem[1] != None or len(unfetchedItems) >= self.batchSize:
+                        break
+                    unfetchedItems.append(unfetchedItem)
+                entries = self.RALFramework.getAbstractionContentEntries([unfetchedItem[0] for unfetchedItem in unfetchedItems])
+                for unfetchedItem in unfetchedItems:
+                    if unfetchedItem[0] not in entries:
+                        raise ValueError(f"The abstraction {unfetchedItem[0]} does not exist.")
+                    unfetchedItem[1] = entries[unfetchedItem[0]]
+            id, (type, content, remembered), dependenciesPushed = item
+            if not dependenciesPushed:
+                item[2] = True
+                requiredIds = getContentEntryDependencies(type, content) | {id}
+                jsonNodeIDByAbstractionID = self._getJsonNodeIDs(requiredIds)
+                if id in jsonNodeIDByAbstractionID:
+                    # A deeper occurrence of an abstraction that has already been saved
+                    stack.pop()
+                    continue
+                for requiredId in requiredIds.difference(jsonNodeIDByAbstractionID.keys()).difference({id}):
+                    stack.append([requiredId, None, False])
                 continue
-        # The abstraction is loaded
-        if jsonNodeID in relatingAbstractionsByJsonNodeID:
-            for relatingJsonNodeID in relatingAbstractionsByJsonNodeID[jsonNodeID]:
-                if not relatingJsonNodeID in loadedJsonNodeIDs:
-                    uncheckedJsonNodeIDs.add(relatingJsonNodeID)
-            del relatingAbstractionsByJsonNodeID[jsonNodeID]
-    return abstractionIDByJsonNodeID
+            stack.pop()
+            self._saveEntry(id, type, content)
+    def _saveEntry(self, id, type, content):
+        # Assign the next json node id to the abstraction and spool its entry
+        self._numberOfSavedAbstractions += 1
+        jsonNodeID = self._numberOfSavedAbstractions
+        self._store.execute("INSERT OR REPLACE INTO visited (abstractionID, jsonNodeID) VALUES (?, ?)", (id, jsonNodeID))
+        if type == "DirectDataAbstraction":
+            self._store.execute("INSERT INTO dataConcepts (format, data, jsonNodeID) VALUES (?, ?, ?)", (content[1], content[0], jsonNodeID))
+            return
+        jsonNodeIDByAbstractionID = self._getJsonNodeIDs(getContentEntryDependencies(type, content))
+        if type == "ConstructedAbstraction":
+            blockIndex = 1
+            value = [[0 if element == 0 else str(jsonNodeIDByAbstractionID[element]) for element in triple] for triple in content]
+        else:
+            blockIndex = 2 if type == "DirectAbstraction" else 3
+            value = str(jsonNodeIDByAbstractionID[content])
+        self._spools[blockIndex].write(("" if self._numberOfSpooledEntries[blockIndex] == 0 else ", ") + json.dumps(str(jsonNodeID)) + ": " + json.dumps(value))
+        self._numberOfSpooledEntries[blockIndex] += 1
+
+def getContentEntryDependencies(type, content):
+    """
+    Returns the set of abstraction ids that the content entry of an abstraction refers to.
+    """
+    if type == "DirectDataAbstraction":
+        return set()
+    if type == "ConstructedAbstraction":
+        return set([element for triple in content for element in triple if element != 0])
+    return {content}
+
+def openRALJStream(file_path, mode, compression = None):
+    """
+    Opens a RALJ file as text stream for reading ("r") or writing ("w") that is optionally compressed with "gzip" or "zstd".
+    The zstd compression requires the zstandard package.
+    """
+    if compression == None:
+        return open(file_path, mode, encoding = "utf-8")
+    if compression == "gzip":
+        return gzip.open(file_path, mode + "t", encoding = "utf-8")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("The zstd compression of RALJ files requires the zstandard package.")
+        return zstandard.open(file_path, mode + "t", encoding = "utf-8")
+    raise ValueError(f"Unknown compression {compression!r}, it must be None, \"gzip\" or \"zstd\".")
 
 def saveRALJFile(abstractions, file_path, RALFramework):
     with open(file_path, "w") as file:
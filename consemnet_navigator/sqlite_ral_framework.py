@@ -1,16 +1,113 @@
 import sqlite3
+import hashlib
+import copy
+from contextlib import contextmanager
 from weakref import WeakValueDictionary
+from .abstraction_content_cache import AbstractionContentCache
+from .garbage_collection import DeferredGarbageCollection
 
-class SQLiteRALFramework:
-    def __init__(self, db_path: str):
+class SQLiteRALFramework(AbstractionContentCache, DeferredGarbageCollection):
+    def __init__(self, db_path: str, contentCacheSize = 10000, deferredGarbageCollection = False, garbageCollectionInterval = None):
         self._db_path = db_path
-        self._conn = sqlite3.connect(db_path)
+        # The transactions are managed explicitly by the transaction method
+        self._conn = sqlite3.connect(db_path, isolation_level = None)
         self._cur = self._conn.cursor()
-        self._cur.execute("CREATE TABLE IF NOT EXISTS abstractions (id INTEGER PRIMARY KEY, data TEXT, format TEXT, connections TEXT, tripleIds TEXT, remember INTEGER)")
-        self._cur.execute("CREATE TABLE IF NOT EXISTS triples (id INTEGER PRIMARY KEY, subject INTEGER, predicate INTEGER, object INTEGER, owner INTEGER)")
+        self._transactionDepth = 0
+        self._flushInterval = None
+        self._writeOperationsSinceFlush = 0
+        self._searchStatistics = None
+        # The statistics before the first change in each open transaction, False if they were collected within the transaction
+        self._searchStatisticsSnapshots = []
+        # The ids of the abstractions that were inserted in each open transaction, whose wrappers are deactivated if the transaction is rolled back
+        self._insertedAbstractionIDs = []
         self._wrappersByAbstractionID = WeakValueDictionary()
+        self._initializeContentCache(contentCacheSize)
+        self._initializeGarbageCollection(deferredGarbageCollection, garbageCollectionInterval)
+        migrateSQLiteSchema(self)
+        # Temporary tables for the set based lookups of the bulk operations
+        self._cur.execute("CREATE TEMP TABLE IF NOT EXISTS pendingDataAbstractions (data TEXT, format TEXT)")
+        self._cur.execute("CREATE TEMP TABLE IF NOT EXISTS pendingConstructedAbstractions (connectionHash BLOB, connections TEXT)")
+        self._cur.execute("CREATE TEMP TABLE IF NOT EXISTS pendingAbstractionIDs (id INTEGER PRIMARY KEY)")
+        self._cur.execute("CREATE TEMP TABLE IF NOT EXISTS garbageAbstractionIDs (id INTEGER PRIMARY KEY)")
         self._onClose = set()
     def ConstructedAbstraction(self, baseConnections):
+        connectionRepresentationString = self._getConnectionRepresentationString(baseConnections)
+        connectionHash = getConnectionHash(connectionRepresentationString)
+        # Check if the abstraction already exists by comparing the connection strings of the abstractions with the same hash
+        for id, connections in self._cur.execute("SELECT id, connections FROM abstractions WHERE connectionHash = ?", (connectionHash,)).fetchall():
+            if connections == connectionRepresentationString:
+                return self._getAbstractionWrapperFromID(id)
+        with self.transaction():
+            # Create the abstraction
+            self._cur.execute("INSERT INTO abstractions (data, format, connections, connectionHash, connectionCount, tripleIds, remember) VALUES (?, ?, ?, ?, ?, ?, ?)", (None, None, connectionRepresentationString, connectionHash, len(baseConnections), None, 0))
+            result = self._getAbstractionWrapperFromID(self._cur.lastrowid)
+            self._registerInsertedAbstractions([result.id])
+            # Create the triples
+            tripleIds = []
+            for triple in baseConnections:
+                self._cur.execute("INSERT INTO triples (subject, predicate, object, owner) VALUES (?, ?, ?, ?)", (triple[0].id if triple[0] != 0 else result.id, triple[1].id if triple[1] != 0 else result.id, triple[2].id if triple[2] != 0 else result.id, result.id))
+                tripleIds.append(self._cur.lastrowid)
+            tripleIdRepresentationString = ",".join([str(tripleId) for tripleId in tripleIds])
+            self._cur.execute("UPDATE abstractions SET tripleIds = ? WHERE id = ?", (tripleIdRepresentationString, result.id))
+        searchStatistics = self._getChangingSearchStatistics()
+        if searchStatistics != None:
+            searchStatistics.registerTriples([[element.id if element != 0 else result.id for element in triple] for triple in baseConnections])
+        self._registerWriteOperation()
+        return result
+    def ConstructedAbstractions(self, baseConnectionsIterable, chunkSize = 10000):
+        """
+        Creates the constructed abstractions of all given base connections and returns them in the input order.
+        The already existing abstractions are looked up with one query per chunk and the missing ones are inserted with executemany.
+        """
+        result = []
+        chunk = []
+        for baseConnections in baseConnectionsIterable:
+            chunk.append(baseConnections)
+            if len(chunk) >= chunkSize:
+                result.extend(self._createConstructedAbstractionChunk(chunk))
+                chunk = []
+        result.extend(self._createConstructedAbstractionChunk(chunk))
+        return result
+    def _createConstructedAbstractionChunk(self, chunk):
+        connectionRepresentationStrings = [self._getConnectionRepresentationString(baseConnections) for baseConnections in chunk]
+        baseConnectionsByRepresentationString = dict(zip(connectionRepresentationStrings, chunk))
+        with self.transaction():
+            # Find the already existing abstractions
+            self._cur.execute("DELETE FROM temp.pendingConstructedAbstractions")
+            self._cur.executemany("INSERT INTO temp.pendingConstructedAbstractions (connectionHash, connections) VALUES (?, ?)", [(getConnectionHash(representationString), representationString) for representationString in baseConnectionsByRepresentationString])
+            selectString = "SELECT p.connections, a.connections, a.id FROM temp.pendingConstructedAbstractions p JOIN abstractions a ON a.connectionHash = p.connectionHash"
+            idsByRepresentationString = self._getIDsByConnectionRepresentationString(selectString)
+            missingRepresentationStrings = [representationString for representationString in baseConnectionsByRepresentationString if representationString not in idsByRepresentationString]
+            if len(missingRepresentationStrings) > 0:
+                # Create the missing abstractions
+                self._cur.executemany("INSERT INTO abstractions (data, format, connections, connectionHash, connectionCount, tripleIds, remember) VALUES (NULL, NULL, ?, ?, ?, NULL, 0)", [(representationString, getConnectionHash(representationString), len(baseConnectionsByRepresentationString[representationString])) for representationString in missingRepresentationStrings])
+                idsByRepresentationString = self._getIDsByConnectionRepresentationString(selectString)
+                newIds = [idsByRepresentationString[representationString] for representationString in missingRepresentationStrings]
+                self._registerInsertedAbstractions(newIds)
+                # Create the triples of the missing abstractions
+                tripleRows = [(triple[0].id if triple[0] != 0 else id, triple[1].id if triple[1] != 0 else id, triple[2].id if triple[2] != 0 else id, id)
+                              for representationString, id in zip(missingRepresentationStrings, newIds) for triple in baseConnectionsByRepresentationString[representationString]]
+                self._cur.executemany("INSERT INTO triples (subject, predicate, object, owner) VALUES (?, ?, ?, ?)", tripleRows)
+                searchStatistics = self._getChangingSearchStatistics()
+                if searchStatistics != None:
+                    searchStatistics.registerTriples([tripleRow[:3] for tripleRow in tripleRows])
+                # Store the triple ids of the missing abstractions
+                self._cur.execute("DELETE FROM temp.pendingAbstractionIDs")
+                self._cur.executemany("INSERT INTO temp.pendingAbstractionIDs (id) VALUES (?)", [(id,) for id in newIds])
+                tripleIdsByOwner = {}
+                for owner, tripleId in self._cur.execute("SELECT owner, id FROM triples WHERE owner IN (SELECT id FROM temp.pendingAbstractionIDs) ORDER BY id").fetchall():
+                    tripleIdsByOwner.setdefault(owner, []).append(str(tripleId))
+                self._cur.executemany("UPDATE abstractions SET tripleIds = ? WHERE id = ?", [(",".join(tripleIds), owner) for owner, tripleIds in tripleIdsByOwner.items()])
+        self._registerWriteOperation(len(missingRepresentationStrings))
+        return [self._getAbstractionWrapperFromID(idsByRepresentationString[representationString]) for representationString in connectionRepresentationStrings]
+    def _getIDsByConnectionRepresentationString(self, selectString):
+        # Map the pending connection strings to the ids of the abstractions with the same connection hash and skip the colliding ones
+        idsByRepresentationString = {}
+        for pendingRepresentationString, representationString, id in self._cur.execute(selectString).fetchall():
+            if pendingRepresentationString == representationString:
+                idsByRepresentationString[representationString] = id
+        return idsByRepresentationString
+    def _getConnectionRepresentationString(self, baseConnections):
         # Iterate through the base connections and create the triple representations
         tripleRepresentations = []
         for triple in baseConnections:
@@ -36,24 +133,7 @@ class SQLiteRALFramework:
                 raise ValueError("The object of a triple must be an abstraction.")
             tripleRepresentations.append((subject, predicate, object))
         tripleRepresentations.sort()
-        connectionRepresentationString = "|".join([",".join(triple) for triple in tripleRepresentations])
-        # Check if the abstraction already exists
-        self._cur.execute("SELECT id FROM abstractions WHERE connections = ?", (connectionRepresentationString,))
-        res = self._cur.fetchone()
-        if res != None:
-            return self._getAbstractionWrapperFromID(res[0])
-        # Create the abstraction
-        self._cur.execute("INSERT INTO abstractions (data, format, connections, tripleIds, remember) VALUES (?, ?, ?, ?, ?)", (None, None, connectionRepresentationString, None, 0))
-        result = self._getAbstractionWrapperFromID(self._cur.lastrowid)
-        # Create the triples
-        tripleIds = []
-        for triple in baseConnections:
-            self._cur.execute("INSERT INTO triples (subject, predicate, object, owner) VALUES (?, ?, ?, ?)", (triple[0].id if triple[0] != 0 else result.id, triple[1].id if triple[1] != 0 else result.id, triple[2].id if triple[2] != 0 else result.id, result.id))
-            tripleIds.append(self._cur.lastrowid)
-        tripleIdRepresentationString = ",".join([str(tripleId) for tripleId in tripleIds])
-        self._cur.execute("UPDATE abstractions SET tripleIds = ? WHERE id = ?", (tripleIdRepresentationString, result.id))
-        self._conn.commit()
-        return result
+        return "|".join([",".join(triple) for triple in tripleRepresentations])
     def DirectDataAbstraction(self, datastring, formatstring):
         # Check if the abstraction already exists
         self._cur.execute("SELECT id FROM abstractions WHERE data = ? AND format = ?", (datastring, formatstring))
@@ -62,14 +142,169 @@ class SQLiteRALFramework:
             return self._getAbstractionWrapperFromID(res[0])
         # Create the abstraction
         self._cur.execute("INSERT INTO abstractions (data, format, connections, remember) VALUES (?, ?, ?, ?)", (datastring, formatstring, None, 0))
-        self._conn.commit()
-        return self._getAbstractionWrapperFromID(self._cur.lastrowid)
+        result = self._getAbstractionWrapperFromID(self._cur.lastrowid)
+        self._registerInsertedAbstractions([result.id])
+        searchStatistics = self._getChangingSearchStatistics()
+        if searchStatistics != None:
+            searchStatistics.registerDataAbstractions(1)
+        self._registerWriteOperation()
+        return result
+    def DirectDataAbstractions(self, dataAndFormats, chunkSize = 10000):
+        """
+        Creates the direct data abstractions of all given (data, format) pairs and returns them in the input order.
+        The already existing abstractions are looked up with one query per chunk and the missing ones are inserted with executemany.
+        """
+        result = []
+        chunk = []
+        for data, format in dataAndFormats:
+            chunk.append((data, format))
+            if len(chunk) >= chunkSize:
+                result.extend(self._createDirectDataAbstractionChunk(chunk))
+                chunk = []
+        result.extend(self._createDirectDataAbstractionChunk(chunk))
+        return result
+    def _createDirectDataAbstractionChunk(self, chunk):
+        uniqueDataAndFormats = set(chunk)
+        with self.transaction():
+            # Find the already existing abstractions
+            self._cur.execute("DELETE FROM temp.pendingDataAbstractions")
+            self._cur.executemany("INSERT INTO temp.pendingDataAbstractions (data, format) VALUES (?, ?)", uniqueDataAndFormats)
+            selectString = "SELECT a.data, a.format, a.id FROM temp.pendingDataAbstractions p JOIN abstractions a ON a.data = p.data AND a.format = p.format"
+            idsByDataAndFormat = {(data, format) : id for data, format, id in self._cur.execute(selectString).fetchall()}
+            missingDataAndFormats = uniqueDataAndFormats.difference(idsByDataAndFormat.keys())
+            if len(missingDataAndFormats) > 0:
+                # Create the missing abstractions
+                self._cur.executemany("INSERT INTO abstractions (data, format, connections, remember) VALUES (?, ?, NULL, 0)", missingDataAndFormats)
+                searchStatistics = self._getChangingSearchStatistics()
+                if searchStatistics != None:
+                    searchStatistics.registerDataAbstractions(len(missingDataAndFormats))
+                idsByDataAndFormat = {(data, format) : id for data, format, id in self._cur.execute(selectString).fetchall()}
+                self._registerInsertedAbstractions([idsByDataAndFormat[dataAndFormat] for dataAndFormat in missingDataAndFormats])
+        self._registerWriteOperation(len(missingDataAndFormats))
+        return [self._getAbstractionWrapperFromID(idsByDataAndFormat[dataAndFormat]) for dataAndFormat in chunk]
+    def setAbstractionsRemembered(self, abstractions, remembered = True):
+        """
+        Sets the remembered flag of all given abstractions with one statement per chunk of 500 abstractions in one transaction.
+        """
+        ids = [abstraction.id for abstraction in abstractions]
+        with self.transaction():
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                self._cur.execute(f"UPDATE abstractions SET remember = ? WHERE id IN ({', '.join(['?'] * len(chunk))})", [1 if remembered else 0, *chunk])
+        for id in ids:
+            self._setCachedRemembered(id, bool(remembered))
+        self._registerWriteOperation(len(ids))
+    def _getContentEntry(self, id):
+        # Get the data, format, connections and remembered flag of the abstraction from the content cache or the database
+        entry = self._getCachedContent(id)
+        if entry == None:
+            data, format, connections, remember = self._cur.execute("SELECT data, format, connections, remember FROM abstractions WHERE id = ?", (id,)).fetchone()
+            entry = (data, format, decodeConnectionString(connections), remember != 0)
+            self._cacheContent(id, entry)
+        return entry
+    def _getContentEntries(self, ids):
+        # Get the content entries of several abstractions with one query per chunk of ids that are not cached
+        result = {}
+        missingIds = []
+        for id in ids:
+            entry = self._getCachedContent(id)
+            if entry == None:
+                missingIds.append(id)
+            else:
+                result[id] = entry
+        for start in range(0, len(missingIds), 500):
+            chunk = missingIds[start:start + 500]
+            for id, data, format, connections, remember in self._cur.execute(f"SELECT id, data, format, connections, remember FROM abstractions WHERE id IN ({', '.join(['?'] * len(chunk))})", chunk).fetchall():
+                result[id] = (data, format, decodeConnectionString(connections), remember != 0)
+                self._cacheContent(id, result[id])
+        return result
+    def getAbstractionContentEntries(self, ids):
+        """
+        Returns a dictionary that maps each of the given abstraction ids to a tuple of its type, its content and its remembered flag.
+        The content of a direct data abstraction is the tuple of its data and format and the content of a constructed abstraction the frozenset of its base connections, that contain abstraction ids and 0 for the self references.
+        """
+        return {id : ("DirectDataAbstraction", (data, format), remembered) if connections == None else ("ConstructedAbstraction", connections, remembered) for id, (data, format, connections, remembered) in self._getContentEntries(ids).items()}
     def _getAbstractionWrapperFromID(self, id):
         if id in self._wrappersByAbstractionID:
             return self._wrappersByAbstractionID[id]
         wrapper = SQLiteAbstraction(id, self)
         self._wrappersByAbstractionID[id] = wrapper
         return wrapper
+    @contextmanager
+    def transaction(self):
+        """
+        Opens a transaction that all write operations of the framework join until the context is left.
+        Nested transactions are realized as savepoints, so that an error only rolls back the innermost transaction.
+        """
+        depth = self._transactionDepth
+        self._cur.execute("BEGIN" if depth == 0 else f"SAVEPOINT transaction{depth}")
+        self._transactionDepth += 1
+        self._searchStatisticsSnapshots.append(None)
+        self._insertedAbstractionIDs.append([])
+        try:
+            yield self
+        except BaseException:
+            self._transactionDepth = depth
+            # The cache could contain entries of abstractions that are removed by the rollback
+            self.clearContentCache()
+            # The ids of the abstractions that are removed by the rollback are reused by sqlite, so their wrappers must not be found again
+            for id in self._insertedAbstractionIDs.pop():
+                wrapper = self._wrappersByAbstractionID.pop(id, None)
+                if wrapper != None:
+                    wrapper._id = None
+            # Restore the search statistics from before the transaction or collect them again if that is not possible
+            searchStatisticsSnapshot = self._searchStatisticsSnapshots.pop()
+            if searchStatisticsSnapshot == False:
+                self._searchStatistics = None
+            elif searchStatisticsSnapshot != None:
+                self._searchStatistics = copy.deepcopy(searchStatisticsSnapshot)
+            if depth == 0:
+                self._cur.execute("ROLLBACK")
+            else:
+                self._cur.execute(f"ROLLBACK TO transaction{depth}")
+                self._cur.execute(f"RELEASE transaction{depth}")
+            raise
+        self._transactionDepth = depth
+        self._searchStatisticsSnapshots.pop()
+        insertedAbstractionIDs = self._insertedAbstractionIDs.pop()
+        if depth > 0:
+            # The inserted abstractions are still removed if the enclosing transaction is rolled back
+            self._insertedAbstractionIDs[-1].extend(insertedAbstractionIDs)
+        if depth == 0:
+            self._cur.execute("COMMIT")
+            self._writeOperationsSinceFlush = 0
+            self._collectGarbageIfDue()
+        else:
+            self._cur.execute(f"RELEASE transaction{depth}")
+    def _registerInsertedAbstractions(self, ids):
+        # Remember the inserted abstractions of the innermost transaction, outside of a transaction they are committed immediately
+        if len(self._insertedAbstractionIDs) > 0:
+            self._insertedAbstractionIDs[-1].extend(ids)
+    @contextmanager
+    def batch(self, flushInterval = None):
+        """
+        Opens a transaction for bulk writes.
+        If a flushInterval is given and the batch is the outermost transaction, the transaction is committed after every flushInterval write operations.
+        In that case an error only rolls back the write operations since the last flush.
+        """
+        previousFlushInterval = self._flushInterval
+        self._flushInterval = flushInterval
+        try:
+            with self.transaction():
+                yield self
+        finally:
+            self._flushInterval = previousFlushInterval
+    def _registerWriteOperation(self, numberOfOperations = 1):
+        # Flush the outermost batch transaction if the flush interval is reached
+        self._writeOperationsSinceFlush += numberOfOperations
+        if self._flushInterval != None and self._transactionDepth == 1 and self._writeOperationsSinceFlush >= self._flushInterval:
+            self._cur.execute("COMMIT")
+            self._cur.execute("BEGIN")
+            self._writeOperationsSinceFlush = 0
+            self._searchStatisticsSnapshots[0] = None
+            self._insertedAbstractionIDs[0] = []
+        elif self._transactionDepth == 0:
+            self._collectGarbageIfDue()
     def __del__(self):
         self.close()
     def close(self):
@@ -77,13 +312,179 @@ class SQLiteRALFramework:
             closefunction(self)
         for wrapper in self._wrappersByAbstractionID.values():
             wrapper._safeDelete()
+        if self._deferredGarbageCollection:
+            self.collectGarbage()
         self._conn.close()
+    def _sweepGarbage(self, ids):
+        # Delete the collectable abstractions set by set until no more abstractions become collectable
+        freedAbstractions, freedTriples, sweeps = 0, 0, 0
+        with self.transaction():
+            while len(ids) > 0:
+                sweeps += 1
+                # Find the candidates that are not remembered and only referenced by their own triples
+                self._cur.execute("DELETE FROM temp.pendingAbstractionIDs")
+                self._cur.executemany("INSERT INTO temp.pendingAbstractionIDs (id) VALUES (?)", [(id,) for id in ids])
+                collectableIds = [id for id, in self._cur.execute("SELECT a.id FROM abstractions a WHERE a.id IN (SELECT id FROM temp.pendingAbstractionIDs) AND a.remember = 0 "
+                                                                  "AND NOT EXISTS (SELECT 1 FROM triples t WHERE t.subject = a.id AND t.owner != a.id) "
+                                                                  "AND NOT EXISTS (SELECT 1 FROM triples t WHERE t.predicate = a.id AND t.owner != a.id) "
+                                                                  "AND NOT EXISTS (SELECT 1 FROM triples t WHERE t.object = a.id AND t.owner != a.id)").fetchall()]
+                # Keep the abstractions with active wrappers
+                collectableIds = [id for id in collectableIds if getattr(self._wrappersByAbstractionID.get(id), "_id", None) == None]
+                if len(collectableIds) == 0:
+                    break
+                triples = self._deleteAbstractions(collectableIds)
+                freedAbstractions += len(collectableIds)
+                freedTriples += len(triples)
+                ids = set([element for triple in triples for element in triple]).difference(collectableIds)
+        return freedAbstractions, freedTriples, sweeps
+    def _deleteAbstractions(self, ids):
+        # Delete the abstractions together with their triples and return the deleted triples
+        self._cur.execute("DELETE FROM temp.garbageAbstractionIDs")
+        self._cur.executemany("INSERT INTO temp.garbageAbstractionIDs (id) VALUES (?)", [(id,) for id in ids])
+        triples = self._cur.execute("SELECT subject, predicate, object FROM triples WHERE owner IN (SELECT id FROM temp.garbageAbstractionIDs)").fetchall()
+        numberOfDataAbstractions = self._cur.execute("SELECT COUNT(*) FROM abstractions WHERE id IN (SELECT id FROM temp.garbageAbstractionIDs) AND data IS NOT NULL").fetchone()[0]
+        self._cur.execute("DELETE FROM triples WHERE owner IN (SELECT id FROM temp.garbageAbstractionIDs)")
+        self._cur.execute("DELETE FROM abstractions WHERE id IN (SELECT id FROM temp.garbageAbstractionIDs)")
+        for id in ids:
+            self._invalidateCachedContent(id)
+        searchStatistics = self._getChangingSearchStatistics()
+        if searchStatistics != None:
+            searchStatistics.unregisterTriples(triples)
+            searchStatistics.registerDataAbstractions(-numberOfDataAbstractions)
+        return triples
     @property
     def onClose(self):
         return self._onClose
     def isValidAbstraction(self, abstraction):
         return type(abstraction) == SQLiteAbstraction and abstraction.RALFramework == self and abstraction._id != None
-    def searchRALJPattern(self, data = {}, constructed = {}, triples = []):
+    def searchRALJPattern(self, data = {}, constructed = {}, triples = [], engine = "modules", rawIDs = False):
+        """
+        Yields a dictionary for every match of the RALJ pattern, that maps the parameters of the pattern to their values.
+        The default "modules" engine joins the results of one query per search module and partial match in the order of the search plan, while the alternative "sql" engine compiles the whole pattern into a single sql query.
+        If rawIDs is True, tuples of the parameter values in the order of getRALJPatternParameterNames are yielded instead, in which the abstractions are represented by their ids.
+        """
+        if rawIDs:
+            parameterNames = getRALJPatternParameterNames(data, constructed, triples)
+        if engine == "sql":
+            query, queryParameters, resultParameterNames, knownParameters = compileRALJPattern(data, constructed, triples, self)
+            if query == None:
+                results = [()]
+            else:
+                # Use a separate cursor, so that the results can be streamed while the abstractions are accessed
+                results = self._conn.cursor().execute(query, queryParameters)
+            if rawIDs:
+                # Take each parameter from the known parameters or from its result column
+                columnIndices = {parameterName : i for i, parameterName in enumerate(resultParameterNames)}
+                for result in results:
+                    yield tuple([knownParameters[parameterName] if parameterName in knownParameters else (result[columnIndices[parameterName]] if parameterName in columnIndices else None) for parameterName in parameterNames])
+                return
+            for result in results:
+                # Replace all id parameters with the corresponding abstractions
+                yield {key : (self._getAbstractionWrapperFromID(value) if type(value) == int else value) for key, value in [*knownParameters.items(), *zip(resultParameterNames, result)]}
+        elif engine == "modules":
+            searchModules, knownParameters = self._createSearchModules(data, constructed, triples)
+            searchPlan = planSearchModules(searchModules, knownParameters.keys(), self.getSearchStatistics())
+            # Search for all possible parameter combinations
+            for knownParameters in searchAllSearchModules([searchModule for searchModule, estimatedResultSize in searchPlan], knownParameters):
+                if rawIDs:
+                    yield tuple([knownParameters.get(parameterName) for parameterName in parameterNames])
+                    continue
+                # Replace all id parameters with the corresponding abstractions
+                yield {key : (self._getAbstractionWrapperFromID(value) if type(value) == int else value) for key, value in knownParameters.items()}
+        else:
+            raise ValueError("The search engine must be eather 'sql' or 'modules'.")
+    def getRALJPatternParameterNames(self, data = {}, constructed = {}, triples = []):
+        """
+        Returns the list of the parameter names of the RALJ pattern in the order of their first appearance, which is the order of the values in the raw search results.
+        """
+        return getRALJPatternParameterNames(data, constructed, triples)
+    def wrapRawSearchResults(self, rawResults, parameterNames):
+        """
+        Lazily converts raw search results into the dictionaries that searchRALJPattern yields without rawIDs.
+        """
+        for rawResult in rawResults:
+            yield {parameterName : (self._getAbstractionWrapperFromID(value) if type(value) == int else value) for parameterName, value in zip(parameterNames, rawResult)}
+    def getAbstractionFromID(self, id):
+        """
+        Returns the abstraction of an id of a raw search result.
+        """
+        return self._getAbstractionWrapperFromID(id)
+    def getIncidentTriples(self, abstraction, rawIDs = False):
+        """
+        Returns the set of all triples that contain the abstraction as subject, predicate or object as tuples of the subject, predicate, object and owner of the triple.
+        The self references of the triples are replaced by their owner. The triples are found with a single query on the triple indices.
+        If rawIDs is True, the abstractions are represented by their ids.
+        """
+        id = abstraction.id
+        triples = self._cur.execute("SELECT subject, predicate, object, owner FROM triples WHERE subject = ? OR predicate = ? OR object = ?", (id, id, id)).fetchall()
+        if rawIDs:
+            return set(triples)
+        return set([tuple([self._getAbstractionWrapperFromID(item) for item in triple]) for triple in triples])
+    def getIncidentTriplePages(self, abstraction, pageSize = 10000, rawIDs = False):
+        """
+        Yields the triples of getIncidentTriples in lists of at most pageSize triples, so that the triples of abstractions with very many connections do not have to be held in memory at once.
+        Each page is fetched with a keyset query on one of the triple indices, so that fetching a page does not depend on the number of the previous pages.
+        """
+        id = abstraction.id
+        # Read the triples by the position of the abstraction and skip the triples that were already read at a previous position
+        for column, orderColumns, exclusion in [("subject", "predicate, object, owner", ""),
+                                                ("predicate", "object, subject, owner", " AND subject != ?"),
+                                                ("object", "subject, predicate, owner", " AND subject != ? AND predicate != ?")]:
+            lastKey = (-1, -1, -1)
+            while True:
+                triples = self._cur.execute(f"SELECT subject, predicate, object, owner, {orderColumns} FROM triples WHERE {column} = ? AND ({orderColumns}) > (?, ?, ?){exclusion} ORDER BY {orderColumns} LIMIT ?",
+                                            (id, *lastKey, *[id] * exclusion.count("?"), pageSize)).fetchall()
+                if len(triples) == 0:
+                    break
+                lastKey = triples[-1][4:]
+                if rawIDs:
+                    yield [triple[:4] for triple in triples]
+                else:
+                    yield [tuple([self._getAbstractionWrapperFromID(item) for item in triple[:4]]) for triple in triples]
+                if len(triples) < pageSize:
+                    break
+    def explainRALJPattern(self, data = {}, constructed = {}, triples = [], engine = "modules"):
+        """
+        Returns the search plan of the RALJ pattern.
+        For the "sql" engine it is the compiled query together with the rows of its sqlite query plan.
+        For the "modules" engine it is a list of the search modules in execution order together with their estimated number of results per execution.
+        """
+        if engine == "sql":
+            query, queryParameters, parameterNames, knownParameters = compileRALJPattern(data, constructed, triples, self)
+            if query == None:
+                return None, []
+            return query, self._cur.execute("EXPLAIN QUERY PLAN " + query, queryParameters).fetchall()
+        elif engine == "modules":
+            searchModules, knownParameters = self._createSearchModules(data, constructed, triples)
+            return planSearchModules(searchModules, knownParameters.keys(), self.getSearchStatistics())
+        else:
+            raise ValueError("The search engine must be eather 'sql' or 'modules'.")
+    def _getChangingSearchStatistics(self):
+        # Keep a copy of the statistics for each open transaction that has not changed them yet, so that a rollback can restore them
+        if self._searchStatistics != None and None in self._searchStatisticsSnapshots:
+            searchStatisticsSnapshot = copy.deepcopy(self._searchStatistics)
+            self._searchStatisticsSnapshots = [searchStatisticsSnapshot if snapshot == None else snapshot for snapshot in self._searchStatisticsSnapshots]
+        return self._searchStatistics
+    def getSearchStatistics(self):
+        """
+        Returns the cardinality statistics of the database that are used to plan the searches.
+        They are collected on the first call and again when the number of triples or data abstractions has changed by more than a factor of two since they were collected.
+        """
+        if self._searchStatistics == None or self._searchStatistics.isOutdated():
+            self.analyze()
+        return self._searchStatistics
+    def analyze(self):
+        """
+        Collects the cardinality statistics of the database that are used to plan the searches.
+        Between two calls the statistics are updated incrementally when abstractions are created or deleted.
+        The sqlite statistics, that are used to plan the compiled searches, are refreshed as well.
+        """
+        self._searchStatistics = SearchStatistics(self)
+        # The statistics contain the changes of the open transactions, so a rollback has to collect them again
+        self._searchStatisticsSnapshots = [False if snapshot == None else snapshot for snapshot in self._searchStatisticsSnapshots]
+        self._cur.execute("PRAGMA analysis_limit = 1000")
+        self._cur.execute("ANALYZE")
+    def _createSearchModules(self, data, constructed, triples):
         # Create the search modules
         dataBlock, constructedBlock, tripleBlock = data, constructed, triples
         knownParameters = {}
@@ -102,10 +503,7 @@ class SQLiteRALFramework:
                 searchModules.append(ConstructedSearchModule(constructedParam, baseConnections, i, exactNumberOfBaseConnections, self))
         for subj, pred, obj in tripleBlock:
             searchModules.append(TripleSearchModule(subj, pred, obj, self))
-        # Search for all possible parameter combinations
-        for knownParameters in searchAllSearchModules(searchModules, knownParameters):
-            # Replace all id parameters with the corresponding abstractions
-            yield {key : (self._getAbstractionWrapperFromID(value) if type(value) == int else value) for key, value in knownParameters.items()}
+        return searchModules, knownParameters
     def getStringRepresentationFromAbstraction(self, abstraction):
         if type(abstraction) != SQLiteAbstraction:
             raise ValueError("The abstraction must be a SQLiteAbstraction.")
@@ -122,6 +520,7 @@ class SQLiteRALFramework:
         self.close()
     
 class SQLiteAbstraction:
+    __slots__ = ("_id", "RALFramework", "__weakref__")
     def __init__(self, abstractionId, framework):
         self._id = abstractionId
         self.RALFramework = framework
@@ -135,39 +534,33 @@ class SQLiteAbstraction:
         return self._id
     @property
     def data(self):
-        self.RALFramework._cur.execute("SELECT data FROM abstractions WHERE id = ?", (self.id,))
-        return self.RALFramework._cur.fetchone()[0]
+        return self.RALFramework._getContentEntry(self.id)[0]
     @property
     def format(self):
-        self.RALFramework._cur.execute("SELECT format FROM abstractions WHERE id = ?", (self.id,))
-        return self.RALFramework._cur.fetchone()[0]
+        return self.RALFramework._getContentEntry(self.id)[1]
     @property
     def content(self):
-        self.RALFramework._cur.execute("SELECT data, format, connections FROM abstractions WHERE id = ?", (self.id,))
-        data, format, connections = self.RALFramework._cur.fetchone()
+        data, format, connections, remember = self.RALFramework._getContentEntry(self.id)
         if data != None:
             return (data, format)
-        triples = connections.split("|")
-        triples = [tuple([0 if element == "-" else self.RALFramework._getAbstractionWrapperFromID(int(element)) for element in triple.split(",")]) for triple in triples]
-        return frozenset(triples)
+        return frozenset([tuple([0 if element == 0 else self.RALFramework._getAbstractionWrapperFromID(element) for element in triple]) for triple in connections])
     @property
     def connections(self):
-        self.RALFramework._cur.execute("SELECT connections FROM abstractions WHERE id = ?", (self.id,))
-        triples = self.RALFramework._cur.fetchone()[0].split("|")
-        triples = [tuple([0 if element == "-" else self.RALFramework._getAbstractionWrapperFromID(int(element)) for element in triple.split(",")]) for triple in triples]
-        return frozenset(triples)
+        connections = self.RALFramework._getContentEntry(self.id)[2]
+        if connections == None:
+            return None
+        return frozenset([tuple([0 if element == 0 else self.RALFramework._getAbstractionWrapperFromID(element) for element in triple]) for triple in connections])
     @property
     def remembered(self):
-        self.RALFramework._cur.execute("SELECT remember FROM abstractions WHERE id = ?", (self.id,))
-        return self.RALFramework._cur.fetchone()[0] != 0
+        return self.RALFramework._getContentEntry(self.id)[3]
     @remembered.setter
     def remembered(self, value):
         self.RALFramework._cur.execute("UPDATE abstractions SET remember = ? WHERE id = ?", (1 if value else 0, self.id))
-        self.RALFramework._conn.commit()
+        self.RALFramework._setCachedRemembered(self.id, bool(value))
+        self.RALFramework._registerWriteOperation()
     @property
     def type(self):
-        self.RALFramework._cur.execute("SELECT data FROM abstractions WHERE id = ?", (self.id,))
-        return "DirectDataAbstraction" if self.RALFramework._cur.fetchone()[0] != None else "ConstructedAbstraction"
+        return "DirectDataAbstraction" if self.RALFramework._getContentEntry(self.id)[0] != None else "ConstructedAbstraction"
     def __repr__(self):
         if self._id == None:
             return f"Abstraction(deleted)"
@@ -179,23 +572,26 @@ class SQLiteAbstraction:
             return
         id = self.id
         self._id = None
+        # In the deferred garbage collection mode the abstraction is checked by the next garbage collection
+        if self.RALFramework._deferredGarbageCollection:
+            self.RALFramework._enqueueGarbage(id)
+            return
         # Check if the abstraction can be savely deleted from the sqlite database
         idsToCheckForDeletion = set([id])
-        while len(idsToCheckForDeletion) > 0:
-            id = idsToCheckForDeletion.pop()
-            idsToCheckForDeletion |= checkForSafeAbstractionDeletion(id, self.RALFramework)
-    def forceDeletion(self):
+        with self.RALFramework.transaction():
+            while len(idsToCheckForDeletion) > 0:
+                id = idsToCheckForDeletion.pop()
+                idsToCheckForDeletion |= checkForSafeAbstractionDeletion(id, self.RALFramework)
+    def forceDeletion(self, dryRun = False):
+        """
+        Deletes the abstraction together with all abstractions that reference it directly or indirectly, even if they are remembered or have active wrappers.
+        Afterwards the abstractions that are no longer referenced are deleted if they are neither remembered nor have active wrappers.
+        Returns a dictionary with the number of forced deletions and the total numbers of deleted abstractions and triples.
+        In the dryRun mode the deletion is rolled back, so that only the numbers are reported.
+        """
         if self._id == None:
             raise ValueError("The abstraction has been deleted.")
-        forcedDeletionIds = {self._id}
-        safeDeletionIds = set()
-        while len(forcedDeletionIds) > 0:
-            id = forcedDeletionIds.pop()
-            safeDeletionIds.add(id)
-            forcedDeletionIds |= forceAbstractionDeletion(id, self.RALFramework).difference(safeDeletionIds)
-        while len(safeDeletionIds) > 0:
-            id = safeDeletionIds.pop()
-            safeDeletionIds |= checkForSafeAbstractionDeletion(id, self.RALFramework)
+        return forceAbstractionDeletion(self._id, self.RALFramework, dryRun)
     
 class DataSearchModule:
     def __init__(self, param, data, format, framework):
@@ -206,6 +602,12 @@ class DataSearchModule:
         self.parameterNames = ({param} if type(param) == str else set()) | ({data[0]} if type(data) == list else set()) | ({format[0]} if type(format) == list else set())
     def getUndefinednessIndex(self, knownParameters):
         return len([parameter for parameter in self.parameterNames if parameter not in knownParameters])
+    def estimateResultSize(self, knownParameterNames, statistics):
+        if type(self.param) == SQLiteAbstraction or self.param in knownParameterNames:
+            return 1
+        return statistics.estimateMatchingDataAbstractions(type(self.data) == str or self.data[0] in knownParameterNames, type(self.format) == str or self.format[0] in knownParameterNames)
+    def __repr__(self):
+        return f"DataSearchModule({self.param!r}, {self.data!r}, {self.format!r})"
     def search(self, knownParameters):
         paramValue = self.param.id if type(self.param) == SQLiteAbstraction else knownParameters.get(self.param, None)
         dataValue = self.data if type(self.data) == str else knownParameters.get(self.data[0], None)
@@ -223,9 +625,9 @@ class DataSearchModule:
         for matchingAbstraction in matchingAbstractions:
             if matchingAbstraction[1] == None or matchingAbstraction[2] == None:
                 continue
-            yield {**({self.param : matchingAbstraction[0]} if type(self.param) == str else {}),
-                   **({self.data[0] : matchingAbstraction[1]} if type(self.data) == list else {}),
-                   **({self.format[0] : matchingAbstraction[2]} if type(self.format) == list else {})}
+            parameterValues = combineParameterValues([(self.param, matchingAbstraction[0]), (self.data[0] if type(self.data) == list else None, matchingAbstraction[1]), (self.format[0] if type(self.format) == list else None, matchingAbstraction[2])])
+            if parameterValues != None:
+                yield parameterValues
 
 class ConstructedSearchModule:
     def __init__(self, param, baseConnections, connectionIndex, exactNumberOfBaseConnections, framework):
@@ -237,28 +639,44 @@ class ConstructedSearchModule:
         self.subj = baseConnections[connectionIndex][0]
         self.pred = baseConnections[connectionIndex][1]
         self.obj = baseConnections[connectionIndex][2]
-        self.subj = self.subj if type(self.subj) != 0 else param
-        self.pred = self.pred if type(self.pred) != 0 else param
-        self.obj = self.obj if type(self.obj) != 0 else param
+        # The self reference 0 stands for the constructed abstraction itself
+        self.subj = self.subj if self.subj != 0 else param
+        self.pred = self.pred if self.pred != 0 else param
+        self.obj = self.obj if self.obj != 0 else param
         self.parameterNames = ({param} if type(param) == str else set()) | ({self.subj} if type(self.subj) == str else set()) | ({self.pred} if type(self.pred) == str else set()) | ({self.obj} if type(self.obj) == str else set())
     def getUndefinednessIndex(self, knownParameters):
         return len([parameter for parameter in self.parameterNames if parameter not in knownParameters])
+    def estimateResultSize(self, knownParameterNames, statistics):
+        return statistics.estimateMatchingTriples({"subject" : self.subj, "predicate" : self.pred, "object" : self.obj, "owner" : self.param}, knownParameterNames)
+    def __repr__(self):
+        return f"ConstructedSearchModule({self.param!r}, {self.baseConnections[self.connectionIndex]!r}{'' if self.exactNumberOfBaseConnections else ', +'})"
     def search(self, knownParameters):
         subjValue = self.subj.id if type(self.subj) == SQLiteAbstraction else knownParameters.get(self.subj, None)
         predValue = self.pred.id if type(self.pred) == SQLiteAbstraction else knownParameters.get(self.pred, None)
         objValue = self.obj.id if type(self.obj) == SQLiteAbstraction else knownParameters.get(self.obj, None)
         ownerValue = self.param.id if type(self.param) == SQLiteAbstraction else knownParameters.get(self.param, None)
-        self.framework._cur.execute("SELECT subject, predicate, object, owner FROM triples" + (" WHERE " if (subjValue, predValue, objValue, ownerValue) != (None, None, None, None) else "") +
-                                    " AND ".join([
-                                        *(["subject = ?"] if subjValue != None else []), 
-                                        *(["predicate = ?"] if predValue != None else []), 
-                                        *(["object = ?"] if objValue != None else []), 
-                                        *(["owner = ?"] if ownerValue != None else [])]),
+        # If the owner is already known, check once if it has an exact number of base connections
+        if ownerValue != None and self.exactNumberOfBaseConnections:
+            self.framework._cur.execute("SELECT connectionCount FROM abstractions WHERE id = ?", (ownerValue,))
+            res = self.framework._cur.fetchone()
+            if res == None or res[0] != len(self.baseConnections):
+                return
+        # If the owner is unknown, the exact number of base connections is checked by joining the abstractions of the owners
+        checkConnectionCount = ownerValue == None and self.exactNumberOfBaseConnections
+        conditions = [
+            *(["t.subject = ?"] if subjValue != None else []), 
+            *(["t.predicate = ?"] if predValue != None else []), 
+            *(["t.object = ?"] if objValue != None else []), 
+            *(["t.owner = ?"] if ownerValue != None else []),
+            *(["a.connectionCount = ?"] if checkConnectionCount else [])]
+        self.framework._cur.execute("SELECT t.subject, t.predicate, t.object, t.owner FROM triples t" + (" JOIN abstractions a ON a.id = t.owner" if checkConnectionCount else "") + (" WHERE " if len(conditions) > 0 else "") +
+                                    " AND ".join(conditions),
                                     tuple([
                                         *([subjValue] if subjValue != None else []), 
                                         *([predValue] if predValue != None else []), 
                                         *([objValue] if objValue != None else []), 
-                                        *([ownerValue] if ownerValue != None else [])]))
+                                        *([ownerValue] if ownerValue != None else []),
+                                        *([len(self.baseConnections)] if checkConnectionCount else [])]))
         matchingTriples = self.framework._cur.fetchall()
         if len(matchingTriples) == 0:
             return
@@ -266,6 +684,7 @@ class ConstructedSearchModule:
         alreadyMatchedTriples = set()
         for i, matchingTriple in enumerate(self.baseConnections):
             if i != self.connectionIndex:
+                matchingTriple = [self.param if element == 0 else element for element in matchingTriple]
                 subjValue = matchingTriple[0].id if type(matchingTriple[0]) == SQLiteAbstraction else knownParameters.get(matchingTriple[0], None)
                 predValue = matchingTriple[1].id if type(matchingTriple[1]) == SQLiteAbstraction else knownParameters.get(matchingTriple[1], None)
                 objValue = matchingTriple[2].id if type(matchingTriple[2]) == SQLiteAbstraction else knownParameters.get(matchingTriple[2], None)
@@ -273,18 +692,12 @@ class ConstructedSearchModule:
                     alreadyMatchedTriples.add((subjValue, predValue, objValue))
         # Iterate through the matching triples
         for matchingTriple in matchingTriples:
-            # If the owner got a new value, check if there is an exact number of base connections
-            if ownerValue == None and self.exactNumberOfBaseConnections:
-                self.framework._cur.execute("SELECT COUNT(*) FROM triples WHERE owner = ?", (matchingTriple[3],))
-                if self.framework._cur.fetchone()[0] != len(self.baseConnections):
-                    continue
             # Check if the triple is already matched
             if (matchingTriple[0], matchingTriple[1], matchingTriple[2]) in alreadyMatchedTriples:
                 continue
-            yield {**({self.subj : matchingTriple[0]} if type(self.subj) == str else {}),
-                   **({self.pred : matchingTriple[1]} if type(self.pred) == str else {}),
-                   **({self.obj : matchingTriple[2]} if type(self.obj) == str else {}),
-                   **({self.param : matchingTriple[3]} if type(self.param) == str else {})}
+            parameterValues = combineParameterValues(zip([self.subj, self.pred, self.obj, self.param], matchingTriple))
+            if parameterValues != None:
+                yield parameterValues
 
 class TripleSearchModule:
     def __init__(self, subj, pred, obj, framework):
@@ -295,6 +708,10 @@ class TripleSearchModule:
         self.parameterNames = ({subj} if type(subj) == str else set()) | ({pred} if type(pred) == str else set()) | ({obj} if type(obj) == str else set())
     def getUndefinednessIndex(self, knownParameters):
         return len([parameter for parameter in self.parameterNames if parameter not in knownParameters])
+    def estimateResultSize(self, knownParameterNames, statistics):
+        return statistics.estimateMatchingTriples({"subject" : self.subj, "predicate" : self.pred, "object" : self.obj}, knownParameterNames)
+    def __repr__(self):
+        return f"TripleSearchModule({self.subj!r}, {self.pred!r}, {self.obj!r})"
     def search(self, knownParameters):
         subjValue = self.subj.id if type(self.subj) == SQLiteAbstraction else knownParameters.get(self.subj, None)
         predValue = self.pred.id if type(self.pred) == SQLiteAbstraction else knownParameters.get(self.pred, None)
@@ -310,34 +727,233 @@ class TripleSearchModule:
                                                             *([objValue] if objValue != None else [])]))
         matchingTriples = self.framework._cur.fetchall()
         for matchingTriple in matchingTriples:
-            yield {**({self.subj : matchingTriple[0]} if type(self.subj) == str else {}),
-                   **({self.pred : matchingTriple[1]} if type(self.pred) == str else {}),
-                   **({self.obj : matchingTriple[2]} if type(self.obj) == str else {})}
+            parameterValues = combineParameterValues(zip([self.subj, self.pred, self.obj], matchingTriple))
+            if parameterValues != None:
+                yield parameterValues
                 
         
                                    
+class SearchStatistics:
+    """
+    Cardinality statistics of the sqlite database that are used to estimate the result sizes of the search modules.
+    They contain the number of triples and data abstractions, the number of distinct values of each column and the frequencies of the most frequent subjects, predicates and objects.
+    Only the numbers of triples and data abstractions and the frequencies are updated incrementally, so the statistics are outdated when the numbers have changed too much since they were collected.
+    """
+    def __init__(self, framework, numberOfFrequentValues = 100):
+        cur = framework._cur
+        self.numberOfTriples = cur.execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+        self.distinctValues = {column : cur.execute(f"SELECT COUNT(DISTINCT {column}) FROM triples").fetchone()[0] for column in ["subject", "predicate", "object", "owner"]}
+        self.numberOfDataAbstractions = cur.execute("SELECT COUNT(*) FROM abstractions WHERE data IS NOT NULL").fetchone()[0]
+        self.distinctValues["data"] = cur.execute("SELECT COUNT(DISTINCT data) FROM abstractions").fetchone()[0]
+        self.distinctValues["format"] = cur.execute("SELECT COUNT(DISTINCT format) FROM abstractions").fetchone()[0]
+        self.frequentValues = {column : dict(cur.execute(f"SELECT {column}, COUNT(*) FROM triples GROUP BY {column} ORDER BY COUNT(*) DESC LIMIT ?", (numberOfFrequentValues,)).fetchall()) for column in ["subject", "predicate", "object"]}
+        self.collectedSizes = (self.numberOfTriples, self.numberOfDataAbstractions)
+    def isOutdated(self, factor = 2):
+        """
+        Returns whether the number of triples or data abstractions has changed by more than the factor since the statistics were collected.
+        """
+        return any([size > factor * max(collectedSize, 1) or collectedSize > factor * max(size, 1) for size, collectedSize in zip((self.numberOfTriples, self.numberOfDataAbstractions), self.collectedSizes)])
+    def registerTriples(self, triples):
+        self.numberOfTriples += len(triples)
+        for triple in triples:
+            for column, element in zip(["subject", "predicate", "object"], triple):
+                if element in self.frequentValues[column]:
+                    self.frequentValues[column][element] += 1
+    def unregisterTriples(self, triples):
+        self.numberOfTriples -= len(triples)
+        for triple in triples:
+            for column, element in zip(["subject", "predicate", "object"], triple):
+                if element in self.frequentValues[column]:
+                    self.frequentValues[column][element] -= 1
+    def registerDataAbstractions(self, numberOfDataAbstractions):
+        self.numberOfDataAbstractions += numberOfDataAbstractions
+    def estimateMatchingTriples(self, elementsByColumn, knownParameterNames):
+        """
+        Estimates the number of triples that match the given elements of the columns.
+        An element is either an abstraction, a parameter name or 0.
+        """
+        result = float(self.numberOfTriples)
+        for column, element in elementsByColumn.items():
+            if column in self.frequentValues and type(element) == SQLiteAbstraction:
+                # The frequency of a known value is taken from the most frequent values or from the average of the remaining ones
+                frequentValues = self.frequentValues[column]
+                if element.id in frequentValues:
+                    frequency = frequentValues[element.id]
+                else:
+                    remainingTriples = self.numberOfTriples - sum(frequentValues.values())
+                    remainingValues = self.distinctValues[column] - len(frequentValues)
+                    # The distinct values are not updated incrementally, so there can be remaining triples without remaining values
+                    frequency = remainingTriples / max(remainingValues, 1) if remainingTriples > 0 else 0
+                result *= frequency / max(self.numberOfTriples, 1)
+            elif type(element) == SQLiteAbstraction or (type(element) == str and element in knownParameterNames):
+                result /= max(self.distinctValues[column], 1)
+        return result
+    def estimateMatchingDataAbstractions(self, dataIsKnown, formatIsKnown):
+        """
+        Estimates the number of data abstractions with the given data and format being known.
+        """
+        result = float(self.numberOfDataAbstractions)
+        if dataIsKnown:
+            result /= max(self.distinctValues["data"], 1)
+        if formatIsKnown:
+            result /= max(self.distinctValues["format"], 1)
+        return result
+
+def combineParameterValues(parameterValuePairs):
+    """
+    Combines the (parameter, value) pairs of a matching row into a dictionary.
+    Elements that are no parameter names are ignored. Returns None if the same parameter got different values.
+    """
+    result = {}
+    for parameter, value in parameterValuePairs:
+        if type(parameter) != str:
+            continue
+        if result.setdefault(parameter, value) != value:
+            return None
+    return result
+
+def getRALJPatternParameterNames(dataBlock, constructedBlock, tripleBlock):
+    """
+    Returns the list of the parameter names of the RALJ pattern in the order of their first appearance in the data, constructed and triple block.
+    """
+    parameterNames = []
+    def addParameterName(element):
+        if type(element) == str and not element in parameterNames:
+            parameterNames.append(element)
+    for dataParam, (data, format) in dataBlock.items():
+        addParameterName(dataParam)
+        if type(data) == list:
+            addParameterName(data[0])
+        if type(format) == list:
+            addParameterName(format[0])
+    for constructedParam, baseConnections in constructedBlock.items():
+        addParameterName(constructedParam)
+        for connection in baseConnections:
+            if connection != "+":
+                for element in connection:
+                    addParameterName(element)
+    for triple in tripleBlock:
+        for element in triple:
+            addParameterName(element)
+    return parameterNames
+
+def compileRALJPattern(dataBlock, constructedBlock, tripleBlock, RALFramework):
+    """
+    Compiles a RALJ pattern into a single sql query with one self join of the triples table per connection.
+    Returns the query string, the query parameters, the names of the pattern parameters that correspond to the result columns and the parameters that are already known before the query.
+    If the pattern contains no unknown parameters, the query string is None.
+    """
+    knownParameters = {}
+    tables = []
+    conditions = []
+    queryParameters = []
+    expressionsByParameterName = {}
+    def bindElement(element, expression):
+        # Constrain the expression to the value of the element or bind the parameter of the element to the expression
+        if type(element) == SQLiteAbstraction:
+            conditions.append(f"{expression} = ?")
+            queryParameters.append(element.id)
+        elif element in knownParameters:
+            conditions.append(f"{expression} = ?")
+            queryParameters.append(knownParameters[element])
+        elif element in expressionsByParameterName:
+            conditions.append(f"{expression} = {expressionsByParameterName[element]}")
+        else:
+            expressionsByParameterName[element] = expression
+    # Data concepts with known data and format are known parameters
+    for dataParam, (data, format) in dataBlock.items():
+        if type(data) == str and type(format) == str:
+            knownParameters[dataParam] = RALFramework.DirectDataAbstraction(data, format).id
+    # Evaluate the data block
+    for dataParam, (data, format) in dataBlock.items():
+        if type(data) == str and type(format) == str:
+            continue
+        table = f"a{len(tables)}"
+        tables.append(f"abstractions {table}")
+        conditions.append(f"{table}.data IS NOT NULL AND {table}.format IS NOT NULL")
+        bindElement(dataParam, f"{table}.id")
+        if type(data) == str:
+            conditions.append(f"{table}.data = ?")
+            queryParameters.append(data)
+        else:
+            bindElement(data[0], f"{table}.data")
+        if type(format) == str:
+            conditions.append(f"{table}.format = ?")
+            queryParameters.append(format)
+        else:
+            bindElement(format[0], f"{table}.format")
+    # Evaluate the constructed block
+    for constructedParam, baseConnections in constructedBlock.items():
+        exactNumberOfBaseConnections = True
+        if len(baseConnections) > 0 and baseConnections[-1] == "+":
+            baseConnections = baseConnections[:-1]
+            exactNumberOfBaseConnections = False
+        connectionTables = []
+        for connection in baseConnections:
+            table = f"t{len(tables)}"
+            tables.append(f"triples {table}")
+            bindElement(constructedParam, f"{table}.owner")
+            for element, column in zip(connection, ["subject", "predicate", "object"]):
+                if element == 0:
+                    conditions.append(f"{table}.{column} = {table}.owner")
+                else:
+                    bindElement(element, f"{table}.{column}")
+            # Different connections of the pattern have to match different triples
+            for otherTable in connectionTables:
+                conditions.append(f"NOT ({table}.subject = {otherTable}.subject AND {table}.predicate = {otherTable}.predicate AND {table}.object = {otherTable}.object)")
+            connectionTables.append(table)
+        if exactNumberOfBaseConnections and len(connectionTables) > 0:
+            # The number of base connections is stored in the abstraction of the owner
+            table = f"a{len(tables)}"
+            tables.append(f"abstractions {table}")
+            conditions.append(f"{table}.id = {connectionTables[0]}.owner AND {table}.connectionCount = ?")
+            queryParameters.append(len(baseConnections))
+    # Evaluate the triple block
+    for subj, pred, obj in tripleBlock:
+        table = f"t{len(tables)}"
+        tables.append(f"triples {table}")
+        for element, column in zip([subj, pred, obj], ["subject", "predicate", "object"]):
+            # A 0 in the triple block matches any element like in the triple search module
+            if element != 0:
+                bindElement(element, f"{table}.{column}")
+    if len(tables) == 0:
+        return None, [], [], knownParameters
+    parameterNames = list(expressionsByParameterName.keys())
+    query = "SELECT " + (", ".join(expressionsByParameterName.values()) if len(parameterNames) > 0 else "1") + " FROM " + ", ".join(tables)
+    if len(conditions) > 0:
+        query += " WHERE " + " AND ".join(conditions)
+    return query, queryParameters, parameterNames, knownParameters
+
+def planSearchModules(searchModules, knownParameterNames, statistics):
+    """
+    Orders the search modules by their estimated number of results and returns a list of tuples of the search modules and their estimates.
+    Each step takes the module with the smallest estimate given the parameters that are known after the previous steps.
+    Modules with equal estimates are ordered by their number of unknown parameters.
+    """
+    knownParameterNames = set(knownParameterNames)
+    remainingSearchModules = list(searchModules)
+    searchPlan = []
+    while len(remainingSearchModules) > 0:
+        nextSearchModule = min(remainingSearchModules, key = lambda searchModule: (searchModule.estimateResultSize(knownParameterNames, statistics), searchModule.getUndefinednessIndex(knownParameterNames)))
+        searchPlan.append((nextSearchModule, nextSearchModule.estimateResultSize(knownParameterNames, statistics)))
+        remainingSearchModules.remove(nextSearchModule)
+        knownParameterNames |= nextSearchModule.parameterNames
+    return searchPlan
+
 def searchAllSearchModules(searchModules, knownParameters):
     """
-    Return all filled parameter combinations for the given modules.
+    Return all filled parameter combinations for the given modules, that are searched in the given order.
     """
     # If there are no modules yield the known parameters
     if len(searchModules) == 0:
         yield knownParameters
         return
-    # Get the module with the smallest number of unknown parameters
-    smallestUndefinednessIndex = None
-    moduleWithSmallestNumberOfUnknownParameters = None
-    for searchModule in searchModules:
-        undefinednessIndex = searchModule.getUndefinednessIndex(knownParameters)
-        if smallestUndefinednessIndex == None or undefinednessIndex < smallestUndefinednessIndex:
-            smallestUndefinednessIndex = undefinednessIndex
-            moduleWithSmallestNumberOfUnknownParameters = searchModule
-    # Iterate through all possible values for the unknown parameters of the module
-    for parameterValues in moduleWithSmallestNumberOfUnknownParameters.search(knownParameters):
+    # Iterate through all possible values for the unknown parameters of the first module
+    for parameterValues in searchModules[0].search(knownParameters):
         # Add the parameter values to the known parameters
         newKnownParameters = knownParameters | parameterValues
         # Recursively search for the remaining modules
-        for newKnownParameters in searchAllSearchModules([searchModule for searchModule in searchModules if searchModule != moduleWithSmallestNumberOfUnknownParameters], newKnownParameters):
+        for newKnownParameters in searchAllSearchModules(searchModules[1:], newKnownParameters):
             yield newKnownParameters
 
 
@@ -346,8 +962,9 @@ def checkForSafeAbstractionDeletion(id, RALFramework):
     Checks if the abstraction with the given id can be savely deleted from the sqlite database.
     Returns a set of the abstraction ids that should also be checked for safe deletion.
     """
-    # Check if the abstraction is remembered
-    if RALFramework._cur.execute("SELECT remember FROM abstractions WHERE id = ?", (id,)).fetchone()[0] != 0:
+    # Check if the abstraction is remembered or has already been removed by a rolled back transaction
+    remember = RALFramework._cur.execute("SELECT remember, data FROM abstractions WHERE id = ?", (id,)).fetchone()
+    if remember == None or remember[0] != 0:
         return set()
     # Check if tere is a active wrapper for the abstraction
     wrapper = RALFramework._wrappersByAbstractionID.get(id)
@@ -368,29 +985,126 @@ def checkForSafeAbstractionDeletion(id, RALFramework):
     # Delete the triples
     for triple in triples:
         RALFramework._cur.execute("DELETE FROM triples WHERE id = ?", (triple[0],))
+    searchStatistics = RALFramework._getChangingSearchStatistics()
+    if searchStatistics != None:
+        searchStatistics.unregisterTriples([triple[1:4] for triple in triples])
+        if remember[1] != None:
+            searchStatistics.registerDataAbstractions(-1)
     # Delete the abstraction
     RALFramework._cur.execute("DELETE FROM abstractions WHERE id = ?", (id,))
-    RALFramework._conn.commit()
+    RALFramework._invalidateCachedContent(id)
+    RALFramework._registerWriteOperation()
     # Return the connected abstractions
     return connectedAbstractions
 
-def forceAbstractionDeletion(id, RALFramework):
+class _DryRunRollback(Exception):
+    pass
+
+def forceAbstractionDeletion(id, RALFramework, dryRun = False):
     """
-    Forces the deletion of the abstraction with the given id from the neo4j database.
-    returns the set of the abstraction ids that also have to be forced to be deleted.
+    Forces the deletion of the abstraction with the given id and of all abstractions that reference it directly or indirectly from the sqlite database.
+    The referencing abstractions are found with a single recursive query and deleted with bulk statements in one transaction, that also deletes the abstractions which become collectable.
+    Returns a dictionary with the number of forced deletions and the total numbers of deleted abstractions and triples. In the dryRun mode the transaction is rolled back.
     """
-    # Unset the remembered flag
-    RALFramework._cur.execute("UPDATE abstractions SET remember = 0 WHERE id = ?", (id,))
-    # Deactivate the active wrapper for the abstraction if there is one
-    wrapper = RALFramework._wrappersByAbstractionID.get(id)
-    if wrapper != None:
-        wrapper._id = None
-    forcedDeletionIds = set()
-    # Get all the connected AbstractionTriples
-    connectedTriples = RALFramework._cur.execute("SELECT owner FROM triples WHERE subject = ? OR predicate = ? OR object = ?", (id, id, id)).fetchall()
-    # Add all the owners of the connected AbstractionTriples to the forcedDeletionIds
-    for connectedTriple in connectedTriples:
-        forcedDeletionIds.add(connectedTriple[0])
-    # Return the forcedDeletionIds
-    return forcedDeletionIds
-    
\ No newline at end of file
+    try:
+        with RALFramework.transaction():
+            # Find the abstractions that own a triple which references an abstraction that has to be deleted
+            forcedDeletionIds = [forcedId for forcedId, in RALFramework._cur.execute(
+                "WITH RECURSIVE forced(id) AS (SELECT ? UNION SELECT t.owner FROM forced f JOIN triples t ON t.subject = f.id OR t.predicate = f.id OR t.object = f.id) "
+                "SELECT id FROM forced", (id,)).fetchall()]
+            triples = RALFramework._deleteAbstractions(forcedDeletionIds)
+            # Delete the abstractions that become collectable
+            connectedIds = set([element for triple in triples for element in triple]).difference(forcedDeletionIds)
+            freedAbstractions, freedTriples, sweeps = RALFramework._sweepGarbage(connectedIds)
+            result = {"forcedAbstractions" : len(forcedDeletionIds), "deletedAbstractions" : len(forcedDeletionIds) + freedAbstractions, "deletedTriples" : len(triples) + freedTriples}
+            if dryRun:
+                raise _DryRunRollback()
+    except _DryRunRollback:
+        return result
+    # Deactivate the active wrappers of the forced abstractions only after the deletion has succeeded, so that they stay usable if it is rolled back
+    # They are also removed from the registry, so that they are not returned for new abstractions that reuse the ids
+    for forcedId in forcedDeletionIds:
+        wrapper = RALFramework._wrappersByAbstractionID.pop(forcedId, None)
+        if wrapper != None:
+            wrapper._id = None
+    return result
+    
+def migrateSQLiteSchema(RALFramework):
+    """
+    Upgrades the schema of the sqlite database of the RALFramework to the newest version.
+    The schema version is stored in the user_version pragma of the database. Each step in sqliteSchemaMigrations upgrades it by one.
+    """
+    version = RALFramework._cur.execute("PRAGMA user_version").fetchone()[0]
+    if version > len(sqliteSchemaMigrations):
+        raise ValueError("The sqlite database has been created by a newer version of the SQLiteRALFramework.")
+    for newVersion, migration in enumerate(sqliteSchemaMigrations[version:], version + 1):
+        with RALFramework.transaction():
+            migration(RALFramework)
+            RALFramework._cur.execute(f"PRAGMA user_version = {newVersion}")
+
+def _createTables(RALFramework):
+    """
+    Schema version 1: The abstraction and triple tables.
+    """
+    RALFramework._cur.execute("CREATE TABLE IF NOT EXISTS abstractions (id INTEGER PRIMARY KEY, data TEXT, format TEXT, connections TEXT, tripleIds TEXT, remember INTEGER)")
+    RALFramework._cur.execute("CREATE TABLE IF NOT EXISTS triples (id INTEGER PRIMARY KEY, subject INTEGER, predicate INTEGER, object INTEGER, owner INTEGER)")
+
+def _createLookupIndices(RALFramework):
+    """
+    Schema version 2: Indices for the abstraction lookups and the triple searches.
+    The triple indices contain all columns, so that the search modules never have to read the table itself.
+    Together they cover every combination of known subject, predicate, object and owner values that the search modules query.
+    """
+    RALFramework._cur.execute("CREATE INDEX IF NOT EXISTS triplesSubjectIndex ON triples (subject, predicate, object, owner)")
+    RALFramework._cur.execute("CREATE INDEX IF NOT EXISTS triplesPredicateIndex ON triples (predicate, object, subject, owner)")
+    RALFramework._cur.execute("CREATE INDEX IF NOT EXISTS triplesObjectIndex ON triples (object, subject, predicate, owner)")
+    RALFramework._cur.execute("CREATE INDEX IF NOT EXISTS triplesOwnerIndex ON triples (owner, subject, predicate, object)")
+    RALFramework._cur.execute("CREATE INDEX IF NOT EXISTS abstractionsConnectionsIndex ON abstractions (connections)")
+    RALFramework._cur.execute("CREATE INDEX IF NOT EXISTS abstractionsDataIndex ON abstractions (data, format)")
+    RALFramework._cur.execute("CREATE INDEX IF NOT EXISTS abstractionsFormatIndex ON abstractions (format, data)")
+
+def _addConnectionHashes(RALFramework):
+    """
+    Schema version 3: A fixed width hash of the connection string in an indexed column, that replaces the connection string index for finding existing constructed abstractions.
+    The index is not unique, so that two constructed abstractions with colliding hashes can both exist. Their connection strings are compared to find the existing abstraction.
+    """
+    RALFramework._cur.execute("ALTER TABLE abstractions ADD COLUMN connectionHash BLOB")
+    # Backfill the hashes of the existing constructed abstractions in chunks
+    lastId = 0
+    while True:
+        rows = RALFramework._cur.execute("SELECT id, connections FROM abstractions WHERE connections IS NOT NULL AND id > ? ORDER BY id LIMIT 10000", (lastId,)).fetchall()
+        if len(rows) == 0:
+            break
+        RALFramework._cur.executemany("UPDATE abstractions SET connectionHash = ? WHERE id = ?", [(getConnectionHash(connections), id) for id, connections in rows])
+        lastId = rows[-1][0]
+    RALFramework._cur.execute("CREATE INDEX abstractionsConnectionHashIndex ON abstractions (connectionHash)")
+    RALFramework._cur.execute("DROP INDEX IF EXISTS abstractionsConnectionsIndex")
+
+def _addConnectionCounts(RALFramework):
+    """
+    Schema version 4: The number of base connections of each constructed abstraction, so that searches for an exact number of base connections do not have to count the triples of every candidate.
+    The triples of an abstraction are only deleted together with the abstraction, so the count never changes after the creation.
+    """
+    RALFramework._cur.execute("ALTER TABLE abstractions ADD COLUMN connectionCount INTEGER")
+    RALFramework._cur.execute("UPDATE abstractions SET connectionCount = (SELECT COUNT(*) FROM triples WHERE triples.owner = abstractions.id) WHERE connections IS NOT NULL")
+
+sqliteSchemaMigrations = [
+    _createTables,
+    _createLookupIndices,
+    _addConnectionHashes,
+    _addConnectionCounts,
+]
+
+def decodeConnectionString(connections):
+    """
+    Decodes the connections column of an abstraction into a frozenset of abstraction id triples with 0 for the self references or returns None for a direct data abstraction.
+    """
+    if connections == None:
+        return None
+    return frozenset([tuple([0 if element == "-" else int(element) for element in triple.split(",")]) for triple in connections.split("|")])
+
+def getConnectionHash(connectionRepresentationString):
+    """
+    Returns the 128 bit hash of the canonical connection string of a constructed abstraction.
+    """
+    return hashlib.blake2b(connectionRepresentationString.encode("utf-8"), digest_size = 16).digest()
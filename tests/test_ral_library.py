@@ -0,0 +1,74 @@
+import sqlite3
+import pytest
+from consemnet_navigator import SQLiteRALFramework, RALLibrary
+from consemnet_navigator import ral_library
+
+def saveChain(library, RALFramework, length):
+    # Save one constructed abstraction per keyword, that shares a data abstraction with the previously saved one
+    predicate = RALFramework.DirectDataAbstraction("mentions", "select")
+    for i in range(1, length + 1):
+        constructed = RALFramework.ConstructedAbstraction({(0, predicate, RALFramework.DirectDataAbstraction(f"w{i}", "text")), (0, predicate, RALFramework.DirectDataAbstraction(f"w{i - 1}", "text"))})
+        library.saveData({constructed}, RALFramework)
+
+def countLoadedAbstractions(library, keywords, matchAll = False):
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        abstractions = library.loadData(keywords, RALFramework, matchAll)
+        return sum([abstraction.type == "ConstructedAbstraction" for abstraction in abstractions]), len(abstractions)
+    finally:
+        RALFramework.close()
+
+def test_only_the_abstractions_of_the_found_entries_are_loaded(tmp_path):
+    RALFramework = SQLiteRALFramework(":memory:")
+    library = RALLibrary(tmp_path / "library")
+    try:
+        saveChain(library, RALFramework, 10)
+        expected = {"w10" : (1, 4), "w5" : (2, 6)}
+        assert {keyword : countLoadedAbstractions(library, keyword) for keyword in expected} == expected
+        assert countLoadedAbstractions(library, ["w5", "w4"], matchAll = True) == (1, 4)
+        library.compact()
+        assert {keyword : countLoadedAbstractions(library, keyword) for keyword in expected} == expected
+        library.reindex()
+        library.rebalance(1)
+        assert {keyword : countLoadedAbstractions(library, keyword) for keyword in expected} == expected
+    finally:
+        library.close()
+        RALFramework.close()
+
+def test_failed_index_migration_is_rolled_back(tmp_path, monkeypatch):
+    connection = sqlite3.connect(str(tmp_path / "index.sqlite"))
+    connection.execute("CREATE TABLE dataFiles (id INTEGER PRIMARY KEY, name TEXT)")
+    connection.execute("CREATE TABLE keywords (id INTEGER PRIMARY KEY, keyword INTEGER, UNIQUE(keyword))")
+    connection.execute("CREATE TABLE keywordOccurrences (keywordId INTEGER, dataFileId INTEGER)")
+    connection.execute("INSERT INTO dataFiles (name) VALUES ('old')")
+    connection.commit()
+    connection.close()
+    def failingMigration(index):
+        ral_library._createPostingLists(index)
+        raise RuntimeError()
+    monkeypatch.setattr(ral_library, "libraryIndexMigrations", [ral_library._createIndexTables, failingMigration, ral_library._createChunkTables])
+    with pytest.raises(RuntimeError):
+        ral_library.RALLibraryIndex(tmp_path / "index.sqlite")
+    monkeypatch.undo()
+    index = ral_library.RALLibraryIndex(tmp_path / "index.sqlite")
+    try:
+        assert index._cur.execute("PRAGMA user_version").fetchone()[0] == len(ral_library.libraryIndexMigrations)
+        assert index.requiresReindex
+    finally:
+        index.close()
+
+def test_deleted_abstractions_are_loaded_again(tmp_path):
+    RALFramework = SQLiteRALFramework(":memory:")
+    library = RALLibrary(tmp_path / "library")
+    try:
+        constructed = RALFramework.ConstructedAbstraction({(0, RALFramework.DirectDataAbstraction("hello", "text"), 0)})
+        library.saveData({constructed}, RALFramework)
+        loaded = library.loadData(["hello"], RALFramework)
+        assert constructed in loaded
+        constructed.forceDeletion()
+        loaded = library.loadData(["hello"], RALFramework)
+        assert all([RALFramework.isValidAbstraction(abstraction) for abstraction in loaded])
+        assert set([abstraction.type for abstraction in loaded]) == {"ConstructedAbstraction", "DirectDataAbstraction"}
+    finally:
+        library.close()
+        RALFramework.close()
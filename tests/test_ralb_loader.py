@@ -0,0 +1,34 @@
+import os
+import pytest
+from consemnet_navigator import SQLiteRALFramework, loadRALBFile, saveRALBFile, RALBReader
+
+def test_failed_load_is_rolled_back(tmp_path, monkeypatch):
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        a = RALFramework.DirectDataAbstraction("x", "text")
+        c = RALFramework.ConstructedAbstraction({(0, a, a)})
+        saveRALBFile({c}, tmp_path / "data.ralb", RALFramework)
+        # The deferred garbage collection keeps the abstractions whose wrappers are dropped, so that only the rollback removes them
+        otherRALFramework = SQLiteRALFramework(":memory:", deferredGarbageCollection = True)
+        try:
+            def failingConstructedAbstractions(baseConnectionsList):
+                raise RuntimeError()
+            monkeypatch.setattr(otherRALFramework, "ConstructedAbstractions", failingConstructedAbstractions)
+            with pytest.raises(RuntimeError):
+                loadRALBFile(tmp_path / "data.ralb", otherRALFramework)
+            assert otherRALFramework._cur.execute("SELECT COUNT(*) FROM abstractions").fetchone()[0] == 0
+        finally:
+            otherRALFramework.close()
+    finally:
+        RALFramework.close()
+
+def test_invalid_file_is_closed(tmp_path):
+    (tmp_path / "invalid.ralb").write_bytes(b"RALJ" + bytes(100))
+    (tmp_path / "truncated.ralb").write_bytes(b"RA")
+    numberOfOpenFiles = len(os.listdir("/proc/self/fd"))
+    # The tracebacks keep the readers alive, so their files are not closed by the garbage collection
+    with pytest.raises(ValueError) as invalidError:
+        RALBReader(tmp_path / "invalid.ralb")
+    with pytest.raises(Exception) as truncatedError:
+        RALBReader(tmp_path / "truncated.ralb")
+    assert len(os.listdir("/proc/self/fd")) == numberOfOpenFiles
@@ -0,0 +1,60 @@
+import random
+import pytest
+from consemnet_navigator import SQLiteRALFramework
+
+def createRandomNetwork(rand, RALFramework):
+    """
+    Creates a random network of data and constructed abstractions and returns the list of its abstractions.
+    """
+    abstractions = RALFramework.DirectDataAbstractions([(f"data{i % 4}", f"format{i % 3}") for i in range(8)])
+    for layer in range(2):
+        baseConnectionsList = []
+        for i in range(12):
+            baseConnections = set()
+            for j in range(rand.randint(1, 3)):
+                triple = [rand.choice(abstractions) for k in range(3)]
+                # Each triple needs at least one self reference
+                for k in rand.sample(range(3), rand.randint(1, 2)):
+                    triple[k] = 0
+                baseConnections.add(tuple(triple))
+            baseConnectionsList.append(baseConnections)
+        abstractions = abstractions + RALFramework.ConstructedAbstractions(baseConnectionsList)
+    for abstraction in abstractions:
+        abstraction.remembered = True
+    return abstractions
+
+def createRandomPattern(rand, abstractions):
+    """
+    Creates a random RALJ pattern with data, constructed and triple blocks that share the parameters "a", "b" and "c".
+    """
+    def randomElement(allowSelfReference):
+        choices = ["a", "b", "c", rand.choice(abstractions)] + ([0] if allowSelfReference else [])
+        return rand.choice(choices)
+    data = {}
+    if rand.random() < 0.5:
+        data[rand.choice(["a", "b"])] = [rand.choice([f"data{rand.randint(0, 4)}", ["dataValue"]]), rand.choice([f"format{rand.randint(0, 3)}", ["formatValue"]])]
+    constructed = {}
+    if rand.random() < 0.7:
+        baseConnections = [[randomElement(True) for k in range(3)] for j in range(rand.randint(1, 2))]
+        if rand.random() < 0.5:
+            baseConnections.append("+")
+        constructed[rand.choice(["b", "c"])] = baseConnections
+    triples = [[randomElement(True) for k in range(3)] for j in range(rand.randint(0, 2))]
+    return data, constructed, triples
+
+@pytest.mark.parametrize("seed", range(20))
+def test_sql_and_modules_engines_find_the_same_matches(seed):
+    rand = random.Random(seed)
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        abstractions = createRandomNetwork(rand, RALFramework)
+        for i in range(25):
+            data, constructed, triples = createRandomPattern(rand, abstractions)
+            sqlResults = set(RALFramework.searchRALJPattern(data, constructed, triples, engine = "sql", rawIDs = True))
+            modulesResults = set(RALFramework.searchRALJPattern(data, constructed, triples, engine = "modules", rawIDs = True))
+            assert sqlResults == modulesResults, (data, constructed, triples)
+            sqlResults = set([frozenset([(key, value if type(value) == str else value.id) for key, value in result.items()]) for result in RALFramework.searchRALJPattern(data, constructed, triples, engine = "sql")])
+            modulesResults = set([frozenset([(key, value if type(value) == str else value.id) for key, value in result.items()]) for result in RALFramework.searchRALJPattern(data, constructed, triples, engine = "modules")])
+            assert sqlResults == modulesResults, (data, constructed, triples)
+    finally:
+        RALFramework.close()
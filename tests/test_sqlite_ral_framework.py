@@ -0,0 +1,103 @@
+import pytest
+from consemnet_navigator import SQLiteRALFramework
+
+def test_rolled_back_abstractions_are_not_reused():
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        with pytest.raises(RuntimeError):
+            with RALFramework.transaction():
+                a = RALFramework.DirectDataAbstraction("x", "text")
+                c = RALFramework.ConstructedAbstraction({(0, a, a)})
+                with RALFramework.transaction():
+                    d = RALFramework.DirectDataAbstractions([("z", "text")])[0]
+                raise RuntimeError()
+        b = RALFramework.DirectDataAbstraction("y", "text")
+        assert b is not a and b is not d
+        assert b.data == "y"
+        for abstraction in [a, c, d]:
+            assert not RALFramework.isValidAbstraction(abstraction)
+            with pytest.raises(ValueError):
+                abstraction.data
+    finally:
+        RALFramework.close()
+
+def test_abstractions_of_committed_savepoints_are_rolled_back_with_the_transaction():
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        kept = RALFramework.DirectDataAbstraction("kept", "text")
+        with pytest.raises(RuntimeError):
+            with RALFramework.transaction():
+                with RALFramework.transaction():
+                    a = RALFramework.DirectDataAbstraction("x", "text")
+                raise RuntimeError()
+        assert not RALFramework.isValidAbstraction(a)
+        assert RALFramework.isValidAbstraction(kept) and kept.data == "kept"
+        assert RALFramework.DirectDataAbstraction("y", "text").data == "y"
+    finally:
+        RALFramework.close()
+
+def test_search_statistics_are_collected_again_after_a_bulk_load():
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        RALFramework.getSearchStatistics()
+        dataAbstractions = RALFramework.DirectDataAbstractions([(f"data{i}", "text") for i in range(300)])
+        constructed = RALFramework.ConstructedAbstractions([{(0, dataAbstraction, dataAbstraction)} for dataAbstraction in dataAbstractions])
+        searchStatistics = RALFramework.getSearchStatistics()
+        assert searchStatistics.distinctValues["subject"] == 300
+        assert searchStatistics.estimateMatchingTriples({"subject" : 0, "predicate" : dataAbstractions[-1]}, []) > 0
+    finally:
+        RALFramework.close()
+
+def test_failed_forced_deletion_keeps_the_wrappers_active(monkeypatch):
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        a = RALFramework.DirectDataAbstraction("x", "text")
+        c = RALFramework.ConstructedAbstraction({(0, a, a)})
+        def failingSweep(ids):
+            raise RuntimeError()
+        monkeypatch.setattr(RALFramework, "_sweepGarbage", failingSweep)
+        with pytest.raises(RuntimeError):
+            a.forceDeletion()
+        assert a.data == "x" and c.connections == frozenset([(0, a, a)])
+        monkeypatch.undo()
+        assert a.forceDeletion()["forcedAbstractions"] == 2
+        assert not RALFramework.isValidAbstraction(a) and not RALFramework.isValidAbstraction(c)
+    finally:
+        RALFramework.close()
+
+def test_set_abstractions_remembered():
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        abstractions = RALFramework.DirectDataAbstractions([(f"data{i}", "text") for i in range(1200)])
+        RALFramework.setAbstractionsRemembered(abstractions)
+        RALFramework.setAbstractionsRemembered(abstractions[:600], False)
+        RALFramework.clearContentCache()
+        assert [abstraction.remembered for abstraction in abstractions] == [False] * 600 + [True] * 600
+    finally:
+        RALFramework.close()
+
+def test_ids_of_forced_deletions_are_not_reused_by_the_wrappers():
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        a = RALFramework.DirectDataAbstraction("x", "text")
+        c = RALFramework.ConstructedAbstraction({(0, a, 0)})
+        c.forceDeletion()
+        d = RALFramework.ConstructedAbstraction({(0, a, a)})
+        assert d is not c and not RALFramework.isValidAbstraction(c)
+        assert d.connections == frozenset([(0, a, a)])
+    finally:
+        RALFramework.close()
+
+def test_incident_triples_of_deleted_abstractions_raise():
+    RALFramework = SQLiteRALFramework(":memory:")
+    try:
+        a = RALFramework.DirectDataAbstraction("x", "text")
+        c = RALFramework.ConstructedAbstraction({(0, a, a)})
+        assert RALFramework.getIncidentTriples(a) == {(c, a, a, c)}
+        a.forceDeletion()
+        with pytest.raises(ValueError):
+            RALFramework.getIncidentTriples(a)
+        with pytest.raises(ValueError):
+            list(RALFramework.getIncidentTriplePages(a))
+    finally:
+        RALFramework.close()